@@ -0,0 +1,193 @@
+"""
+Spatial analysis reference pipeline for Geo Distribution
+
+Runs a fixed end-to-end workload -- synthetic point generation, spatial join
+onto a polygon grid, PySAL/esda spatial autocorrelation and result export --
+and reports wall time and memory for every stage. Use it as a smoke test of an
+installed environment and as a performance baseline across distro versions:
+
+    python spatial-analysis.py --points 1000          # smoke test
+    python spatial-analysis.py --points 10000000      # baseline run
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import geopandas as gpd
+import shapely
+import libpysal
+import esda
+
+MIN_POINTS = 1_000
+MAX_POINTS = 10_000_000
+
+# Average number of points per grid cell
+POINTS_PER_CELL = 50
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    except ImportError:
+        import resource
+        # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+class StageTimer:
+    """Collect wall time and memory per pipeline stage"""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        rss_after = current_rss_mb()
+        self.stages.append({
+            "stage": name,
+            "seconds": round(seconds, 4),
+            "rss_mb": round(rss_after, 1),
+            "rss_delta_mb": round(rss_after - rss_before, 1),
+        })
+        print(f"✓ {name:20} {seconds:9.3f} s  {rss_after:9.1f} MB "
+              f"({rss_after - rss_before:+.1f} MB)")
+
+
+def generate_points(n_points: int, seed: int) -> gpd.GeoDataFrame:
+    """Generate clustered synthetic points with a spatially structured value"""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(5, n_points // 20_000)
+    centers = rng.uniform(0, 100, size=(n_clusters, 2))
+    labels = rng.integers(0, n_clusters, n_points)
+    xy = centers[labels] + rng.normal(0, 4, size=(n_points, 2))
+    np.clip(xy, 0, 100, out=xy)
+    value = np.sin(xy[:, 0] / 10) + np.cos(xy[:, 1] / 10) + rng.normal(0, 0.3, n_points)
+    return gpd.GeoDataFrame(
+        {"value": value},
+        geometry=shapely.points(xy),
+        crs="EPSG:3857",
+    )
+
+
+def build_grid(n_points: int):
+    """Build a square polygon grid sized to the number of points"""
+    side = max(4, int(np.sqrt(n_points / POINTS_PER_CELL)))
+    edges = np.linspace(0, 100, side + 1)
+    cols, rows = np.meshgrid(np.arange(side), np.arange(side))
+    rows, cols = rows.ravel(), cols.ravel()
+    polygons = shapely.box(edges[cols], edges[rows], edges[cols + 1], edges[rows + 1])
+    grid = gpd.GeoDataFrame({"cell_id": np.arange(side * side)},
+                            geometry=polygons, crs="EPSG:3857")
+    return grid, side
+
+
+def spatial_join(points: gpd.GeoDataFrame, grid: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Assign points to grid cells and aggregate per cell"""
+    joined = gpd.sjoin(points, grid, how="inner", predicate="intersects")
+    # Points on shared edges match several cells; keep the first
+    joined = joined[~joined.index.duplicated()]
+    stats = joined.groupby("cell_id")["value"].agg(["count", "mean"])
+    cells = grid.join(stats, on="cell_id")
+    cells["count"] = cells["count"].fillna(0).astype(np.int64)
+    cells["mean"] = cells["mean"].fillna(0.0)
+    return cells
+
+
+def autocorrelation(cells: gpd.GeoDataFrame, side: int, seed: int, permutations: int):
+    """Global and local Moran's I of the per-cell mean over queen lattice weights"""
+    w = libpysal.weights.lat2W(side, side, rook=False)
+    w.transform = "r"
+    y = cells["mean"].to_numpy()
+    # esda.Moran draws its permutations from the global NumPy RNG
+    np.random.seed(seed)
+    moran = esda.Moran(y, w, permutations=permutations)
+    local = esda.Moran_Local(y, w, permutations=permutations, seed=seed)
+    cells["local_i"] = local.Is
+    cells["quadrant"] = local.q
+    return moran
+
+
+def export(cells: gpd.GeoDataFrame, output_dir: Path) -> Path:
+    """Write the per-cell results as GeoParquet"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / "cells.parquet"
+    cells.to_parquet(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spatial analysis reference pipeline")
+    parser.add_argument("--points", type=int, default=100_000,
+                        help=f"Number of points ({MIN_POINTS:,} to {MAX_POINTS:,})")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--permutations", type=int, default=99)
+    parser.add_argument("--output", type=Path, default=Path("spatial-analysis-output"))
+    args = parser.parse_args()
+
+    n_points = min(max(args.points, MIN_POINTS), MAX_POINTS)
+
+    print("🌍 Spatial Analysis Reference Pipeline")
+    print("=" * 50)
+    print(f"Points: {n_points:,}  Python: {platform.python_version()}  "
+          f"GeoPandas: {gpd.__version__}")
+
+    timer = StageTimer()
+    total_start = time.perf_counter()
+
+    with timer.stage("generate points"):
+        points = generate_points(n_points, args.seed)
+    with timer.stage("build grid"):
+        grid, side = build_grid(n_points)
+    with timer.stage("spatial join"):
+        cells = spatial_join(points, grid)
+    with timer.stage("autocorrelation"):
+        moran = autocorrelation(cells, side, args.seed, args.permutations)
+    with timer.stage("export"):
+        path = export(cells, args.output)
+
+    total = time.perf_counter() - total_start
+    print("=" * 50)
+    print(
+        f"Cells: {side * side:,}  Moran's I: {moran.I:.4f}  p-value: {moran.p_sim:.4f}"
+    )
+    print(f"Total: {total:.3f} s  Results: {path}")
+
+    report = {
+        "points": n_points,
+        "cells": side * side,
+        "moran_i": float(moran.I),
+        "moran_p_sim": float(moran.p_sim),
+        "total_seconds": round(total, 4),
+        "stages": timer.stages,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {
+            "geopandas": gpd.__version__,
+            "shapely": shapely.__version__,
+            "libpysal": libpysal.__version__,
+            "esda": esda.__version__,
+            "numpy": np.__version__,
+        },
+    }
+    report_path = args.output / "timings.json"
+    report_path.write_text(json.dumps(report, indent=2))
+    print(f"📊 Timings written to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,25 @@ __version__ = "0.1.0"
 __author__ = "Arvind"
 __email__ = "arvind.saane.111@gmail.com"
 
-from geodistro.installer import GeoDistroInstaller
-from geodistro.verifier import verify_installation
+# Loaded on first use, so that light modules such as geodistro.lazy import quickly
+_EXPORTS = {
+    "AsyncGeoDistroInstaller": "geodistro.installer",
+    "GeoDistroInstaller": "geodistro.installer",
+    "InstallResult": "geodistro.installer",
+    "verify_installation": "geodistro.verifier",
+}
 
-__all__ = ["GeoDistroInstaller", "verify_installation"]
\ No newline at end of file
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "AsyncGeoDistroInstaller",
+    "GeoDistroInstaller",
+    "InstallResult",
+    "verify_installation",
+]
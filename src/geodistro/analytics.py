@@ -0,0 +1,353 @@
+"""
+Chunked spatial weights and autocorrelation for large datasets
+
+Weights are built chunk by chunk from a spatial index straight into a sparse
+CSR matrix, so memory grows with the number of neighbour pairs rather than n².
+Moran's I and local Moran are computed with sparse-dense products over that
+matrix instead of per-observation Python loops.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+PathLike = Union[str, Path]
+
+# Observations handled per chunk when building weights
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Upper bound on floats materialized at once for permutation inference,
+# summed over all worker threads
+PERMUTATION_BUFFER = 20_000_000
+
+# Floats per permutation chunk; at most PERMUTATION_BUFFER // PERMUTATION_CHUNK
+# chunks run at once. Chunks do not depend on the worker count, so a seed gives
+# the same result on every host
+PERMUTATION_CHUNK = 1_000_000
+
+
+def _n_jobs(n_jobs: Optional[int]) -> int:
+    """Resolve a worker count, -1 or None meaning all cores"""
+    if n_jobs is None or n_jobs < 1:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+def _permutation_workers(n_jobs: Optional[int]) -> int:
+    """Worker count for permutation chunks, capped to stay within the buffer"""
+    return max(1, min(_n_jobs(n_jobs), PERMUTATION_BUFFER // PERMUTATION_CHUNK))
+
+
+def _chunks(n: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """Yield (start, stop) ranges covering n items"""
+    for start in range(0, n, chunk_size):
+        yield start, min(start + chunk_size, n)
+
+
+def _edges_to_csr(
+    rows: List[np.ndarray], cols: List[np.ndarray], n: int
+) -> sparse.csr_matrix:
+    """Assemble per-chunk neighbour pairs into a binary CSR matrix"""
+    row = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    col = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+    data = np.ones(len(row), dtype=np.float64)
+    w = sparse.csr_matrix((data, (row, col)), shape=(n, n))
+    w.sum_duplicates()
+    w.data[:] = 1.0
+    return w
+
+
+def knn_weights(
+    coords: np.ndarray,
+    k: int = 8,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    n_jobs: Optional[int] = -1,
+) -> sparse.csr_matrix:
+    """Build binary k-nearest-neighbour weights from point coordinates"""
+    coords = np.asarray(coords, dtype=np.float64)
+    n = len(coords)
+    if k >= n:
+        raise ValueError(f"k={k} must be smaller than the number of points ({n})")
+
+    tree = cKDTree(coords)
+    indices = np.empty((n, k), dtype=np.int64)
+    workers = _n_jobs(n_jobs)
+    for start, stop in _chunks(n, chunk_size):
+        # The nearest hit is the point itself, so ask for one extra neighbour
+        _, idx = tree.query(coords[start:stop], k=k + 1, workers=workers)
+        self_mask = idx == np.arange(start, stop)[:, None]
+        # Coincident points can push the point itself out of the first slot
+        no_self = ~self_mask.any(axis=1)
+        self_mask[no_self, -1] = True
+        indices[start:stop] = idx[~self_mask].reshape(-1, k)
+
+    indptr = np.arange(0, n * k + 1, k, dtype=np.int64)
+    data = np.ones(n * k, dtype=np.float64)
+    return sparse.csr_matrix((data, indices.ravel(), indptr), shape=(n, n))
+
+
+def _contiguity_chunk(tree, geometries, start: int, stop: int, rook: bool):
+    """Find contiguous neighbours for one chunk of geometries"""
+    import shapely
+
+    predicate = "touches" if not rook else "intersects"
+    chunk_idx, neighbour_idx = tree.query(geometries[start:stop], predicate=predicate)
+    rows = chunk_idx + start
+    keep = rows != neighbour_idx
+    rows, cols = rows[keep], neighbour_idx[keep]
+    if rook:
+        # Rook neighbours share an edge: boundaries meet in a line, interiors do not
+        shared_edge = shapely.relate_pattern(
+            geometries[rows], geometries[cols], "F***1****"
+        )
+        rows, cols = rows[shared_edge], cols[shared_edge]
+    return rows.astype(np.int64), cols.astype(np.int64)
+
+
+def contiguity_weights(
+    geometries,
+    rook: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    n_jobs: Optional[int] = -1,
+) -> sparse.csr_matrix:
+    """Build binary queen (default) or rook contiguity weights for polygons
+
+    Chunks are queried against a shared STRtree on a thread pool; shapely
+    releases the GIL inside its vectorized predicates.
+    """
+    import shapely
+
+    if hasattr(geometries, "values"):
+        geometries = geometries.values
+    geometries = np.asarray(geometries, dtype=object)
+    n = len(geometries)
+    tree = shapely.STRtree(geometries)
+
+    rows, cols = [], []
+    with ThreadPoolExecutor(max_workers=_n_jobs(n_jobs)) as executor:
+        futures = [
+            executor.submit(_contiguity_chunk, tree, geometries, start, stop, rook)
+            for start, stop in _chunks(n, chunk_size)
+        ]
+        for future in futures:
+            chunk_rows, chunk_cols = future.result()
+            rows.append(chunk_rows)
+            cols.append(chunk_cols)
+    return _edges_to_csr(rows, cols, n)
+
+
+def row_standardize(w: sparse.csr_matrix) -> sparse.csr_matrix:
+    """Scale each row of a weights matrix to sum to one (islands stay empty)"""
+    w = w.tocsr(copy=True)
+    row_sums = np.asarray(w.sum(axis=1)).ravel()
+    scale = np.divide(1.0, row_sums, out=np.zeros_like(row_sums), where=row_sums != 0)
+    w.data *= np.repeat(scale, np.diff(w.indptr))
+    return w
+
+
+def save_weights(w: sparse.csr_matrix, path: PathLike) -> Path:
+    """Persist a CSR weights matrix as raw .npy arrays that can be memory-mapped"""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    w = w.tocsr()
+    np.save(path / "data.npy", w.data)
+    np.save(path / "indices.npy", w.indices)
+    np.save(path / "indptr.npy", w.indptr)
+    (path / "meta.json").write_text(
+        json.dumps({"shape": list(w.shape), "nnz": int(w.nnz)})
+    )
+    return path
+
+
+def load_weights(path: PathLike, mmap: bool = True) -> sparse.csr_matrix:
+    """Load weights saved with save_weights, memory-mapped by default"""
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text())
+    mode = "r" if mmap else None
+    arrays = [np.load(path / f"{name}.npy", mmap_mode=mode)
+              for name in ("data", "indices", "indptr")]
+    return sparse.csr_matrix(tuple(arrays), shape=tuple(meta["shape"]), copy=False)
+
+
+def to_libpysal(w: sparse.csr_matrix):
+    """Wrap a CSR matrix as a libpysal sparse weights object"""
+    from libpysal.weights import WSP
+
+    return WSP(w)
+
+
+def _permutation_seeds(seed: Optional[int], count: int) -> List[np.random.Generator]:
+    """Independent random generators for parallel permutation chunks"""
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(count)]
+
+
+def _folded_p_sim(larger: np.ndarray, permutations: int) -> np.ndarray:
+    """Pseudo p-value in the direction of the observed statistic, as in esda"""
+    larger = np.where(permutations - larger < larger, permutations - larger, larger)
+    return (larger + 1.0) / (permutations + 1.0)
+
+
+def moran(
+    y: np.ndarray,
+    w: sparse.csr_matrix,
+    permutations: int = 999,
+    seed: Optional[int] = None,
+    n_jobs: Optional[int] = -1,
+) -> Dict[str, float]:
+    """Global Moran's I with normality and permutation inference"""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    w = w.tocsr()
+    z = y - y.mean()
+    zz = z @ z
+    s0 = w.sum()
+
+    i_value = n / s0 * (z @ (w @ z)) / zz
+
+    # Moments under the normality assumption
+    wt = w.T.tocsr()
+    s1 = 0.5 * ((w + wt).power(2)).sum()
+    s2 = (
+        (np.asarray(w.sum(axis=1)).ravel() + np.asarray(wt.sum(axis=1)).ravel()) ** 2
+    ).sum()
+    expected = -1.0 / (n - 1)
+    variance = (n * n * s1 - n * s2 + 3 * s0 * s0) / (
+        (n * n - 1) * s0 * s0
+    ) - expected**2
+    z_norm = (i_value - expected) / np.sqrt(variance)
+
+    from scipy.stats import norm
+
+    result = {
+        "I": float(i_value),
+        "EI": expected,
+        "VI_norm": float(variance),
+        "z_norm": float(z_norm),
+        "p_norm": float(2 * norm.sf(abs(z_norm))),
+    }
+
+    if permutations:
+        batch = max(1, min(permutations, PERMUTATION_CHUNK // max(n, 1)))
+        batches = list(_chunks(permutations, batch))
+        rngs = _permutation_seeds(seed, len(batches))
+
+        def run(batch_range, rng):
+            start, stop = batch_range
+            # Each column of Z is one permutation of z
+            zp = rng.permuted(np.repeat(z[:, None], stop - start, axis=1), axis=0)
+            return n / s0 * np.einsum("ij,ij->j", zp, w @ zp) / zz
+
+        with ThreadPoolExecutor(max_workers=_permutation_workers(n_jobs)) as executor:
+            sims = np.concatenate(list(executor.map(run, batches, rngs)))
+        larger = np.sum(sims >= i_value)
+        result["p_sim"] = float(_folded_p_sim(larger, permutations))
+        result["EI_sim"] = float(sims.mean())
+        result["z_sim"] = float(_z_sim(i_value, sims.mean(), sims.std()))
+    return result
+
+
+def _sample_without_replacement(
+    rng, m: int, k: int, shape: Tuple[int, ...]
+) -> np.ndarray:
+    """k distinct integers from range(m) in random order, for every index of shape
+
+    Floyd's algorithm, vectorized over shape, so memory grows with k rather than m.
+    """
+    draws = np.empty(shape + (k,), dtype=np.int64)
+    for c, j in enumerate(range(m - k, m)):
+        t = rng.integers(0, j + 1, size=shape)
+        taken = (draws[..., :c] == t[..., None]).any(axis=-1)
+        draws[..., c] = np.where(taken, j, t)
+    # Floyd's subsets are uniform but their order is not
+    return rng.permuted(draws, axis=-1)
+
+
+def _local_permutation_chunk(z, w, m2, observed, rows, permutations, rng):
+    """Conditional randomization for rows that share a neighbour count"""
+    n = len(z)
+    k = w.indptr[rows[0] + 1] - w.indptr[rows[0]]
+    if k == 0:
+        # Islands have no neighbours to permute
+        nan = np.full(len(rows), np.nan)
+        return rows, np.zeros(len(rows), dtype=np.int64), nan, nan
+
+    starts = w.indptr[rows]
+    weights = w.data[starts[:, None] + np.arange(k)]
+    # Draw k distinct neighbours from the n - 1 other observations, skipping i itself
+    draws = _sample_without_replacement(rng, n - 1, k, (len(rows), permutations))
+    draws += draws >= rows[:, None, None]
+    lags = np.einsum("rpk,rk->rp", z[draws], weights)
+    sims = (z[rows] / m2)[:, None] * lags
+    larger = np.sum(sims >= observed[rows, None], axis=1)
+    return rows, larger, sims.mean(axis=1), sims.std(axis=1)
+
+
+def _z_sim(observed, mean, std):
+    """Standardized statistic against its permutation distribution, NaN when degenerate"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(
+            std > 0, (observed - mean) / np.where(std > 0, std, 1.0), np.nan
+        )
+
+
+def local_moran(
+    y: np.ndarray,
+    w: sparse.csr_matrix,
+    permutations: int = 999,
+    seed: Optional[int] = None,
+    n_jobs: Optional[int] = -1,
+) -> Dict[str, np.ndarray]:
+    """Local Moran's I with vectorized conditional permutation inference
+
+    Quadrants follow esda: 1 HH, 2 LH, 3 LL, 4 HL. Islands (rows without
+    neighbours) get NaN p_sim and z_sim.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    w = w.tocsr()
+    z = y - y.mean()
+    # esda scales by n - 1, matching its Moran_Local
+    m2 = (z @ z) / (n - 1)
+    lag = w @ z
+    local_i = z / m2 * lag
+
+    quadrant = np.where(
+        z > 0,
+        np.where(lag > 0, 1, 4),
+        np.where(lag > 0, 2, 3),
+    )
+    result = {"Is": local_i, "q": quadrant}
+
+    if permutations:
+        cardinality = np.diff(w.indptr)
+        rng_chunks = []
+        for k in np.unique(cardinality):
+            rows = np.flatnonzero(cardinality == k)
+            step = max(1, PERMUTATION_CHUNK // max(1, permutations * max(k, 1)))
+            for start, stop in _chunks(len(rows), step):
+                rng_chunks.append(rows[start:stop])
+        rngs = _permutation_seeds(seed, len(rng_chunks))
+
+        larger = np.zeros(n, dtype=np.int64)
+        mean = np.zeros(n)
+        std = np.zeros(n)
+        with ThreadPoolExecutor(max_workers=_permutation_workers(n_jobs)) as executor:
+            futures = [
+                executor.submit(_local_permutation_chunk, z, w, m2, local_i,
+                                rows, permutations, rng)
+                for rows, rng in zip(rng_chunks, rngs)
+            ]
+            for future in futures:
+                rows, larger[rows], mean[rows], std[rows] = future.result()
+        p_sim = _folded_p_sim(larger, permutations)
+        # As in esda, islands get no pseudo p-value rather than the smallest one
+        p_sim[cardinality == 0] = np.nan
+        result["p_sim"] = p_sim
+        result["z_sim"] = _z_sim(local_i, mean, std)
+    return result
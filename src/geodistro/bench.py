@@ -0,0 +1,186 @@
+"""
+Cross-interpreter geo workload benchmarks for Geo Distribution
+
+A fixed suite of workloads is run with each environment's interpreter, one
+fresh process per workload so that peak memory is attributed to it alone.
+Results are comparable across Python versions built from the same manifest.
+"""
+
+import json
+import statistics
+import subprocess
+from typing import Dict, List, Optional
+
+# Workload name -> code run in the target interpreter. Each defines run(n);
+# n is the base problem size scaled by the caller.
+WORKLOADS = {
+    # Pure-Python coordinate math, where interpreter speed shows most
+    "haversine": (
+        200_000,
+        r"""
+import math, random
+
+def run(n):
+    rng = random.Random(0)
+    pairs = [(rng.uniform(-80, 80), rng.uniform(-180, 180),
+              rng.uniform(-80, 80), rng.uniform(-180, 180)) for _ in range(n)]
+    total = 0.0
+    for lat1, lon1, lat2, lon2 in pairs:
+        p1, p2 = math.radians(lat1), math.radians(lat2)
+        dp, dl = p2 - p1, math.radians(lon2 - lon1)
+        a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+        total += 6371.0 * 2 * math.asin(math.sqrt(a))
+    return total
+""",
+    ),
+    # Building and parsing GeoJSON feature collections
+    "geojson": (
+        50_000,
+        r"""
+import json, random
+
+def run(n):
+    rng = random.Random(0)
+    features = [{"type": "Feature", "properties": {"id": i, "name": f"site-{i}"},
+                 "geometry": {"type": "Polygon", "coordinates": [[
+                     [x, y], [x + 0.01, y], [x + 0.01, y + 0.01], [x, y + 0.01], [x, y]]]}}
+                for i, (x, y) in enumerate((rng.uniform(-180, 180), rng.uniform(-80, 80))
+                                           for _ in range(n))]
+    text = json.dumps({"type": "FeatureCollection", "features": features})
+    parsed = json.loads(text)
+    return sum(len(f["geometry"]["coordinates"][0]) for f in parsed["features"])
+""",
+    ),
+    # Per-geometry shapely calls, as in typical row-wise user code
+    "shapely": (
+        20_000,
+        r"""
+import random
+from shapely.geometry import Point
+from shapely.strtree import STRtree
+
+def run(n):
+    rng = random.Random(0)
+    buffers = [Point(rng.uniform(0, 100), rng.uniform(0, 100)).buffer(0.5) for _ in range(n)]
+    tree = STRtree(buffers)
+    hits = 0
+    for geometry in buffers[: n // 4]:
+        hits += len(tree.query(geometry, predicate="intersects"))
+    return hits
+""",
+    ),
+    # One transform call per point, the pattern vectorized code avoids
+    "pyproj": (
+        50_000,
+        r"""
+import random
+from pyproj import Transformer
+
+def run(n):
+    rng = random.Random(0)
+    transformer = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
+    total = 0.0
+    for _ in range(n):
+        x, y = transformer.transform(rng.uniform(-180, 180), rng.uniform(-80, 80))
+        total += x + y
+    return total
+""",
+    ),
+    # Vectorized GeoPandas spatial join and dissolve
+    "geopandas": (
+        200_000,
+        r"""
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import box
+
+def run(n):
+    rng = np.random.default_rng(0)
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(rng.uniform(0, 100, n),
+                                                          rng.uniform(0, 100, n)))
+    cells = gpd.GeoDataFrame({"cell": range(2500)},
+                             geometry=[box(x, y, x + 2, y + 2)
+                                       for x in range(0, 100, 2) for y in range(0, 100, 2)])
+    joined = gpd.sjoin(points, cells, predicate="within")
+    return len(joined.dissolve(by="cell"))
+""",
+    ),
+}
+
+_HARNESS = r'''
+import json, sys, time
+{code}
+n, repeat = int(sys.argv[1]), int(sys.argv[2])
+timings = []
+for _ in range(repeat):
+    start = time.perf_counter()
+    run(n)
+    timings.append(time.perf_counter() - start)
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+except ImportError:
+    import psutil
+    max_rss_mb = psutil.Process().memory_info().peak_wset / (1024 * 1024)
+print(json.dumps({{"timings": timings, "max_rss_mb": max_rss_mb,
+                  "python": sys.version.split()[0]}}))
+'''
+
+
+def run_workload(python: str, name: str, repeat: int = 3, scale: float = 1.0,
+                 timeout: float = 600) -> Dict:
+    """Run one workload in a fresh interpreter
+
+    Returns the median wall time of the repeats and the process's peak RSS,
+    or an error when the workload's libraries are missing in the environment.
+    """
+    base, code = WORKLOADS[name]
+    n = max(1, int(base * scale))
+    try:
+        result = subprocess.run(
+            [python, "-c", _HARNESS.format(code=code), str(n), str(repeat)],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout}s"}
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit code {result.returncode}"}
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["seconds"] = statistics.median(report["timings"])
+    return report
+
+
+def benchmark_interpreters(
+    pythons: Dict[str, str],
+    workloads: Optional[List[str]] = None,
+    repeat: int = 3,
+    scale: float = 1.0,
+) -> Dict[str, Dict[str, Dict]]:
+    """Run the workload suite with every interpreter
+
+    pythons maps a label (usually the environment name) to an interpreter.
+    Workloads run one after the other so they do not compete for cores.
+    """
+    workloads = workloads or list(WORKLOADS)
+    return {
+        label: {name: run_workload(python, name, repeat, scale) for name in workloads}
+        for label, python in pythons.items()
+    }
+
+
+def relative_speed(
+    results: Dict[str, Dict[str, Dict]], baseline: str
+) -> Dict[str, Dict[str, float]]:
+    """Speedup of every interpreter over the baseline, per workload (>1 is faster)"""
+    speed = {}
+    for label, workloads in results.items():
+        speed[label] = {}
+        for name, report in workloads.items():
+            base = results[baseline].get(name, {})
+            if "seconds" in report and "seconds" in base and report["seconds"] > 0:
+                speed[label][name] = base["seconds"] / report["seconds"]
+    return speed
@@ -0,0 +1,131 @@
+"""
+Import footprint budgets for Geo Distribution
+
+A budget file sets import-time and memory ceilings per library and for the
+whole stack imported together. Every measurement runs in a fresh
+interpreter, after one discarded warm-up run, and the median of several
+runs is compared with the budget so a noisy run does not fail the check.
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import yaml
+
+from geodistro.verifier import LIBRARIES_TO_CHECK
+
+DEFAULT_BUDGET_FILE = "import-budgets.yml"
+
+STACK = "(stack)"
+
+_HARNESS = r'''
+import importlib, json, os, sys, time
+
+def rss_mb():
+    # Current RSS; the ru_maxrss peak can be inherited from the parent across exec
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+
+before = rss_mb()
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "rss_mb": rss_mb() - before}))
+'''
+
+
+def default_libraries() -> List[str]:
+    """Modules checked by the verifier"""
+    return [name for name, _ in LIBRARIES_TO_CHECK]
+
+
+def load_budgets(path: Path) -> Dict:
+    """Read a budget file: {"libraries": {name: {seconds, rss_mb}}, "stack": {...}}"""
+    budgets = yaml.safe_load(Path(path).read_text()) or {}
+    budgets.setdefault("libraries", {})
+    budgets.setdefault("stack", {})
+    return budgets
+
+
+def measure_import(python: str, modules: List[str], repeat: int = 5,
+                   timeout: float = 120) -> Dict:
+    """Median import time and RSS growth of modules, each run in a fresh interpreter"""
+    runs = []
+    # The first run warms the OS file cache and writes missing .pyc files
+    for _ in range(repeat + 1):
+        try:
+            result = subprocess.run(
+                [python, "-c", _HARNESS] + modules,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return {"error": f"timed out after {timeout}s"}
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            return {"error": lines[-1] if lines else f"exit code {result.returncode}"}
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    runs = runs[1:]
+    seconds = [run["seconds"] for run in runs]
+    return {
+        "seconds": statistics.median(seconds),
+        "seconds_stdev": statistics.stdev(seconds) if len(seconds) > 1 else 0.0,
+        "rss_mb": statistics.median(run["rss_mb"] for run in runs),
+        "runs": len(runs),
+    }
+
+
+def _status(measured: Dict, budget: Dict) -> str:
+    if "error" in measured:
+        return "error"
+    for key in ("seconds", "rss_mb"):
+        if key in budget and measured[key] > budget[key]:
+            return "over"
+    return "ok"
+
+
+def check_budgets(budgets: Dict, python: Optional[str] = None, repeat: int = 5,
+                  libraries: Optional[List[str]] = None) -> List[Dict]:
+    """Measure every budgeted library and the stack, comparing with their budgets
+
+    Without per-library budgets the verifier's libraries are measured and
+    only reported. Runs are sequential so they do not compete for CPU.
+    """
+    python = python or sys.executable
+    libraries = libraries or list(budgets["libraries"]) or default_libraries()
+    results = []
+    for name in libraries + [STACK]:
+        modules = libraries if name == STACK else [name]
+        budget = (
+            budgets["stack"] if name == STACK else budgets["libraries"].get(name, {})
+        )
+        measured = measure_import(python, modules, repeat)
+        results.append(
+            dict(measured, name=name, budget=budget, status=_status(measured, budget))
+        )
+    return results
+
+
+def record_budgets(results: List[Dict], headroom: float = 1.25) -> Dict:
+    """Budgets from measurements, with headroom for machine-to-machine noise"""
+    budgets = {"libraries": {}, "stack": {}}
+    for result in results:
+        if "error" in result:
+            continue
+        budget = {"seconds": round(result["seconds"] * headroom, 3),
+                  "rss_mb": round(result["rss_mb"] * headroom, 1)}
+        if result["name"] == STACK:
+            budgets["stack"] = budget
+        else:
+            budgets["libraries"][result["name"]] = budget
+    return budgets
@@ -0,0 +1,178 @@
+"""
+Bytecode precompilation for Geo Distribution environments
+
+Everything here runs the environment's own interpreter in a subprocess, since
+.pyc files are only valid for the interpreter (magic number) that wrote them.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+INVALIDATION_MODES = ["timestamp", "checked-hash", "unchecked-hash"]
+
+# Modules whose first import dominates kernel start in the distro
+COLD_IMPORT_MODULES = ["geopandas", "osmnx", "sklearn"]
+
+_SITE_PACKAGES_SCRIPT = r'''
+import json, site, sysconfig
+paths = [sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]]
+paths += site.getsitepackages() if hasattr(site, "getsitepackages") else []
+print(json.dumps(sorted(set(paths))))
+'''
+
+# Checks every .py under the given trees against its cached .pyc
+_VERIFY_SCRIPT = r"""
+import json, os, sys
+from importlib.util import MAGIC_NUMBER, cache_from_source, source_hash
+
+# PEP 552 flags: bit 0 hash-based, bit 1 check_source
+expected_flags = {"timestamp": 0, "checked-hash": 3, "unchecked-hash": 1}[sys.argv[1]]
+counts = {"sources": 0, "valid": 0, "missing": 0, "stale": 0, "wrong_magic": 0}
+bad = []
+for root in sys.argv[2:]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+        for name in filenames:
+            if not name.endswith(".py"):
+                continue
+            source = os.path.join(dirpath, name)
+            counts["sources"] += 1
+            try:
+                with open(cache_from_source(source), "rb") as f:
+                    header = f.read(16)
+            except OSError:
+                counts["missing"] += 1
+                bad.append(source)
+                continue
+            if header[:4] != MAGIC_NUMBER:
+                counts["wrong_magic"] += 1
+                bad.append(source)
+                continue
+            flags = int.from_bytes(header[4:8], "little")
+            if flags != expected_flags:
+                ok = False
+            elif flags:
+                with open(source, "rb") as f:
+                    ok = header[8:16] == source_hash(f.read())
+            else:
+                stat = os.stat(source)
+                mtime = int.from_bytes(header[8:12], "little")
+                size = int.from_bytes(header[12:16], "little")
+                ok = (mtime == int(stat.st_mtime) & 0xFFFFFFFF
+                      and size == stat.st_size & 0xFFFFFFFF)
+            if ok:
+                counts["valid"] += 1
+            else:
+                counts["stale"] += 1
+                bad.append(source)
+counts["examples"] = bad[:20]
+print(json.dumps(counts))
+"""
+
+_IMPORT_SCRIPT = r'''
+import importlib, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(time.perf_counter() - start)
+'''
+
+
+def site_packages(python: str) -> List[str]:
+    """List the site-packages trees of an interpreter"""
+    result = subprocess.run([python, "-c", _SITE_PACKAGES_SCRIPT],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def compile_trees(
+    python: str,
+    paths: List[str],
+    mode: str = "timestamp",
+    workers: int = 0,
+) -> subprocess.CompletedProcess:
+    """Compile every module under the given trees across a process pool
+
+    workers=0 lets compileall use one process per core.
+    """
+    if mode not in INVALIDATION_MODES:
+        raise ValueError(f"Unknown invalidation mode '{mode}'")
+    cmd = [python, "-m", "compileall", "-q", "-j", str(workers),
+           "--invalidation-mode", mode]
+    # compileall only recognizes up-to-date timestamp .pycs, so hash modes
+    # must force a rewrite or existing timestamp .pycs would be kept
+    if mode != "timestamp":
+        cmd.append("-f")
+    cmd += list(paths)
+    return subprocess.run(cmd, capture_output=True, text=True)
+
+
+def verify_trees(python: str, paths: List[str], mode: str = "timestamp") -> Dict:
+    """Check that every source has a valid .pyc for the interpreter and mode"""
+    result = subprocess.run([python, "-c", _VERIFY_SCRIPT, mode] + list(paths),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def _import_time(
+    python: str, module: str, env: Optional[Dict[str, str]] = None
+) -> float:
+    """Time one import of a module in a fresh interpreter"""
+    result = subprocess.run([python, "-c", _IMPORT_SCRIPT, module],
+                            capture_output=True, text=True, env=env, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark_cold_imports(
+    python: str,
+    modules: Optional[List[str]] = None,
+    repeat: int = 3,
+) -> Dict[str, Dict[str, float]]:
+    """Compare import times without and with the precompiled bytecode
+
+    The "without" case points PYTHONPYCACHEPREFIX at an empty directory and
+    disables writing, so every import compiles from source and nothing in the
+    environment is touched.
+    """
+    modules = modules or COLD_IMPORT_MODULES
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="geodistro-pyc-") as empty:
+        cold_env = dict(
+            os.environ, PYTHONPYCACHEPREFIX=empty, PYTHONDONTWRITEBYTECODE="1"
+        )
+        warm_env = {k: v for k, v in os.environ.items()
+                    if k not in ("PYTHONPYCACHEPREFIX", "PYTHONDONTWRITEBYTECODE")}
+        for module in modules:
+            try:
+                without = [
+                    _import_time(python, module, cold_env) for _ in range(repeat)
+                ]
+                with_pyc = [
+                    _import_time(python, module, warm_env) for _ in range(repeat)
+                ]
+            except subprocess.CalledProcessError:
+                continue
+            results[module] = {
+                "without_pyc": statistics.median(without),
+                "with_pyc": statistics.median(with_pyc),
+            }
+    return results
+
+
+def precompile_environment(python: str, mode: str = "timestamp") -> Dict:
+    """Compile all site-packages of an interpreter and verify the result"""
+    start = time.perf_counter()
+    paths = site_packages(python)
+    compiled = compile_trees(python, paths, mode)
+    report = verify_trees(python, paths, mode)
+    report.update({
+        "paths": paths,
+        "mode": mode,
+        "returncode": compiled.returncode,
+        "seconds": round(time.perf_counter() - start, 3),
+    })
+    return report
@@ -2,31 +2,582 @@
 Command-line interface for Geo Distribution
 """
 
+import asyncio
+import json
+import sys
+
 import click
-from geodistro.installer import GeoDistroInstaller
-from geodistro.verifier import verify_installation
+import yaml
+from geodistro.installer import (GeoDistroInstaller, PrerequisiteError, install_matrix,
+                                 matrix_env_name)
+from geodistro.verifier import verify_deep, verify_installation
+from geodistro import (
+    bench as benchmarks,
+    budget as budgets,
+    bytecode,
+    daemon,
+    envindex,
+    lazy,
+    mirror,
+    tuning,
+)
 
 @click.group()
 def cli():
     """Geo Distribution - One-click setup for geospatial libraries"""
     pass
 
+
 @cli.command()
-@click.option('--env-name', default='geo-distro', help='Environment name')
-@click.option('--no-shortcuts', is_flag=True, help='Skip creating shortcuts')
-@click.option('-v', '--verbose', is_flag=True, help='Verbose output')
-def install(env_name, no_shortcuts, verbose):
+@click.option("--env-name", default="geo-distro", help="Environment name")
+@click.option("--no-shortcuts", is_flag=True, help="Skip creating shortcuts")
+@click.option(
+    "--tune-profile",
+    type=click.Choice(tuning.PROFILES),
+    help="Apply a GDAL/PROJ performance profile",
+)
+@click.option("--no-precompile", is_flag=True, help="Skip bytecode precompilation")
+@click.option(
+    "--pyc-mode",
+    type=click.Choice(bytecode.INVALIDATION_MODES),
+    default="timestamp",
+    help=".pyc invalidation mode (unchecked-hash for immutable images)",
+)
+@click.option(
+    "--kernel-pool",
+    type=int,
+    default=2,
+    show_default=True,
+    help="Pre-warmed kernels kept by the geo kernelspec (0 to disable)",
+)
+@click.option(
+    "--no-mirror",
+    is_flag=True,
+    help="Solve against the remote channels, not the local mirror",
+)
+@click.option("--no-plan", is_flag=True, help="Skip the pre-flight conflict check")
+@click.option(
+    "--python",
+    "pythons",
+    default=None,
+    help="Python version, or a comma-separated list to build one env each in parallel",
+)
+@click.option(
+    "--daemon",
+    "daemon_address",
+    default=None,
+    help="Build through a 'geo-distro serve' daemon (host:port or unix:/path)",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Verbose output")
+def install(env_name, no_shortcuts, tune_profile, no_precompile, pyc_mode, kernel_pool,
+            no_mirror, no_plan, pythons, daemon_address, verbose):
     """Install the complete Geo Distribution"""
-    installer = GeoDistroInstaller(verbose=verbose)
-    installer.install_all(
-        env_name=env_name,
-        create_shortcuts=not no_shortcuts
+    options = dict(
+        create_shortcuts=not no_shortcuts,
+        tune_profile=tune_profile,
+        precompile=not no_precompile,
+        pyc_mode=pyc_mode,
+        kernel_pool=kernel_pool,
+        use_mirror=not no_mirror,
+        check_plan=not no_plan
+    )
+    versions = _python_versions(pythons)
+    if daemon_address:
+        _install_via_daemon(daemon_address, dict(options, env_name=env_name), versions)
+    if len(versions) > 1:
+        try:
+            results = install_matrix(env_name, versions, verbose=verbose, **options)
+        except PrerequisiteError as e:
+            _missing_conda(e)
+        sys.exit(0 if all(results.values()) else 1)
+    installer = _installer(verbose=verbose)
+    result = installer.install_all(
+        env_name=env_name, python=versions[0] if versions else None, **options
+    )
+    sys.exit(0 if result.ok else 1)
+
+def _python_versions(pythons):
+    """Parse a comma-separated list of Python versions"""
+    return [v.strip() for v in (pythons or "").split(",") if v.strip()]
+
+def _install_via_daemon(address, options, versions):
+    """Submit one build per Python version to a daemon and wait for them"""
+    ok = True
+    for index, python in enumerate(versions or [None]):
+        build = dict(options, python=python)
+        if python and len(versions) > 1:
+            build["env_name"] = matrix_env_name(options["env_name"], python)
+            # As with local matrix builds, only the first interpreter gets the shortcuts
+            build["create_shortcuts"] = options["create_shortcuts"] and index == 0
+        click.echo(f"🛰️ Submitting {build['env_name']} to {address}...")
+        try:
+            job = daemon.submit_build(address, build)
+        except (OSError, ValueError) as e:
+            click.echo(f"✗ Daemon request failed: {e}")
+            sys.exit(1)
+        shared = (
+            f", shared by {job['requests']} requests" if job["requests"] > 1 else ""
+        )
+        for line in job["log"][-5:]:
+            click.echo(f"  {line}")
+        mark = "✓" if job["status"] == "ok" else "✗"
+        click.echo(f"{mark} Build {job['id']} {job['status']}{shared}")
+        ok = ok and job["status"] == "ok"
+    sys.exit(0 if ok else 1)
+
+def _missing_conda(error):
+    click.echo(f"⚠ {error}")
+    sys.exit(1)
+
+def _installer(verbose=False):
+    """Blocking installer that prints progress, exiting when conda is missing"""
+    try:
+        return GeoDistroInstaller(verbose=verbose)
+    except PrerequisiteError as e:
+        _missing_conda(e)
+
+
+@cli.command()
+@click.option(
+    "--env-name", default="geo-distro", help="Environment name (matrix base name)"
+)
+@click.option(
+    "--python",
+    "pythons",
+    default=None,
+    help="Comma-separated Python versions of a matrix build to compare",
+)
+@click.option(
+    "--env", "envs", multiple=True, help="Environment to benchmark (repeatable)"
+)
+@click.option(
+    "--workload",
+    "workloads",
+    multiple=True,
+    type=click.Choice(list(benchmarks.WORKLOADS)),
+    help="Workload to run (repeatable)",
+)
+@click.option(
+    "--repeat", type=int, default=3, show_default=True, help="Runs per workload"
+)
+@click.option(
+    "--scale",
+    type=float,
+    default=1.0,
+    show_default=True,
+    help="Problem size multiplier",
+)
+@click.option(
+    "--output", type=click.Path(dir_okay=False), help="Write the results as JSON"
+)
+def bench(env_name, pythons, envs, workloads, repeat, scale, output):
+    """Compare geo workload speed and memory across environments"""
+    names = list(envs) or [
+        matrix_env_name(env_name, v) for v in _python_versions(pythons)
+    ]
+    names = names or [env_name]
+    installer = _installer()
+    interpreters = {}
+    for name in names:
+        python = installer._env_python(name)
+        if python is None:
+            click.echo(f"✗ Environment '{name}' not found")
+            return
+        interpreters[name] = str(python)
+
+    click.echo(f"⏱️ Running {len(workloads) or len(benchmarks.WORKLOADS)} workloads "
+               f"in {len(interpreters)} environments (median of {repeat})...")
+    results = benchmarks.benchmark_interpreters(interpreters, list(workloads) or None,
+                                                repeat, scale)
+    speed = benchmarks.relative_speed(results, names[0])
+
+    for name, reports in results.items():
+        version = next((r["python"] for r in reports.values() if "python" in r), "?")
+        click.echo(f"\n🐍 {name} (Python {version})")
+        click.echo(
+            f"{'workload':12} {'time (s)':>10} {'peak MB':>9} {'vs ' + names[0]:>20}"
+        )
+        for workload, report in reports.items():
+            if "error" in report:
+                click.echo(f"{workload:12} ✗ {report['error']}")
+                continue
+            relative = speed[name].get(workload)
+            relative = f"{relative:.2f}x" if relative else "-"
+            click.echo(f"{workload:12} {report['seconds']:10.3f} "
+                       f"{report['max_rss_mb']:9.0f} {relative:>20}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"results": results, "relative_speed": speed}, f, indent=2)
+        click.echo(f"\n✓ Results written to {output}")
+
+
+@cli.command()
+@click.option(
+    "--host", default="127.0.0.1", show_default=True, help="Address to listen on"
+)
+@click.option(
+    "--port",
+    type=int,
+    default=daemon.DEFAULT_PORT,
+    show_default=True,
+    help="TCP port to listen on",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="Listen on a Unix socket instead of TCP",
+)
+@click.option(
+    "--max-builds",
+    type=int,
+    default=None,
+    help="Concurrent builds (default: half the CPU count)",
+)
+@click.option(
+    "--max-commands",
+    type=int,
+    default=4,
+    show_default=True,
+    help="Concurrent solver/install commands across all builds",
+)
+@click.option("-v", "--verbose", is_flag=True, help="Verbose output")
+def serve(host, port, socket_path, max_builds, max_commands, verbose):
+    """Run a daemon that queues and deduplicates environment builds"""
+    provisioner = daemon.ProvisioningDaemon(max_builds, max_commands, verbose)
+    where = f"unix:{socket_path}" if socket_path else f"{host}:{port}"
+    click.echo(
+        f"🛰️ Serving builds on {where} ({provisioner.max_builds} concurrent builds)"
+    )
+    try:
+        asyncio.run(provisioner.serve_forever(host, port, socket_path))
+    except PrerequisiteError as e:
+        _missing_conda(e)
+    except KeyboardInterrupt:
+        click.echo("\n✓ Daemon stopped")
+
+@cli.group()
+def budget():
+    """Import time and memory budgets per library"""
+    pass
+
+def _budget_python(env_name):
+    """Interpreter to measure: an environment's, or the current one"""
+    if env_name is None:
+        return sys.executable
+    python = _installer()._env_python(env_name)
+    if python is None:
+        click.echo(f"✗ Environment '{env_name}' not found")
+        sys.exit(1)
+    return str(python)
+
+
+@budget.command(name="check")
+@click.option(
+    "--file",
+    "budget_file",
+    type=click.Path(dir_okay=False),
+    default=budgets.DEFAULT_BUDGET_FILE,
+    show_default=True,
+    help="Budget file",
+)
+@click.option(
+    "--env-name",
+    default=None,
+    help="Environment to measure (default: this interpreter)",
+)
+@click.option(
+    "--repeat",
+    type=int,
+    default=5,
+    show_default=True,
+    help="Fresh-interpreter runs per library (median is compared)",
+)
+def budget_check(budget_file, env_name, repeat):
+    """Fail when a library's import time or memory exceeds its budget"""
+    try:
+        limits = budgets.load_budgets(budget_file)
+    except (OSError, ValueError) as e:
+        click.echo(f"✗ Cannot read budget file: {e}")
+        sys.exit(2)
+    python = _budget_python(env_name)
+    click.echo(f"⏱️ Measuring imports (median of {repeat} fresh interpreters)...")
+    results = budgets.check_budgets(limits, python, repeat)
+
+    click.echo(
+        f"{'library':14} {'time (s)':>9} {'budget':>8} {'RSS MB':>8} {'budget':>8}"
+    )
+    for result in results:
+        if "error" in result:
+            click.echo(f"✗ {result['name']:12} {result['error']}")
+            continue
+        mark = "✓" if result["status"] == "ok" else "✗"
+        click.echo(f"{mark} {result['name']:12} {result['seconds']:9.3f} "
+                   f"{result['budget'].get('seconds', '-'):>8} {result['rss_mb']:8.1f} "
+                   f"{result['budget'].get('rss_mb', '-'):>8}")
+    failed = [r["name"] for r in results if r["status"] != "ok"]
+    if failed:
+        click.echo(f"⚠ Over budget or failing: {', '.join(failed)}")
+        sys.exit(1)
+    click.echo("✓ All imports within budget")
+
+
+@budget.command(name="record")
+@click.option(
+    "--file",
+    "budget_file",
+    type=click.Path(dir_okay=False),
+    default=budgets.DEFAULT_BUDGET_FILE,
+    show_default=True,
+    help="Budget file to write",
+)
+@click.option(
+    "--env-name",
+    default=None,
+    help="Environment to measure (default: this interpreter)",
+)
+@click.option(
+    "--repeat", type=int, default=5, show_default=True, help="Runs per library"
+)
+@click.option(
+    "--headroom",
+    type=float,
+    default=1.25,
+    show_default=True,
+    help="Multiplier applied to the measured medians",
+)
+def budget_record(budget_file, env_name, repeat, headroom):
+    """Write budgets from the current import footprint of the verifier's libraries"""
+    python = _budget_python(env_name)
+    results = budgets.check_budgets({"libraries": {}, "stack": {}}, python, repeat)
+    for result in results:
+        if "error" in result:
+            click.echo(f"⚠ {result['name']:12} not measured: {result['error']}")
+    with open(budget_file, "w") as f:
+        yaml.safe_dump(budgets.record_budgets(results, headroom), f, sort_keys=False)
+    click.echo(f"✓ Budgets written to {budget_file}")
+
+
+@cli.command()
+@click.option(
+    "--env-name",
+    default=None,
+    help="Environment to measure (default: this interpreter)",
+)
+@click.option(
+    "--use",
+    default="geopandas",
+    show_default=True,
+    help="The one library the simulated script actually uses",
+)
+@click.option("--repeat", type=int, default=5, show_default=True, help="Runs per mode")
+def startup(env_name, use, repeat):
+    """Compare script startup with eager and lazy (geodistro.lazy) stack imports"""
+    python = _budget_python(env_name)
+    click.echo(f"⏱️ Importing the stack and using {use} (median of {repeat})...")
+    report = lazy.benchmark_startup(python, use=use, repeat=repeat)
+    for mode in ("eager", "lazy"):
+        if "error" in report[mode]:
+            click.echo(f"✗ {mode:6} {report[mode]['error']}")
+            return
+        click.echo(f"✓ {mode:6} {report[mode]['seconds']:.3f}s")
+    saved = report["eager"]["seconds"] - report["lazy"]["seconds"]
+    modules = len(report["modules"])
+    click.echo(f"🚀 Lazy imports save {saved:.3f}s over {modules} installed modules")
+
+@cli.command()
+@click.option('--offline', is_flag=True, help='Use cached PyPI metadata only')
+@click.option('--bandwidth', type=float, default=10.0, show_default=True,
+              help='Assumed download speed in MB/s for the time estimate')
+@click.option('--json', 'as_json', is_flag=True, help='Print the full plan as JSON')
+def plan(offline, bandwidth, as_json):
+    """Check the package set for conflicts without changing anything"""
+    installer = _installer()
+    report = installer.plan_install(
+        fetch_missing=not offline, bandwidth=bandwidth * 1e6
+    )
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+    if report["conflicts"]:
+        sys.exit(1)
+
+
+@cli.command(name="mirror")
+@click.option(
+    "--package",
+    "packages",
+    multiple=True,
+    help="Extra package to mirror, replacing earlier extras (repeatable)",
+)
+@click.option(
+    "--status", is_flag=True, help="Show the mirrored channels without refreshing"
+)
+def mirror_command(packages, status):
+    """Create or refresh the local pruned repodata mirror"""
+    if status:
+        for url, manifest in mirror.RepodataMirror().status().items():
+            if manifest is None:
+                click.echo(f"✗ {url:45} not mirrored")
+            else:
+                click.echo(f"✓ {url:45} {manifest['platform']:10} "
+                           f"{len(manifest['packages'])} packages")
+        return
+    
+    roots = mirror.default_roots() + list(packages) if packages else None
+    installer = _installer()
+    installer.refresh_mirror(roots)
+
+@cli.command(name='index')
+@click.option('--prefix', 'prefixes', multiple=True, type=click.Path(file_okay=False),
+              help='Environment prefix to index (repeatable, default: every conda env)')
+def index_command(prefixes):
+    """Update the package index of all environments (only changed metadata is read)"""
+    # Environments that disappeared are only pruned when every env was listed
+    prune = not prefixes
+    prefixes = list(prefixes) or envindex.discover_envs(_installer().install_method)
+    index = envindex.EnvIndex()
+    stats = index.update(prefixes, prune=prune)
+    for env in index.envs():
+        changed = stats["changed"].get(env["prefix"], 0)
+        click.echo(
+            f"✓ {env['name']:25} {env['packages']:5} packages  {changed} changed"
+        )
+    for prefix in stats["removed"]:
+        click.echo(f"✗ {prefix} removed")
+    click.echo(
+        f"📇 Indexed {stats['envs']} environments in {stats['seconds']:.2f}s "
+        f"({index.path})"
     )
 
+
+@cli.command()
+@click.argument("requirements", nargs=-1)
+@click.option(
+    "--file",
+    "file_pattern",
+    help="Find packages owning files matching a glob, e.g. '*libgdal.so*'",
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the matches as JSON")
+def query(requirements, file_pattern, as_json):
+    """Find environments with packages matching requirements, e.g. 'gdal<3.6'"""
+    index = envindex.EnvIndex()
+    try:
+        matches = [
+            row for requirement in requirements for row in index.query(requirement)
+        ]
+    except ValueError as e:
+        click.echo(f"✗ {e}")
+        sys.exit(2)
+    if file_pattern:
+        matches += index.owners(file_pattern)
+    if as_json:
+        click.echo(json.dumps(matches, indent=2))
+        return
+    for row in matches:
+        detail = (
+            row.get("path")
+            or f"{row.get('build') or ''} {row.get('channel') or ''}".strip()
+        )
+        click.echo(
+            f"{row['env']:25} {row['name']:25} {row['version']:14} "
+            f"{row['manager']:6} {detail}"
+        )
+    click.echo(f"{len(matches)} matches")
+
+
+@cli.command()
+@click.option("--env-name", default="geo-distro", help="Environment name")
+@click.option(
+    "--mode",
+    type=click.Choice(bytecode.INVALIDATION_MODES),
+    default="timestamp",
+    help=".pyc invalidation mode",
+)
+@click.option(
+    "--benchmark", is_flag=True, help="Compare cold imports with and without .pyc files"
+)
+def precompile(env_name, mode, benchmark):
+    """Precompile bytecode for every site-packages tree of an environment"""
+    installer = _installer()
+    if not installer.precompile_bytecode(env_name, mode):
+        return
+    if benchmark:
+        click.echo("\n⏱️ Cold import benchmark (median of 3)...")
+        results = bytecode.benchmark_cold_imports(str(installer._env_python(env_name)))
+        click.echo(f"{'module':14} {'no .pyc (s)':>12} {'.pyc (s)':>10}")
+        for module, timings in results.items():
+            without_pyc, with_pyc = timings["without_pyc"], timings["with_pyc"]
+            click.echo(f"{module:14} {without_pyc:12.3f} {with_pyc:10.3f}")
+
+
+@cli.command()
+@click.option("--env-name", default="geo-distro", help="Environment name")
+@click.option(
+    "--profile",
+    type=click.Choice(tuning.PROFILES),
+    default="interactive",
+    help="Performance profile to apply",
+)
+@click.option(
+    "--benchmark", is_flag=True, help="Benchmark every profile on this machine"
+)
+@click.option("--remove", is_flag=True, help="Remove the performance profile")
+def tune(env_name, profile, benchmark, remove):
+    """Tune GDAL/PROJ settings of an environment"""
+    installer = _installer()
+    if remove:
+        prefix = installer._env_prefix(env_name)
+        if prefix is None:
+            click.echo(f"✗ Environment '{env_name}' not found")
+            return
+        for path in tuning.remove_profile(prefix):
+            click.echo(f"✓ Removed {path}")
+        return
+
+    if benchmark:
+        python = installer._env_python(env_name)
+        if python is None:
+            click.echo(f"✗ Environment '{env_name}' not found")
+            return
+        click.echo("⏱️ Running raster read/warp benchmark...")
+        results = tuning.benchmark_profiles(str(python))
+        click.echo(
+            f"{'profile':14} {'read (s)':>10} {'warp (s)':>10} {'total (s)':>10}"
+        )
+        for name, timings in results.items():
+            click.echo(f"{name:14} {timings['read_blocks']:10.3f} "
+                       f"{timings['warp']:10.3f} {timings['total']:10.3f}")
+        return
+
+    installer.tune_environment(env_name, profile)
+
+
 @cli.command()
-def verify():
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Re-import every library even if the environment is unchanged",
+)
+@click.option(
+    "--deep",
+    is_flag=True,
+    help="Also run functional probes (drivers, proj.db, I/O round-trips)",
+)
+@click.option(
+    "--timeout",
+    type=float,
+    default=30,
+    show_default=True,
+    help="Seconds allowed per functional probe",
+)
+def verify(force, deep, timeout):
     """Verify the installation"""
-    verify_installation()
+    ok = verify_installation(force=force)
+    if deep:
+        click.echo()
+        ok = verify_deep(force=force, timeout=timeout) and ok
+    sys.exit(0 if ok else 1)
 
 @cli.command()
 @click.option('--env-name', default='geo-distro', help='Environment name to remove')
@@ -59,4 +610,4 @@ def main():
     cli()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -12,8 +12,13 @@ class GeoDistroConfig:
     """Configuration for Geo Distribution"""
     
     ENV_NAME = "geo-distro"
+    PYTHON_VERSION = "3.9"
+    CACHE_DIR_ENV = "GEODISTRO_CACHE_DIR"
     CONDA_FORGE_CHANNELS = ["conda-forge", "defaults"]
     
+    # Channels used when solving the conda packages in one go
+    SOLVER_CHANNELS = ["conda-forge"]
+    
     # Core geospatial packages (conda)
     CORE_GEOSPATIAL = [
         "gdal", "geos", "proj", "geotiff", "libspatialindex",
@@ -79,6 +84,23 @@ class GeoDistroConfig:
         "ipywidgets"
     ]
     
+    # JupyterLab extensions, by the Python package that ships them prebuilt
+    JUPYTER_EXTENSIONS = [
+        "jupyterlab-geojson",
+        "jupyterlab-kernelspy"
+    ]
+    
+    # Modules imported by pre-warmed kernels before they are handed out
+    PRELOAD_MODULES = [
+        "geopandas",
+        "rasterio",
+        "shapely",
+        "pyproj"
+    ]
+    
+    # Kernelspec that starts kernels from the pre-warmed pool
+    KERNEL_POOL_NAME = "geo-prewarmed"
+    
     @classmethod
     def get_all_packages(cls) -> Dict[str, List[str]]:
         """Get all packages organized by category"""
@@ -89,4 +111,18 @@ class GeoDistroConfig:
             "advanced_analytics": cls.ADVANCED_ANALYTICS,
             "google_maps": cls.GOOGLE_MAPS,
             "dev_tools": cls.DEV_TOOLS,
-        }
\ No newline at end of file
+        }
+
+    @classmethod
+    def get_cache_dir(cls, name: Optional[str] = None) -> Path:
+        """Get (and create) the Geo Distribution cache directory"""
+        root = os.environ.get(cls.CACHE_DIR_ENV)
+        if root:
+            cache_dir = Path(root)
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+            cache_dir = Path(base) / "geodistro"
+        if name:
+            cache_dir = cache_dir / name
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return cache_dir
@@ -0,0 +1,177 @@
+"""
+Pooled, vectorized CRS transformations for Geo Distribution
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+from pyproj import Transformer
+
+# Transformers kept per thread; creating one costs milliseconds, using one microseconds
+TRANSFORMER_CACHE_SIZE = 64
+
+# Arrays smaller than this are transformed on the calling thread
+PARALLEL_THRESHOLD = 1_000_000
+
+# Smallest slice handed to a worker thread
+MIN_CHUNK_SIZE = 250_000
+
+_local = threading.local()
+
+# Worker threads live as long as the process, so their Transformer caches stay warm
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool(threads: int) -> ThreadPoolExecutor:
+    """Get the shared worker pool, created on first use and grown when needed"""
+    global _executor
+    with _executor_lock:
+        if _executor is None or _executor._max_workers < threads:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(
+                max_workers=max(threads, os.cpu_count() or 1),
+                thread_name_prefix="geodistro-crs",
+            )
+        return _executor
+
+
+def _reset_pool():
+    # A forked child inherits the pool object but none of its threads
+    global _executor
+    _executor = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool)
+
+
+def _cache_key(src: Any, dst: Any, options: dict) -> Tuple[Hashable, ...]:
+    """Build a hashable cache key from CRS inputs and transformer options"""
+    return (str(src), str(dst), tuple(sorted(options.items())))
+
+
+def _thread_cache() -> "OrderedDict[Tuple[Hashable, ...], Transformer]":
+    """Get the transformer LRU of the current thread"""
+    cache = getattr(_local, "transformers", None)
+    if cache is None:
+        cache = _local.transformers = OrderedDict()
+    return cache
+
+
+def get_transformer(
+    src: Any, dst: Any, always_xy: bool = True, **options
+) -> Transformer:
+    """Get a cached Transformer for the current thread
+
+    pyproj Transformer objects are not safe to share between threads, so each
+    thread keeps its own bounded LRU keyed by (src, dst, options).
+    """
+    options["always_xy"] = always_xy
+    key = _cache_key(src, dst, options)
+    cache = _thread_cache()
+    transformer = cache.get(key)
+    if transformer is not None:
+        cache.move_to_end(key)
+        return transformer
+
+    transformer = Transformer.from_crs(src, dst, **options)
+    cache[key] = transformer
+    if len(cache) > TRANSFORMER_CACHE_SIZE:
+        cache.popitem(last=False)
+    return transformer
+
+
+def clear_transformer_cache():
+    """Drop the cached transformers of the current thread"""
+    _thread_cache().clear()
+
+
+def _check_buffer(array: np.ndarray, name: str):
+    """Make sure an array can be transformed in place"""
+    if not isinstance(array, np.ndarray) or array.dtype != np.float64:
+        raise TypeError(f"{name} must be a float64 NumPy array")
+    if not array.flags.c_contiguous or not array.flags.writeable:
+        raise ValueError(f"{name} must be a writeable, C-contiguous array")
+
+
+def _transform_chunk(src, dst, options, start, stop, x, y, z):
+    """Transform one slice of the coordinate buffers in place"""
+    transformer = get_transformer(src, dst, **options)
+    if z is None:
+        transformer.transform(x[start:stop], y[start:stop], inplace=True)
+    else:
+        transformer.transform(x[start:stop], y[start:stop], z[start:stop], inplace=True)
+
+
+def transform_xy(
+    x: np.ndarray,
+    y: np.ndarray,
+    src: Any,
+    dst: Any,
+    z: Optional[np.ndarray] = None,
+    threads: Optional[int] = None,
+    **options,
+) -> Tuple[np.ndarray, ...]:
+    """Transform contiguous coordinate buffers in place
+
+    Arrays with at least PARALLEL_THRESHOLD points are split into contiguous
+    slices and transformed on a persistent thread pool; PROJ releases the GIL
+    while transforming, so the slices run concurrently, and each worker
+    reuses its cached Transformers across calls.
+    """
+    _check_buffer(x, "x")
+    _check_buffer(y, "y")
+    if z is not None:
+        _check_buffer(z, "z")
+    if x.shape != y.shape or (z is not None and z.shape != x.shape):
+        raise ValueError("Coordinate arrays must have the same shape")
+
+    size = x.size
+    if threads is None:
+        threads = os.cpu_count() or 1
+    threads = min(threads, max(1, size // MIN_CHUNK_SIZE))
+
+    flat = [x.reshape(-1), y.reshape(-1), None if z is None else z.reshape(-1)]
+    if threads == 1 or size < PARALLEL_THRESHOLD:
+        _transform_chunk(src, dst, options, 0, size, *flat)
+    else:
+        bounds = np.linspace(0, size, threads + 1, dtype=np.int64)
+        executor = _pool(threads)
+        futures = [
+            executor.submit(_transform_chunk, src, dst, options,
+                            int(start), int(stop), *flat)
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        for future in futures:
+            future.result()
+
+    return (x, y) if z is None else (x, y, z)
+
+
+def transform_coords(
+    coords: np.ndarray,
+    src: Any,
+    dst: Any,
+    threads: Optional[int] = None,
+    **options,
+) -> np.ndarray:
+    """Transform an (N, 2) or (N, 3) coordinate array in place"""
+    if coords.ndim != 2 or coords.shape[1] not in (2, 3):
+        raise ValueError("coords must have shape (N, 2) or (N, 3)")
+    if not coords.flags.writeable:
+        raise ValueError("coords must be writeable")
+
+    # Interleaved columns are strided, so work on contiguous copies and write back
+    columns = [np.ascontiguousarray(coords[:, i], dtype=np.float64)
+               for i in range(coords.shape[1])]
+    z = columns[2] if len(columns) == 3 else None
+    transform_xy(columns[0], columns[1], src, dst, z=z, threads=threads, **options)
+    for i, column in enumerate(columns):
+        coords[:, i] = column
+    return coords
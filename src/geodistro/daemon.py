@@ -0,0 +1,396 @@
+"""
+Provisioning daemon for Geo Distribution
+
+`geo-distro serve` accepts environment build requests over HTTP (TCP or a
+Unix socket) into a queue. Requests with the same manifest hash, i.e. the
+same build options and package set, that arrive while an identical build is
+queued or running are attached to that build instead of starting another.
+Concurrent builds are bounded by the CPU count, and the commands inside
+them (solves, package extraction, compileall) by a shared I/O limit.
+
+API (JSON bodies and responses):
+
+    POST /builds[?wait=1]   submit install_all options, e.g. {"python": "3.11"}
+    GET  /builds            all known builds
+    GET  /builds/<id>       one build, with the tail of its progress log
+    GET  /metrics           queue depth, running builds and latencies
+                            (Prometheus text format)
+"""
+
+import asyncio
+import hashlib
+import http.client
+import inspect
+import json
+import os
+import socket
+import statistics
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from geodistro.core import GeoDistroConfig
+from geodistro.installer import DEFAULT_CONCURRENCY, AsyncGeoDistroInstaller
+
+DEFAULT_PORT = 8765
+
+# Options a request may set: the keyword arguments of install_all, with their defaults
+BUILD_OPTIONS = {
+    name: parameter.default
+    for name, parameter in inspect.signature(
+        AsyncGeoDistroInstaller.install_all
+    ).parameters.items()
+    if name != "self"
+}
+# Shortcuts live at fixed paths in the home directory, so concurrent builds
+# would overwrite each other's; they are only written when asked for
+BUILD_OPTIONS["create_shortcuts"] = False
+
+# Builds starting within this many seconds of a mirror refresh reuse it
+MIRROR_REFRESH_INTERVAL = 600.0
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed"}
+
+
+def default_max_builds() -> int:
+    """Concurrent builds the host's CPUs can sustain (each build runs several processes)"""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def normalize_options(options: Dict) -> Dict:
+    """Build options with defaults filled in, rejecting unknown ones"""
+    unknown = sorted(set(options) - set(BUILD_OPTIONS))
+    if unknown:
+        raise ValueError(f"Unknown build options: {', '.join(unknown)}")
+    normalized = dict(BUILD_OPTIONS, **options)
+    normalized["env_name"] = normalized["env_name"] or GeoDistroConfig.ENV_NAME
+    normalized["python"] = normalized["python"] or GeoDistroConfig.PYTHON_VERSION
+    return normalized
+
+
+def manifest_hash(options: Dict) -> str:
+    """Identity of a build: its normalized options and the package manifest"""
+    manifest = {
+        "options": normalize_options(options),
+        "packages": GeoDistroConfig.get_all_packages(),
+        "extensions": GeoDistroConfig.JUPYTER_EXTENSIONS,
+        "channels": GeoDistroConfig.SOLVER_CHANNELS,
+    }
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+
+class ProvisioningDaemon:
+    """Build queue with request coalescing and bounded concurrency"""
+
+    def __init__(self, max_builds: Optional[int] = None,
+                 max_commands: int = DEFAULT_CONCURRENCY,
+                 verbose: bool = False, history: int = 200):
+        self.max_builds = max_builds or default_max_builds()
+        self.installer = AsyncGeoDistroInstaller(
+            verbose=verbose, max_concurrency=max_commands
+        )
+        self.history = history
+        self.jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._inflight: Dict[str, Dict] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        self._env_locks: Dict[str, asyncio.Lock] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._mirror_lock: Optional[asyncio.Lock] = None
+        self._shortcut_lock: Optional[asyncio.Lock] = None
+        self._mirror_refreshed = float("-inf")
+        self._workers: List[asyncio.Task] = []
+        self._counter = 0
+        self.counters = {"requests": 0, "coalesced": 0, "ok": 0, "failed": 0}
+        self.build_seconds: deque = deque(maxlen=1000)
+        self.wait_seconds: deque = deque(maxlen=1000)
+
+    async def start(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                    socket_path: Optional[str] = None) -> asyncio.AbstractServer:
+        """Start the build workers and listen for requests"""
+        await self.installer.check_prerequisites()
+        self._queue = asyncio.Queue()
+        self._mirror_lock = asyncio.Lock()
+        self._shortcut_lock = asyncio.Lock()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.max_builds)
+        ]
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            return await asyncio.start_unix_server(self._handle, path=socket_path)
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def close(self):
+        """Stop the workers; running builds are cancelled"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, options: Dict) -> Tuple[Dict, bool]:
+        """Queue a build, or attach to an identical one in flight
+
+        Returns the job and whether the request was coalesced.
+        """
+        key = manifest_hash(options)
+        self.counters["requests"] += 1
+        job = self._inflight.get(key)
+        if job is not None:
+            job["requests"] += 1
+            self.counters["coalesced"] += 1
+            return job, True
+
+        self._counter += 1
+        job = {
+            "id": f"{key[:12]}-{self._counter}",
+            "manifest": key,
+            "options": normalize_options(options),
+            "status": "queued",
+            "requests": 1,
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "result": None,
+            "log": deque(maxlen=50),
+        }
+        self._inflight[key] = job
+        self._done[job["id"]] = asyncio.Event()
+        self.jobs[job["id"]] = job
+        self._trim_history()
+        self._queue.put_nowait(job)
+        return job, False
+
+    async def wait(self, job_id: str) -> Dict:
+        """Wait until a build has finished"""
+        await self._done[job_id].wait()
+        return self.jobs[job_id]
+
+    def _trim_history(self):
+        while len(self.jobs) > self.history:
+            job_id, job = next(iter(self.jobs.items()))
+            if job["finished"] is None:
+                break
+            del self.jobs[job_id]
+            self._done.pop(job_id, None)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            env_name = job["options"]["env_name"]
+            # Different manifests for one environment must not build over each other
+            lock = self._env_locks.setdefault(env_name, asyncio.Lock())
+            try:
+                async with lock:
+                    await self._build(job)
+            finally:
+                self._queue.task_done()
+
+    async def _build(self, job: Dict):
+        job["status"] = "running"
+        job["started"] = time.time()
+        self.wait_seconds.append(job["started"] - job["submitted"])
+
+        def log(event: Dict):
+            if event["type"] == "message" and event["message"].strip():
+                job["log"].append(event["message"].strip())
+
+        installer = self.installer.child(job["options"]["env_name"], on_event=log)
+        options = dict(job["options"])
+        try:
+            # The mirror is shared: refresh it here, once for builds close together,
+            # rather than concurrently in every build
+            if options["use_mirror"] and options["refresh_mirror"]:
+                await self._refresh_mirror(installer)
+            options["refresh_mirror"] = False
+            if options["create_shortcuts"]:
+                async with self._shortcut_lock:
+                    result = await installer.install_all(**options)
+            else:
+                result = await installer.install_all(**options)
+            job["result"] = {
+                "ok": result.ok,
+                "error": result.error,
+                "trace_file": str(result.trace_file) if result.trace_file else None,
+                "seconds": result.seconds,
+            }
+        except Exception as e:
+            # Any failure fails this job only; the worker must live on for the next one
+            job["result"] = {
+                "ok": False,
+                "error": f"{type(e).__name__}: {e}",
+                "trace_file": None,
+                "seconds": time.time() - job["started"],
+            }
+        finally:
+            job["finished"] = time.time()
+            job["status"] = "ok" if job["result"] and job["result"]["ok"] else "failed"
+            self.counters[job["status"]] += 1
+            self.build_seconds.append(job["finished"] - job["started"])
+            self._inflight.pop(job["manifest"], None)
+            self._done[job["id"]].set()
+
+    async def _refresh_mirror(self, installer: AsyncGeoDistroInstaller):
+        """Refresh the repodata mirror unless it was refreshed recently"""
+        async with self._mirror_lock:
+            if time.monotonic() - self._mirror_refreshed < MIRROR_REFRESH_INTERVAL:
+                return
+            if await installer._mirror_ready():
+                await installer.refresh_mirror()
+            self._mirror_refreshed = time.monotonic()
+
+    def queue_depth(self) -> int:
+        return sum(1 for job in self.jobs.values() if job["status"] == "queued")
+
+    def running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job["status"] == "running")
+
+    def metrics(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            "# TYPE geodistro_queue_depth gauge",
+            f"geodistro_queue_depth {self.queue_depth()}",
+            "# TYPE geodistro_builds_running gauge",
+            f"geodistro_builds_running {self.running()}",
+            "# TYPE geodistro_build_slots gauge",
+            f"geodistro_build_slots {self.max_builds}",
+            "# TYPE geodistro_requests_total counter",
+            f"geodistro_requests_total {self.counters['requests']}",
+            "# TYPE geodistro_requests_coalesced_total counter",
+            f"geodistro_requests_coalesced_total {self.counters['coalesced']}",
+            "# TYPE geodistro_builds_total counter",
+            f'geodistro_builds_total{{status="ok"}} {self.counters["ok"]}',
+            f'geodistro_builds_total{{status="failed"}} {self.counters["failed"]}',
+        ]
+        for name, samples in (("build_seconds", self.build_seconds),
+                              ("queue_wait_seconds", self.wait_seconds)):
+            lines.append(f"# TYPE geodistro_{name} summary")
+            if len(samples) >= 2:
+                cuts = statistics.quantiles(samples, n=20)
+                lines.append(
+                    f'geodistro_{name}{{quantile="0.5"}} {statistics.median(samples):.3f}'
+                )
+                lines.append(f'geodistro_{name}{{quantile="0.95"}} {cuts[-1]:.3f}')
+            lines.append(f"geodistro_{name}_sum {sum(samples):.3f}")
+            lines.append(f"geodistro_{name}_count {len(samples)}")
+        return "\n".join(lines) + "\n"
+
+    def describe(self, job: Dict) -> Dict:
+        """JSON-serializable view of a job"""
+        return dict(job, log=list(job["log"]))
+
+    async def _route(self, method: str, target: str, body: bytes) -> Tuple[int, object]:
+        url = urlsplit(target)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["metrics"] and method == "GET":
+            return 200, self.metrics()
+        if parts == ["builds"] and method == "GET":
+            return 200, [self.describe(job) for job in self.jobs.values()]
+        if parts == ["builds"] and method == "POST":
+            options = json.loads(body or b"{}")
+            if not isinstance(options, dict):
+                raise ValueError("Build options must be a JSON object")
+            job, coalesced = await self.submit(options)
+            if parse_qs(url.query).get("wait") == ["1"]:
+                job = await self.wait(job["id"])
+            return 202 if job["finished"] is None else 200, dict(self.describe(job),
+                                                                 coalesced=coalesced)
+        if len(parts) == 2 and parts[0] == "builds":
+            if method != "GET":
+                return 405, {"error": f"{method} not allowed"}
+            job = self.jobs.get(parts[1])
+            if job is None:
+                return 404, {"error": f"No build '{parts[1]}'"}
+            return 200, self.describe(job)
+        return 404, {"error": f"No route for {method} {url.path}"}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one HTTP/1.1 request per connection"""
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if line in ("\r\n", "\n", ""):
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            try:
+                method, target, _ = request_line.split(" ", 2)
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self._route(method, target, body)
+            except (ValueError, asyncio.IncompleteReadError) as e:
+                status, payload = 400, {"error": str(e)}
+
+            if isinstance(payload, str):
+                content, content_type = payload.encode(), "text/plain; version=0.0.4"
+            else:
+                content, content_type = (
+                    json.dumps(payload, default=str).encode(),
+                    "application/json",
+                )
+            writer.write(f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                         f"Content-Type: {content_type}\r\n"
+                         f"Content-Length: {len(content)}\r\n"
+                         "Connection: close\r\n\r\n".encode() + content)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                            socket_path: Optional[str] = None):
+        server = await self.start(host, port, socket_path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix domain socket"""
+
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def request(address: str, method: str, path: str, body: Optional[Dict] = None,
+            timeout: Optional[float] = None) -> Tuple[int, object]:
+    """Send a request to a daemon at host:port or unix:/path/to/socket"""
+    if address.startswith("unix:"):
+        connection = _UnixHTTPConnection(address[len("unix:"):], timeout=timeout)
+    else:
+        host, _, port = address.rpartition(":")
+        connection = http.client.HTTPConnection(
+            host or "127.0.0.1", int(port), timeout=timeout
+        )
+    try:
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        connection.request(method, path, body=data, headers=headers)
+        response = connection.getresponse()
+        content = response.read().decode()
+        if response.getheader("Content-Type", "").startswith("application/json"):
+            return response.status, json.loads(content)
+        return response.status, content
+    finally:
+        connection.close()
+
+
+def submit_build(address: str, options: Dict, wait: bool = True) -> Dict:
+    """Submit a build to a daemon, by default waiting until it has finished"""
+    status, job = request(
+        address, "POST", "/builds?wait=1" if wait else "/builds", options
+    )
+    if status >= 400:
+        raise ValueError(job["error"] if isinstance(job, dict) else job)
+    return job
@@ -0,0 +1,390 @@
+"""
+Parallel, resumable downloads for Geo Distribution
+
+Large products (satellite scenes, elevation tiles) are fetched with HTTP
+range requests: each file is split into parts that download concurrently
+over a shared, bounded pool of connections. Finished parts are recorded next
+to the partial file, so an interrupted run resumes where it stopped instead
+of starting from zero. Servers without range support fall back to a single
+stream. Files are checked against their MD5/SHA checksum before they are
+renamed into place.
+
+A shared token bucket caps the total bandwidth. The free disk space,
+minus what in-flight downloads still need, is checked before each file
+starts.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import requests
+
+PathLike = Union[str, Path]
+
+DEFAULT_CONCURRENCY = 4
+
+# Bytes per range request; also the unit of resume
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+
+# Bytes read from a response between progress and bandwidth updates
+BLOCK_SIZE = 256 * 1024
+
+# Progress events per file are sent at most this often (seconds)
+PROGRESS_INTERVAL = 0.5
+
+
+class DownloadError(RuntimeError):
+    """A download failed after its retries"""
+
+
+class DiskSpaceError(DownloadError):
+    """Not enough free disk space for a download"""
+
+
+@dataclass
+class DownloadItem:
+    """One file to fetch; checksum is 'md5:<hex>', 'sha256:<hex>' or a bare MD5"""
+    url: str
+    path: Path
+    checksum: Optional[str] = None
+    name: str = ""
+
+    def __post_init__(self):
+        self.path = Path(self.path)
+        self.name = self.name or self.path.name
+
+
+@dataclass
+class DownloadResult:
+    """Outcome of one download; bytes were fetched now, resumed were already on disk"""
+    name: str
+    path: Path
+    ok: bool
+    size: Optional[int] = None
+    bytes: int = 0
+    resumed: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    def __bool__(self):
+        return self.ok
+
+
+class RateLimiter:
+    """Token bucket shared by all connections; rate is bytes per second"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else rate)
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount: int):
+        """Account for amount bytes, sleeping while the bucket is in debt"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= amount
+            debt = -self.tokens
+        if debt > 0:
+            time.sleep(debt / self.rate)
+
+
+def _digest(checksum: str):
+    algorithm, _, expected = checksum.rpartition(":")
+    return hashlib.new(algorithm.lower() or "md5"), expected.lower()
+
+
+def file_checksum_ok(path: Path, checksum: str) -> bool:
+    """Compare a file with an 'algorithm:hex' checksum"""
+    digest, expected = _digest(checksum)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest() == expected
+
+
+class Downloader:
+    """Download many files concurrently with resume, checksums and limits
+
+    max_concurrency bounds both the files in flight and the open
+    connections. rate_limit (bytes/s) is shared by all of them. Files need
+    min_free_bytes left on their filesystem after every in-flight download
+    completes. Events are dicts with a "type" of "message" or "progress"
+    (name, done and total bytes) sent to on_event.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_CONCURRENCY,
+                 part_size: int = DEFAULT_PART_SIZE, rate_limit: Optional[float] = None,
+                 min_free_bytes: int = 0, max_retries: int = 5, backoff: float = 1.0,
+                 timeout: float = 60.0, session: Optional[requests.Session] = None,
+                 on_event: Optional[Callable[[Dict], Any]] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.part_size = part_size
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.min_free_bytes = min_free_bytes
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.on_event = on_event
+        self._lock = threading.Lock()
+        self._reserved: Dict[Path, int] = {}
+
+    def _emit(self, event: Dict):
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def _say(self, message: str):
+        self._emit({"type": "message", "message": message})
+
+    def _retrying(self, func, *args):
+        """Call func, retrying with exponential backoff on network errors"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args)
+            except (requests.RequestException, DownloadError) as e:
+                if isinstance(e, DiskSpaceError) or attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _probe(self, url: str) -> Dict:
+        """Size, ETag and range support, from a one-byte range request"""
+        with self.session.get(url, headers={"Range": "bytes=0-0"}, stream=True,
+                              timeout=self.timeout) as response:
+            response.raise_for_status()
+            content_range = response.headers.get("Content-Range", "")
+            if response.status_code == 206 and "/" in content_range:
+                total = content_range.rsplit("/", 1)[1]
+                size = int(total) if total.isdigit() else None
+                return {"size": size, "ranges": size is not None,
+                        "etag": response.headers.get("ETag")}
+            length = response.headers.get("Content-Length")
+            return {"size": int(length) if length else None, "ranges": False,
+                    "etag": response.headers.get("ETag")}
+
+    def _reserve(self, item: DownloadItem, needed: int):
+        """Claim disk space for the rest of a download or raise DiskSpaceError"""
+        with self._lock:
+            free = shutil.disk_usage(item.path.parent).free
+            pending = sum(self._reserved.values())
+            if free - pending - needed < self.min_free_bytes:
+                raise DiskSpaceError(
+                    f"{item.name} needs {needed} bytes; {free - pending} free after "
+                    f"in-flight downloads, {self.min_free_bytes} must stay free")
+            self._reserved[item.path] = needed
+
+    def _release(self, item: DownloadItem):
+        with self._lock:
+            self._reserved.pop(item.path, None)
+
+    def _fetch_range(self, item: DownloadItem, part_file: Path, start: int, end: int,
+                     progress: Callable[[int], None]):
+        """Write bytes start..end (inclusive) at their offset, resuming within the range"""
+        position = start
+
+        def attempt():
+            nonlocal position
+            headers = {"Range": f"bytes={position}-{end}"}
+            with self.session.get(item.url, headers=headers, stream=True,
+                                  timeout=self.timeout) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise DownloadError(
+                        f"{item.name}: server ignored the range request"
+                    )
+                with open(part_file, "r+b") as f:
+                    f.seek(position)
+                    for block in response.iter_content(BLOCK_SIZE):
+                        if self.limiter:
+                            self.limiter.consume(len(block))
+                        f.write(block)
+                        position += len(block)
+                        progress(len(block))
+            if position <= end:
+                raise DownloadError(
+                    f"{item.name}: connection closed at byte {position}"
+                )
+
+        self._retrying(attempt)
+
+    def _fetch_stream(self, item: DownloadItem, part_file: Path,
+                      progress: Callable[[int], None]) -> int:
+        """Download the whole file in one response, restarting on failure"""
+        def attempt():
+            received = 0
+            try:
+                with self.session.get(
+                    item.url, stream=True, timeout=self.timeout
+                ) as response:
+                    response.raise_for_status()
+                    expected = response.headers.get("Content-Length")
+                    with open(part_file, "wb") as f:
+                        for block in response.iter_content(BLOCK_SIZE):
+                            if self.limiter:
+                                self.limiter.consume(len(block))
+                            f.write(block)
+                            received += len(block)
+                            progress(len(block))
+                if expected and received != int(expected):
+                    raise DownloadError(
+                        f"{item.name}: got {received} of {expected} bytes"
+                    )
+            except Exception:
+                # The next attempt starts over
+                progress(-received)
+                raise
+            return received
+
+        return self._retrying(attempt)
+
+    def _download(
+        self, item: DownloadItem, parts: ThreadPoolExecutor
+    ) -> DownloadResult:
+        start = time.perf_counter()
+        item.path.parent.mkdir(parents=True, exist_ok=True)
+        part_file = item.path.with_name(item.path.name + ".part")
+        state_file = item.path.with_name(item.path.name + ".part.json")
+        counters = {"bytes": 0, "emitted": 0.0}
+        counter_lock = threading.Lock()
+        result = DownloadResult(item.name, item.path, ok=False)
+
+        info = self._retrying(self._probe, item.url)
+        size = result.size = info["size"]
+        state = json.loads(state_file.read_text()) if state_file.exists() else {}
+        fresh = (
+            state.get("url") != item.url
+            or state.get("size") != size
+            or state.get("etag") != info["etag"]
+            or state.get("part_size") != self.part_size
+            or not part_file.exists()
+            or part_file.stat().st_size != size
+        )
+        if fresh:
+            state = {"url": item.url, "size": size, "etag": info["etag"],
+                     "part_size": self.part_size, "done": []}
+
+        ranges = []
+        if info["ranges"]:
+            for index, offset in enumerate(range(0, size, self.part_size)):
+                if index not in state["done"]:
+                    ranges.append(
+                        (index, offset, min(offset + self.part_size, size) - 1)
+                    )
+            result.resumed = size - sum(end - offset + 1 for _, offset, end in ranges)
+        else:
+            state["done"] = []
+        if result.resumed:
+            self._say(
+                f"↻ Resuming {item.name} ({result.resumed} of {size} bytes on disk)"
+            )
+
+        def progress(amount: int, final: bool = False):
+            with counter_lock:
+                counters["bytes"] += amount
+                now = time.monotonic()
+                if not final and now - counters["emitted"] < PROGRESS_INTERVAL:
+                    return
+                counters["emitted"] = now
+                done = result.resumed + counters["bytes"]
+            self._emit(
+                {"type": "progress", "name": item.name, "done": done, "total": size}
+            )
+
+        def part_done(index: int):
+            with counter_lock:
+                state["done"].append(index)
+                tmp = state_file.with_suffix(".tmp")
+                tmp.write_text(json.dumps(state))
+                tmp.replace(state_file)
+
+        def fetch_part(index, offset, end):
+            self._fetch_range(item, part_file, offset, end, progress)
+            part_done(index)
+
+        self._reserve(item, size - result.resumed if size else 0)
+        try:
+            if info["ranges"]:
+                if fresh:
+                    # Bytes left over from another version of the file must not survive
+                    with open(part_file, "wb") as f:
+                        f.truncate(size)
+                state_file.write_text(json.dumps(state))
+                futures = [parts.submit(fetch_part, *r) for r in ranges]
+                errors = [f.exception() for f in futures]
+                errors = [e for e in errors if e is not None]
+                if errors:
+                    raise errors[0]
+            else:
+                self._fetch_stream(item, part_file, progress)
+            progress(0, final=True)
+
+            if item.checksum and not file_checksum_ok(part_file, item.checksum):
+                part_file.unlink()
+                state_file.unlink(missing_ok=True)
+                raise DownloadError(f"{item.name}: checksum mismatch")
+            os.replace(part_file, item.path)
+            state_file.unlink(missing_ok=True)
+            result.ok = True
+        finally:
+            self._release(item)
+            result.bytes = counters["bytes"]
+            result.seconds = round(time.perf_counter() - start, 3)
+        return result
+
+    def download(self, items: Iterable[DownloadItem]) -> List[DownloadResult]:
+        """Fetch every item; failures are reported in the results, not raised"""
+        items = list(items)
+
+        def run(item: DownloadItem) -> DownloadResult:
+            if item.path.exists() and (
+                not item.checksum or file_checksum_ok(item.path, item.checksum)
+            ):
+                return DownloadResult(
+                    item.name, item.path, ok=True, size=item.path.stat().st_size
+                )
+            self._say(f"⬇ Downloading {item.name}")
+            try:
+                result = self._download(item, parts)
+            except (requests.RequestException, DownloadError, OSError) as e:
+                self._say(f"✗ {item.name}: {e}")
+                return DownloadResult(item.name, item.path, ok=False, error=str(e))
+            self._say(f"✓ {item.name} ({result.bytes} bytes in {result.seconds}s)")
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as parts, \
+                ThreadPoolExecutor(max_workers=self.max_concurrency) as files:
+            return list(files.map(run, items))
+
+
+def sentinelsat_items(
+    api, product_ids: Iterable[str], directory: PathLike
+) -> List[DownloadItem]:
+    """Download items for Copernicus products found with sentinelsat
+
+    Pass api.session as the Downloader session so requests are authenticated.
+    """
+    items = []
+    for product_id in product_ids:
+        odata = api.get_product_odata(product_id)
+        items.append(
+            DownloadItem(
+                url=odata["url"],
+                path=Path(directory) / f"{odata['title']}.zip",
+                checksum=f"md5:{odata['md5']}" if odata.get("md5") else None,
+                name=odata["title"],
+            )
+        )
+    return items
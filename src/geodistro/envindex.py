@@ -0,0 +1,283 @@
+"""
+Cross-environment package index for Geo Distribution
+
+A SQLite database records the packages, versions, builds and files of every
+environment on the host, from conda-meta/*.json for conda packages and from
+*.dist-info for pip-installed ones. Each source file is stored with its
+mtime and size, so an update re-reads only what changed since the last run.
+Queries are then index lookups instead of one `conda list` per environment.
+"""
+
+import json
+import sqlite3
+import subprocess
+import time
+from email.parser import Parser
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from geodistro.core import GeoDistroConfig
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS envs (
+    id INTEGER PRIMARY KEY,
+    prefix TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    indexed REAL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    env_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (env_id, path)
+);
+CREATE TABLE IF NOT EXISTS packages (
+    id INTEGER PRIMARY KEY,
+    env_id INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    build TEXT,
+    channel TEXT,
+    manager TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    package_id INTEGER NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS packages_name ON packages (name);
+CREATE INDEX IF NOT EXISTS packages_source ON packages (env_id, source);
+CREATE INDEX IF NOT EXISTS files_package ON files (package_id);
+"""
+
+
+def discover_envs(conda: str = "conda") -> List[Path]:
+    """Prefixes of all environments known to conda"""
+    result = subprocess.run(
+        [conda, "env", "list", "--json"], capture_output=True, text=True, check=True
+    )
+    return [Path(prefix) for prefix in json.loads(result.stdout).get("envs", [])]
+
+
+def _site_packages(prefix: Path) -> List[Path]:
+    return sorted(prefix.glob("lib/python*/site-packages")) + sorted(
+        prefix.glob("Lib/site-packages")
+    )
+
+
+def _sources(prefix: Path) -> Dict[str, Tuple[int, int]]:
+    """Package metadata files of an environment with their (mtime_ns, size)"""
+    paths = list((prefix / "conda-meta").glob("*.json"))
+    for site in _site_packages(prefix):
+        paths.extend(site.glob("*.dist-info/RECORD"))
+    sources = {}
+    for path in paths:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        sources[path.relative_to(prefix).as_posix()] = (st.st_mtime_ns, st.st_size)
+    return sources
+
+
+def _read_conda_record(path: Path) -> Optional[Dict]:
+    record = json.loads(path.read_text())
+    if "name" not in record:
+        return None
+    return {
+        "name": canonicalize_name(record["name"]),
+        "version": record.get("version", ""),
+        "build": record.get("build"),
+        "channel": record.get("channel"),
+        "manager": "conda",
+        "files": record.get("files", []),
+    }
+
+
+def _read_dist_info(prefix: Path, record_path: Path) -> Optional[Dict]:
+    dist_info = record_path.parent
+    # Python packages installed by conda also have a dist-info; conda-meta covers them
+    installer = dist_info / "INSTALLER"
+    if installer.exists() and installer.read_text().strip() == "conda":
+        return None
+    metadata = Parser().parsestr((dist_info / "METADATA").read_text(errors="replace"),
+                                 headersonly=True)
+    site = dist_info.parent.relative_to(prefix).as_posix()
+    files = [f"{site}/{line.split(',')[0]}"
+             for line in record_path.read_text(errors="replace").splitlines() if line]
+    return {"name": canonicalize_name(metadata["Name"] or dist_info.name.split("-")[0]),
+            "version": metadata["Version"] or "", "build": None,
+            "channel": "pypi", "manager": "pip", "files": files}
+
+
+def _version_matches(version: str, requirement: Requirement) -> bool:
+    if not requirement.specifier:
+        return True
+    try:
+        return Version(version) in requirement.specifier
+    except InvalidVersion:
+        return False
+
+
+class EnvIndex:
+    """SQLite index of the packages and files of many environments"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or GeoDistroConfig.get_cache_dir("index") / "envs.sqlite")
+        self.db = sqlite3.connect(str(self.path))
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _env_id(self, prefix: Path) -> int:
+        row = self.db.execute(
+            "SELECT id FROM envs WHERE prefix = ?", (str(prefix),)
+        ).fetchone()
+        if row:
+            return row["id"]
+        return self.db.execute("INSERT INTO envs (prefix, name) VALUES (?, ?)",
+                               (str(prefix), prefix.name)).lastrowid
+
+    def _drop_sources(self, env_id: int, sources: Iterable[str]):
+        for source in sources:
+            ids = [
+                row["id"]
+                for row in self.db.execute(
+                    "SELECT id FROM packages WHERE env_id = ? AND source = ?",
+                    (env_id, source),
+                )
+            ]
+            self.db.executemany(
+                "DELETE FROM files WHERE package_id = ?", [(i,) for i in ids]
+            )
+            self.db.execute("DELETE FROM packages WHERE env_id = ? AND source = ?",
+                            (env_id, source))
+            self.db.execute(
+                "DELETE FROM sources WHERE env_id = ? AND path = ?", (env_id, source)
+            )
+
+    def update_env(self, prefix: Path) -> int:
+        """Re-read the changed metadata files of one environment; returns their count"""
+        prefix = Path(prefix)
+        with self.db:
+            env_id = self._env_id(prefix)
+            known = {
+                row["path"]: (row["mtime_ns"], row["size"])
+                for row in self.db.execute(
+                    "SELECT path, mtime_ns, size FROM sources WHERE env_id = ?",
+                    (env_id,),
+                )
+            }
+            current = _sources(prefix)
+            changed = [
+                path for path, stat in current.items() if known.get(path) != tuple(stat)
+            ]
+            self._drop_sources(
+                env_id, [path for path in known if path not in current] + changed
+            )
+
+            for source in changed:
+                path = prefix / source
+                try:
+                    if source.startswith("conda-meta/"):
+                        package = _read_conda_record(path)
+                    else:
+                        package = _read_dist_info(prefix, path)
+                except (OSError, ValueError):
+                    continue
+                mtime_ns, size = current[source]
+                self.db.execute("INSERT INTO sources VALUES (?, ?, ?, ?)",
+                                (env_id, source, mtime_ns, size))
+                if package is None:
+                    continue
+                package_id = self.db.execute(
+                    "INSERT INTO packages (env_id, source, name, version, build, channel, manager) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        env_id,
+                        source,
+                        package["name"],
+                        package["version"],
+                        package["build"],
+                        package["channel"],
+                        package["manager"],
+                    ),
+                ).lastrowid
+                self.db.executemany("INSERT INTO files VALUES (?, ?)",
+                                    [(package_id, f) for f in package["files"]])
+            self.db.execute(
+                "UPDATE envs SET indexed = ? WHERE id = ?", (time.time(), env_id)
+            )
+        return len(changed)
+
+    def update(self, prefixes: List[Path], prune: bool = True) -> Dict:
+        """Bring the index up to date for these environments
+
+        With prune, environments not in the list are dropped from the index.
+        """
+        start = time.perf_counter()
+        prefixes = [Path(p) for p in prefixes if (Path(p) / "conda-meta").is_dir()]
+        changed = {str(prefix): self.update_env(prefix) for prefix in prefixes}
+        removed = []
+        if prune:
+            wanted = {str(p) for p in prefixes}
+            for row in self.db.execute("SELECT id, prefix FROM envs").fetchall():
+                if row["prefix"] not in wanted:
+                    with self.db:
+                        ids = [r["id"] for r in self.db.execute(
+                            "SELECT id FROM packages WHERE env_id = ?", (row["id"],))]
+                        self.db.executemany("DELETE FROM files WHERE package_id = ?",
+                                            [(i,) for i in ids])
+                        for table, column in (
+                            ("packages", "env_id"),
+                            ("sources", "env_id"),
+                            ("envs", "id"),
+                        ):
+                            self.db.execute(
+                                f"DELETE FROM {table} WHERE {column} = ?", (row["id"],)
+                            )
+                    removed.append(row["prefix"])
+        return {"envs": len(prefixes), "changed": changed, "removed": removed,
+                "seconds": round(time.perf_counter() - start, 3)}
+
+    def query(self, requirement: str) -> List[Dict]:
+        """Installed packages matching a requirement such as 'gdal<3.6'"""
+        try:
+            parsed = Requirement(requirement)
+        except InvalidRequirement as e:
+            raise ValueError(f"Invalid requirement '{requirement}': {e}") from e
+        rows = self.db.execute(
+            "SELECT envs.name AS env, envs.prefix, packages.name, version, build, channel, manager "
+            "FROM packages JOIN envs ON envs.id = packages.env_id WHERE packages.name = ? "
+            "ORDER BY envs.name",
+            (canonicalize_name(parsed.name),),
+        )
+        return [dict(row) for row in rows if _version_matches(row["version"], parsed)]
+
+    def owners(self, pattern: str) -> List[Dict]:
+        """Packages owning files whose path matches a glob pattern, e.g. '*/libgdal.so*'"""
+        rows = self.db.execute(
+            "SELECT envs.name AS env, envs.prefix, packages.name, version, manager, files.path "
+            "FROM files JOIN packages ON packages.id = files.package_id "
+            "JOIN envs ON envs.id = packages.env_id WHERE files.path GLOB ? "
+            "ORDER BY envs.name, files.path",
+            (pattern,),
+        )
+        return [dict(row) for row in rows]
+
+    def envs(self) -> List[Dict]:
+        """Indexed environments with their package counts"""
+        rows = self.db.execute(
+            "SELECT envs.name, envs.prefix, envs.indexed, COUNT(packages.id) AS packages "
+            "FROM envs LEFT JOIN packages ON packages.env_id = envs.id "
+            "GROUP BY envs.id ORDER BY envs.name"
+        )
+        return [dict(row) for row in rows]
@@ -1,6 +1,159 @@
+"""
+Web mapping example for Geo Distribution
+
+A Dash / dash-leaflet app whose map layers come from the geodistro.webapp
+layer cache: callbacks only return tile URLs, and every tile is filtered,
+serialized and gzip-compressed once per dataset version and filter set, then
+served from memory or disk to every user.
+
+    python web-mapping.py                        # synthetic stops, http://127.0.0.1:8050
+    python web-mapping.py --data stops.gpkg      # your own points/lines/polygons
+    python web-mapping.py --benchmark --users 16 # p50/p95 latency, uncached vs cached
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import geopandas as gpd
+
+from geodistro import webapp
+
+CENTER = (40.73, -73.98)
+ZOOM = 12
+
+
+def synthetic_stops(n: int = 50_000, seed: int = 0) -> gpd.GeoDataFrame:
+    """Transit stops scattered around Manhattan"""
+    rng = np.random.default_rng(seed)
+    return gpd.GeoDataFrame(
+        {
+            "kind": rng.choice(["bus", "tram", "ferry"], n, p=[0.8, 0.15, 0.05]),
+            "line": rng.integers(1, 40, n),
+        },
+        geometry=gpd.points_from_xy(
+            rng.normal(CENTER[1], 0.05, n), rng.normal(CENTER[0], 0.05, n)
+        ),
+        crs="EPSG:4326",
+    )
+
+
+def view_bbox(bounds) -> tuple:
+    """dash-leaflet bounds [[south, west], [north, east]] as (west, south, east, north)"""
+    if not bounds:
+        return CENTER[1] - 0.06, CENTER[0] - 0.04, CENTER[1] + 0.06, CENTER[0] + 0.04
+    (south, west), (north, east) = bounds
+    return west, south, east, north
+
+
+def create_app(source: webapp.LayerSource, cache: webapp.LayerCache):
+    import dash
+    import dash_leaflet as dl
+    from dash import Input, Output, dcc, html
+
+    app = dash.Dash(__name__)
+    webapp.add_layer_routes(app.server, cache, {"stops": source})
+    app.layout = html.Div(
+        [
+            dcc.Dropdown(
+                id="kind",
+                options=["bus", "tram", "ferry"],
+                value=["tram", "ferry"],
+                multi=True,
+            ),
+            dl.Map(
+                id="map",
+                center=CENTER,
+                zoom=ZOOM,
+                style={"height": "90vh"},
+                children=[dl.TileLayer(), dl.LayerGroup(id="layers")],
+            ),
+        ]
+    )
+
+    @app.callback(Output("layers", "children"),
+                  Input("map", "bounds"), Input("map", "zoom"), Input("kind", "value"))
+    def update_layers(bounds, zoom, kinds):
+        # No filtering or serialization here: the browser fetches cached tiles.
+        # Below zoom 10 the stops are not drawn; at most 64 tiles per view.
+        urls = webapp.layer_urls("stops", view_bbox(bounds), zoom or ZOOM,
+                                 {"kind": kinds or []}, min_zoom=10, max_zoom=16)
+        return [dl.GeoJSON(url=url, id=url) for url in urls]
+
+    return app
+
+
+def benchmark(
+    source: webapp.LayerSource, cache: webapp.LayerCache, users: int, requests: int
+):
+    """Latency of concurrent map requests, recomputing every layer vs the cache"""
+    rng = np.random.default_rng(1)
+    views = []
+    for _ in range(requests):
+        zoom = int(rng.integers(13, 16))
+        lat, lon = CENTER[0] + rng.normal(0, 0.01), CENTER[1] + rng.normal(0, 0.01)
+        tile = webapp.tiles_for_bbox((lon, lat, lon, lat), zoom)[0]
+        kinds = [["bus"], ["tram", "ferry"], ["bus", "tram", "ferry"]][
+            int(rng.integers(0, 3))
+        ]
+        views.append((tile, {"kind": kinds}))
+
+    def uncached(view):
+        start = time.perf_counter()
+        webapp.encode_geojson(webapp.filter_tile(source.frame(), *view))
+        return time.perf_counter() - start
+
+    def cached(view):
+        start = time.perf_counter()
+        cache.layer(source, "stops", *view)
+        return time.perf_counter() - start
+
+    # The second cached pass is what users see once their views have been visited
+    runs = (("recompute", uncached), ("cache, cold", cached), ("cache, warm", cached))
+    for name, handler in runs:
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            latencies = sorted(executor.map(handler, views))
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(f"{name:12s} p50 {statistics.median(latencies) * 1000:8.1f} ms   "
+              f"p95 {p95 * 1000:8.1f} ms")
+    print(f"cache stats: {cache.stats}")
+
+
 def main():
-    print("Web Mapping Example")
-    # Placeholder for web mapping logic
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--data", help="Vector file to serve (default: synthetic stops)"
+    )
+    parser.add_argument(
+        "--benchmark", action="store_true", help="Measure callback latency"
+    )
+    parser.add_argument(
+        "--users", type=int, default=8, help="Concurrent users (benchmark)"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=200, help="Requests (benchmark)"
+    )
+    args = parser.parse_args()
+
+    print("🗺️ Web Mapping Example")
+    if args.data:
+        source = webapp.LayerSource(args.data)
+    else:
+        source = webapp.LayerSource(frame=synthetic_stops(), version="synthetic-v1")
+
+    if args.benchmark:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            benchmark(
+                source, webapp.LayerCache(disk_dir=cache_dir), args.users, args.requests
+            )
+        return
+
+    app = create_app(source, webapp.LayerCache())
+    app.run(debug=False)
+
 
 if __name__ == "__main__":
     main()
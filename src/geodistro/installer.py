@@ -1,176 +1,1001 @@
 """
 Main installer functionality for Geo Distribution
+
+AsyncGeoDistroInstaller does the work: it runs conda, mamba and pip with
+asyncio subprocesses, returns structured results and reports progress as
+events instead of printing. Several environments can be built at once; all
+their commands share one concurrency limit. GeoDistroInstaller is the
+blocking wrapper used by the command line, printing events as they arrive.
 """
 
-import os
-import sys
+import asyncio
+import functools
+import inspect
+import json
 import subprocess
 import platform
+import shutil
 import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Any, Callable, Optional, List, Dict
 
 import click
-from tqdm import tqdm
+import requests
 
 from geodistro.core import GeoDistroConfig
+from geodistro.launchers import snapshot_dir, write_launchers
+from geodistro import bytecode, mirror, plan, solvecache, tuning
 
-class GeoDistroInstaller:
-    def __init__(self, verbose: bool = False):
+# Commands (solves, package installs, compileall) run at once across all builds
+DEFAULT_CONCURRENCY = 4
+
+# Share of modules that may stay without valid bytecode before precompiling
+# counts as failed; packages routinely ship a few test fixtures or Python 2
+# sources that never compile
+MAX_INVALID_BYTECODE = 0.05
+
+def find_prebuilt_extensions(prefix: Path) -> Dict[str, str]:
+    """Map Python package names to the prebuilt lab extensions they installed"""
+    found = {}
+    labextensions = Path(prefix) / "share" / "jupyter" / "labextensions"
+    if not labextensions.is_dir():
+        return found
+    # Extensions are either <name>/ or scoped as @scope/<name>/
+    for install_json in labextensions.glob("**/install.json"):
+        if len(install_json.relative_to(labextensions).parts) > 3:
+            continue
+        try:
+            info = json.loads(install_json.read_text())
+        except (OSError, ValueError):
+            continue
+        package = info.get("packageName")
+        if package:
+            extension = install_json.parent.relative_to(labextensions).as_posix()
+            found[_normalize_package(package)] = extension
+    return found
+
+def _local_source() -> Optional[Path]:
+    """Source tree geodistro is running from, or None for an installed copy"""
+    root = Path(__file__).resolve().parents[2]
+    pyproject = root / "pyproject.toml"
+    if pyproject.is_file() and 'name = "geo-distro"' in pyproject.read_text():
+        return root
+    return None
+
+def _normalize_package(name: str) -> str:
+    """Normalize a Python distribution name (PEP 503)"""
+    return name.lower().replace("_", "-").replace(".", "-")
+
+def matrix_env_name(env_name: str, python: str) -> str:
+    """Environment name for one interpreter of a matrix build, e.g. geo-distro-py311"""
+    return f"{env_name}-py{python.replace('.', '')}"
+
+
+class PrerequisiteError(RuntimeError):
+    """Neither mamba nor conda is available"""
+
+
+@dataclass
+class InstallResult:
+    """Outcome of one environment build; truthy when it succeeded"""
+    env_name: str
+    ok: bool
+    python: Optional[str] = None
+    trace: List[Dict] = field(default_factory=list)
+    trace_file: Optional[Path] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+
+def echo_event(event: Dict):
+    """Print an installer event the way the command line shows progress"""
+    kind = event["type"]
+    if kind == "message":
+        text = event["message"]
+    elif kind == "output":
+        text = event["line"]
+    elif kind == "progress":
+        mark = "✓" if event["ok"] else "✗"
+        text = f"  [{event['done']}/{event['total']}] {mark} {event['package']}"
+    else:
+        # Step records are summarised by the messages around them
+        return
+    if event.get("label"):
+        body = text.lstrip("\n")
+        text = f"{text[:len(text) - len(body)]}[{event['label']}] {body}"
+    click.echo(text)
+
+
+class AsyncGeoDistroInstaller:
+    """Build Geo Distribution environments with asyncio
+
+    Progress is published as event dicts with a "type" of "message"
+    (human-readable line), "step" (an install trace record), "progress"
+    (one package of a category) or "output" (command output, verbose only).
+    Pass on_event for a plain callback, or subscribe() for an asyncio.Queue.
+    """
+
+    def __init__(self, verbose: bool = False,
+                 on_event: Optional[Callable[[Dict], Any]] = None,
+                 max_concurrency: int = DEFAULT_CONCURRENCY,
+                 semaphore: Optional[asyncio.Semaphore] = None,
+                 label: Optional[str] = None):
         self.system = platform.system().lower()
         self.verbose = verbose
-        self.install_method = self._check_prerequisites()
-        
-    def _check_prerequisites(self) -> str:
-        """Check if conda/mamba is available"""
-        for method in ["mamba", "conda"]:
-            try:
-                subprocess.run([method, "--version"], 
-                             capture_output=not self.verbose, 
-                             check=True)
-                click.echo(f"✓ {method.capitalize()} found")
-                return method
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                continue
-        
-        click.echo("⚠ Conda/Mamba not found. Please install Miniconda or Anaconda first.")
-        click.echo("Download from: https://docs.conda.io/en/latest/miniconda.html")
-        sys.exit(1)
-    
-    def _run_command(self, cmd: List[str], check: bool = True) -> bool:
-        """Run a command with error handling"""
+        self.label = label
+        self.trace: List[Dict] = []
+        self.use_mirror = True
+        self.install_method: Optional[str] = None
+        self.max_concurrency = max_concurrency
+        self._listeners: List[Callable[[Dict], Any]] = [on_event] if on_event else []
+        self._queues: List[asyncio.Queue] = []
+        self._shared_semaphore = semaphore
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self._prefixes: Dict[str, Path] = {}
+        self._platform: Optional[str] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Concurrency limit for commands, shared with child builds"""
+        if self._shared_semaphore is not None:
+            return self._shared_semaphore
+        # Semaphores belong to one event loop; blocking callers start a new
+        # loop per call
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def subscribe(self) -> asyncio.Queue:
+        """Queue receiving every event published from now on"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._queues.append(queue)
+        return queue
+
+    def _emit(self, event: Dict):
+        if self.label and "label" not in event:
+            event = dict(event, label=self.label)
+        for listener in self._listeners:
+            listener(event)
+        for queue in self._queues:
+            queue.put_nowait(event)
+
+    def _say(self, message: str):
+        """Publish a human-readable progress line"""
+        self._emit({"type": "message", "message": message})
+
+    def _record(self, step: str, status: str, **details):
+        """Record an install step in the install trace"""
+        entry = {"step": step, "status": status, "time": time.time()}
+        entry.update(details)
+        self.trace.append(entry)
+        self._emit(dict(entry, type="step"))
+        return entry
+
+    def write_trace(self, env_name: str) -> Path:
+        """Write the install trace of an environment as JSON"""
+        trace_file = GeoDistroConfig.get_cache_dir("traces") / f"{env_name}.json"
+        trace_file.write_text(json.dumps(self.trace, indent=2, default=str))
+        return trace_file
+
+    async def _pump(self, stream: asyncio.StreamReader) -> bytes:
+        """Publish a command's output line by line while collecting it"""
+        chunks = []
+        async for line in stream:
+            chunks.append(line)
+            self._emit(
+                {"type": "output", "line": line.decode(errors="replace").rstrip()}
+            )
+        return b"".join(chunks)
+
+    async def _exec(
+        self, cmd: List[str], limit: bool = True
+    ) -> subprocess.CompletedProcess:
+        """Run a command and capture its output
+
+        Commands holding the shared limit are the long-running ones; quick
+        queries such as 'conda env list' pass limit=False.
+        """
+        if limit:
+            async with self.semaphore:
+                return await self._exec(cmd, limit=False)
+        if self.verbose:
+            self._say(f"Running: {' '.join(cmd)}")
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
         try:
             if self.verbose:
-                click.echo(f"Running: {' '.join(cmd)}")
-            result = subprocess.run(cmd, check=check, capture_output=not self.verbose)
-            return result.returncode == 0
-        except subprocess.CalledProcessError as e:
+                stdout, stderr = await asyncio.gather(self._pump(process.stdout),
+                                                      self._pump(process.stderr))
+                await process.wait()
+            else:
+                stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        return subprocess.CompletedProcess(cmd, process.returncode,
+                                           stdout.decode(errors="replace"),
+                                           stderr.decode(errors="replace"))
+
+    async def _in_thread(self, func: Callable, *args, limit: bool = True, **kwargs):
+        """Run blocking library code (solver, compileall, HTTP) in a worker thread"""
+        call = functools.partial(func, *args, **kwargs)
+        if limit:
+            async with self.semaphore:
+                return await asyncio.get_running_loop().run_in_executor(None, call)
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+
+    async def _mirror_ready(self) -> bool:
+        """Whether any channel has a local repodata mirror"""
+        status = await self._in_thread(
+            lambda: mirror.RepodataMirror().status(), limit=False
+        )
+        return any(status.values())
+
+    async def _local_channels(
+        self, channels: List[str], specs: List[str]
+    ) -> Optional[List[str]]:
+        """Mirrored channels covering specs, or None (reads the mirror manifests)"""
+        conda_platform = await self._conda_platform()
+        return await self._in_thread(
+            lambda: mirror.RepodataMirror().local_channels(
+                channels, conda_platform, specs
+            ),
+            limit=False,
+        )
+
+    async def _run_command(self, cmd: List[str]) -> bool:
+        """Run a command with error handling"""
+        try:
+            result = await self._exec(cmd)
+        except OSError as e:
             if self.verbose:
-                click.echo(f"Command failed: {e}")
+                self._say(f"Command failed: {e}")
             return False
-    
-    def create_environment(self, env_name: str) -> bool:
-        """Create conda environment"""
-        click.echo(f"🔧 Creating environment: {env_name}")
-        
-        cmd = [
-            self.install_method, "create", "-n", env_name, 
-            "python=3.9", "-y"
-        ]
-        
-        if self._run_command(cmd):
-            click.echo(f"✓ Environment '{env_name}' created successfully")
+        if result.returncode != 0 and self.verbose:
+            self._say(f"Command failed with exit code {result.returncode}")
+        return result.returncode == 0
+
+    async def check_prerequisites(self) -> str:
+        """Find mamba or conda, raising PrerequisiteError when neither is installed"""
+        if self.install_method:
+            return self.install_method
+        for method in ["mamba", "conda"]:
+            executable = shutil.which(method)
+            if executable is None:
+                continue
+            result = await self._exec([executable, "--version"], limit=False)
+            if result.returncode == 0:
+                self._say(f"✓ {method.capitalize()} found")
+                self.install_method = method
+                return method
+        raise PrerequisiteError(
+            "Conda/Mamba not found. Please install Miniconda or Anaconda first. "
+            "Download from: https://docs.conda.io/en/latest/miniconda.html"
+        )
+
+    async def _env_prefix(self, env_name: str) -> Optional[Path]:
+        """Resolve the prefix directory of a conda environment"""
+        if env_name in self._prefixes:
+            return self._prefixes[env_name]
+        try:
+            result = await self._exec(
+                [await self.check_prerequisites(), "env", "list", "--json"], limit=False
+            )
+            envs = (
+                json.loads(result.stdout).get("envs", [])
+                if result.returncode == 0
+                else []
+            )
+        except (OSError, ValueError):
+            return None
+        for prefix in envs:
+            if Path(prefix).name == env_name:
+                self._prefixes[env_name] = Path(prefix)
+                return Path(prefix)
+        return None
+
+    async def _env_python(self, env_name: str) -> Optional[Path]:
+        """Get the Python interpreter of a conda environment"""
+        prefix = await self._env_prefix(env_name)
+        if prefix is None:
+            return None
+        if self.system == "windows":
+            return prefix / "python.exe"
+        return prefix / "bin" / "python"
+
+    async def _conda_platform(self) -> str:
+        """Get the conda platform subdir, e.g. linux-64"""
+        if self._platform:
+            return self._platform
+        try:
+            result = await self._exec(
+                [await self.check_prerequisites(), "info", "--json"], limit=False
+            )
+            self._platform = json.loads(result.stdout)["platform"]
+        except (OSError, ValueError, KeyError):
+            system = {"darwin": "osx", "windows": "win"}.get(self.system, self.system)
+            if platform.machine().lower() in ("arm64", "aarch64"):
+                return f"{system}-{'aarch64' if system == 'linux' else 'arm64'}"
+            return f"{system}-64"
+        return self._platform
+
+    async def _solver_channels(self, specs: List[str]) -> List[str]:
+        """Channels to solve specs against, preferring the local repodata mirror"""
+        channels = GeoDistroConfig.SOLVER_CHANNELS
+        if not self.use_mirror:
+            return channels
+        local = await self._local_channels(channels, specs)
+        return local or channels
+
+    def _channel_args(self, channels: List[str]) -> List[str]:
+        """Command-line channel arguments; mirrored channels replace the configured"""
+        args = []
+        for channel in channels:
+            args += ["-c", channel]
+        if channels != GeoDistroConfig.SOLVER_CHANNELS:
+            args.append("--override-channels")
+        return args
+
+    async def refresh_mirror(self, roots: Optional[List[str]] = None) -> bool:
+        """Refresh the local pruned repodata mirror of the solver channels"""
+        self._say("\n🪞 Refreshing local repodata mirror...")
+        start = time.perf_counter()
+
+        try:
+            results = await self._in_thread(
+                mirror.RepodataMirror().refresh, GeoDistroConfig.SOLVER_CHANNELS,
+                await self._conda_platform(), roots
+            )
+        except (requests.RequestException, OSError, ValueError) as e:
+            self._say(f"✗ Mirror refresh failed: {e}")
+            self._record("mirror", "failed", error=str(e))
+            return False
+
+        for result in results:
+            size = f" ({result['bytes'] / 1e6:.1f} MB)" if result["bytes"] else ""
+            self._say(f"✓ {result['url']:50} {result['status']}{size}")
+        self._record("mirror", "ok", results=results,
+                     seconds=round(time.perf_counter() - start, 3))
+        return True
+
+    def _pip_packages(self) -> List[str]:
+        """Packages the installer installs with pip"""
+        packages = []
+        for category, names in GeoDistroConfig.get_all_packages().items():
+            if category != "core_geospatial":
+                packages.extend(names)
+        packages += GeoDistroConfig.JUPYTER_EXTENSIONS
+        return list(dict.fromkeys(packages))
+
+    async def plan_install(self, fetch_missing: bool = False,
+                           bandwidth: float = plan.DEFAULT_BANDWIDTH,
+                           python: Optional[str] = None) -> Dict:
+        """Check the install for conflicts from cached metadata, without side effects
+
+        Only cached metadata is read unless fetch_missing is set; packages
+        without it are reported as missing rather than fetched.
+        """
+        python = python or GeoDistroConfig.PYTHON_VERSION
+        self._say(f"\n🧭 Planning installation (Python {python})...")
+        start = time.perf_counter()
+
+        conda = await self.check_prerequisites()
+        conda_specs = list(GeoDistroConfig.CORE_GEOSPATIAL)
+        channels = await self._local_channels(GeoDistroConfig.SOLVER_CHANNELS,
+                                              [f"python={python}"] + conda_specs)
+        if channels is None:
+            self._say(
+                "⚠ No repodata mirror covers the conda packages, skipping the conda "
+                "check (run 'geo-distro mirror')"
+            )
+
+        # Cached PyPI metadata is refreshed daily when fetching is allowed
+        cache = plan.WheelMetadataCache(max_age=86400 if fetch_missing else None)
+        report = await self._in_thread(plan.build_plan, conda, python, conda_specs,
+                                       self._pip_packages(), channels, cache, bandwidth,
+                                       fetch_missing=fetch_missing)
+
+        conda_result = report["conda"]
+        if conda_result["ok"]:
+            self._say(
+                f"✓ conda: {len(conda_result['packages'])} packages solve offline"
+            )
+        self._say(f"✓ pip: {len(report['pip']['selected'])} packages resolved "
+                  f"for Python {python}")
+        sdists = sorted(
+            n for n, info in report["pip"]["selected"].items() if info["sdist"]
+        )
+        if sdists:
+            self._say(f"⚠ Built from source: {', '.join(sdists)}")
+        if report["pip"]["missing"]:
+            names = sorted({name for name, _ in report["pip"]["missing"]})
+            self._say(f"⚠ No cached metadata for: {', '.join(names)}")
+        for conflict in report["conflicts"]:
+            self._say(f"✗ {conflict['package']}: {conflict['reason']}")
+        self._say(f"📦 Estimated download: {report['download_bytes'] / 1e6:.0f} MB, "
+                  f"install time: ~{report['estimated_seconds'] / 60:.0f} min")
+
+        if report["conflicts"]:
+            status = "conflicts"
+        elif report["pip"]["missing"] or conda_result["ok"] is None:
+            status = "incomplete"
+        else:
+            status = "ok"
+        if status == "incomplete":
+            self._say(
+                "⚠ The plan is incomplete: conflicts involving the unchecked packages "
+                "will only show up during installation (run 'geo-distro plan' to "
+                "fetch their metadata)"
+            )
+        report["status"] = status
+        self._record("plan", status, python=python, conflicts=report["conflicts"],
+                     download_bytes=report["download_bytes"],
+                     estimated_seconds=report["estimated_seconds"],
+                     seconds=round(time.perf_counter() - start, 3))
+        return report
+
+    async def _cached_solve(self, specs: List[str],
+                            channels: Optional[List[str]] = None) -> Optional[Path]:
+        """Get an explicit spec file for specs, solving only on a cache miss"""
+        channels = channels or GeoDistroConfig.SOLVER_CHANNELS
+        conda_platform = await self._conda_platform()
+        snapshot = await self._in_thread(
+            solvecache.channel_snapshot, channels, conda_platform, limit=False
+        )
+        if snapshot is None:
+            self._say(
+                "⚠ Channel repodata could not be identified, solving without cache"
+            )
+            self._record("solve", "bypassed", specs=specs)
+            return None
+
+        key = solvecache.solve_key(specs, channels, conda_platform, snapshot)
+        cache = await self._in_thread(solvecache.SolveCache, limit=False)
+        cached = await self._in_thread(cache.get, key, limit=False)
+        if cached is not None:
+            self._say("✓ Reusing cached solve, skipping the solver")
+            self._record("solve", "hit", key=key, specs=specs)
+            return cached
+
+        start = time.perf_counter()
+        try:
+            urls = await self._in_thread(
+                solvecache.solve_explicit,
+                await self.check_prerequisites(),
+                specs,
+                channels,
+            )
+        except (subprocess.CalledProcessError, ValueError) as e:
+            self._say("✗ Solver failed for the requested packages")
+            self._record("solve", "failed", specs=specs, error=str(e))
+            return None
+        if urls is None:
+            self._record("solve", "uncacheable", specs=specs)
+            return None
+
+        path = await self._in_thread(cache.put, key, urls,
+                                     {"specs": specs, "channels": channels,
+                                      "platform": conda_platform}, limit=False)
+        self._record("solve", "miss", key=key, specs=specs, packages=len(urls),
+                     seconds=round(time.perf_counter() - start, 3))
+        return path
+
+    async def create_environment(
+        self,
+        env_name: str,
+        packages: Optional[List[str]] = None,
+        use_solve_cache: bool = True,
+        python: Optional[str] = None,
+    ) -> bool:
+        """Create conda environment, optionally with conda packages in one solve"""
+        python = python or GeoDistroConfig.PYTHON_VERSION
+        conda = await self.check_prerequisites()
+        self._say(f"🔧 Creating environment: {env_name} (Python {python})")
+
+        specs = [f"python={python}"] + list(packages or [])
+        channels = (await self._solver_channels(specs) if packages
+                    else GeoDistroConfig.SOLVER_CHANNELS)
+        explicit = (
+            await self._cached_solve(specs, channels) if use_solve_cache else None
+        )
+        if explicit is not None:
+            cmd = [conda, "create", "-n", env_name, "--file", str(explicit), "-y"]
+        else:
+            cmd = [conda, "create", "-n", env_name]
+            if packages:
+                cmd += self._channel_args(channels)
+            cmd += specs + ["-y"]
+
+        if await self._run_command(cmd):
+            self._say(f"✓ Environment '{env_name}' created successfully")
+            self._record("create_environment", "ok", env_name=env_name, python=python,
+                         explicit=explicit is not None,
+                         mirrored=channels != GeoDistroConfig.SOLVER_CHANNELS)
             return True
         else:
-            click.echo(f"✗ Failed to create environment '{env_name}'")
+            self._say(f"✗ Failed to create environment '{env_name}'")
+            self._record("create_environment", "failed", env_name=env_name)
             return False
-    
-    def install_packages(self, env_name: str, category: str, packages: List[str]):
+
+    async def install_packages(self, env_name: str, category: str,
+                               packages: List[str]) -> Dict[str, List[str]]:
         """Install packages for a specific category"""
-        click.echo(f"\n📦 Installing {category} packages...")
-        
+        self._say(f"\n📦 Installing {category} packages...")
+        start = time.perf_counter()
+
         successful = []
         failed = []
-        
-        for package in tqdm(packages, desc=category):
+        conda = await self.check_prerequisites()
+        channels = (
+            await self._solver_channels(packages)
+            if category == "core_geospatial"
+            else []
+        )
+        python = await self._env_python(env_name)
+
+        # Packages of one environment install one after the other
+        for done, package in enumerate(packages, 1):
             # Use conda-forge for core geospatial packages
             if category == "core_geospatial":
-                cmd = [
-                    self.install_method, "install", "-c", "conda-forge",
+                cmd = [conda, "install"] + self._channel_args(channels) + [
                     "-n", env_name, package, "-y"
                 ]
+            elif python is not None:
+                # Use the environment's pip, no shell activation needed
+                cmd = [str(python), "-m", "pip", "install", package]
             else:
-                # Use pip for Python packages
-                if self.system == "windows":
-                    pip_cmd = f"conda activate {env_name} && pip install {package}"
-                    cmd = ["cmd", "/c", pip_cmd]
-                else:
-                    pip_cmd = f"source activate {env_name} && pip install {package}"
-                    cmd = ["bash", "-c", pip_cmd]
-            
-            if self._run_command(cmd, check=False):
-                successful.append(package)
-            else:
-                failed.append(package)
-        
+                cmd = None
+
+            ok = cmd is not None and await self._run_command(cmd)
+            (successful if ok else failed).append(package)
+            self._emit(
+                {
+                    "type": "progress",
+                    "step": "install_packages",
+                    "category": category,
+                    "package": package,
+                    "ok": ok,
+                    "done": done,
+                    "total": len(packages),
+                }
+            )
+
         if successful:
-            click.echo(f"✓ Successfully installed {len(successful)}/{len(packages)} packages")
+            self._say(
+                f"✓ Successfully installed {len(successful)}/{len(packages)} packages"
+            )
         if failed:
-            click.echo(f"⚠ Failed to install: {', '.join(failed)}")
-    
-    def install_all(self, env_name: str = None, create_shortcuts: bool = True):
+            self._say(f"⚠ Failed to install: {', '.join(failed)}")
+        self._record(
+            "install_packages", "failed" if failed else "ok", category=category,
+            successful=successful, failed=failed,
+            seconds=round(time.perf_counter() - start, 3)
+        )
+        return {"successful": successful, "failed": failed}
+
+    async def install_all(self, env_name: str = None, create_shortcuts: bool = True,
+                          tune_profile: Optional[str] = None, precompile: bool = True,
+                          pyc_mode: str = "timestamp", kernel_pool: int = 2,
+                          use_mirror: bool = True, check_plan: bool = True,
+                          python: Optional[str] = None,
+                          refresh_mirror: bool = True) -> InstallResult:
         """Install complete Geo Distribution"""
         if env_name is None:
             env_name = GeoDistroConfig.ENV_NAME
-        
-        click.echo("🚀 Starting Geo Distribution Installation")
-        click.echo("=" * 50)
-        
-        # Create environment
-        if not self.create_environment(env_name):
-            return False
-        
-        # Install all package categories
+        start = time.perf_counter()
+
+        async def finish(ok: bool, error: Optional[str] = None) -> InstallResult:
+            trace_file = await self._in_thread(self.write_trace, env_name, limit=False)
+            return InstallResult(
+                env_name,
+                ok,
+                python,
+                list(self.trace),
+                trace_file,
+                error,
+                round(time.perf_counter() - start, 3),
+            )
+
+        await self.check_prerequisites()
+        self._say("🚀 Starting Geo Distribution Installation")
+        self._say("=" * 50)
+
+        # Bring an existing repodata mirror up to date; the solver then reads it
+        self.use_mirror = use_mirror
+        if use_mirror and refresh_mirror and await self._mirror_ready():
+            await self.refresh_mirror()
+
+        # Fail fast on conflicts, before anything is installed. Only cached metadata
+        # is read, so on a cold cache the plan is incomplete and says so
+        if check_plan and (await self.plan_install(python=python))["conflicts"]:
+            self._say(
+                "\n✗ The package set cannot be installed as configured, "
+                "nothing was changed"
+            )
+            return await finish(False, "conflicts")
+
+        # Create environment, solving python and the conda packages together
+        if not await self.create_environment(
+            env_name, packages=GeoDistroConfig.CORE_GEOSPATIAL, python=python
+        ):
+            return await finish(False, "environment creation failed")
+
+        # Install the remaining package categories
         all_packages = GeoDistroConfig.get_all_packages()
-        
+        all_packages.pop("core_geospatial")
+
         for category, packages in all_packages.items():
-            self.install_packages(env_name, category, packages)
-            time.sleep(1)  # Brief pause between categories
-        
+            await self.install_packages(env_name, category, packages)
+
         # Post-installation setup
-        self._setup_jupyter_extensions(env_name)
-        
+        await self._setup_jupyter_extensions(env_name)
+
+        if kernel_pool > 0:
+            await self.register_kernel_pool(env_name, kernel_pool)
+
+        # Tune before creating shortcuts so their activation snapshot includes it
+        if tune_profile:
+            await self.tune_environment(env_name, tune_profile)
+
         if create_shortcuts:
-            self._create_shortcuts(env_name)
-        
-        click.echo("\n🎉 Installation Complete!")
-        click.echo("=" * 50)
-        click.echo(f"Environment: {env_name}")
-        click.echo("\nTo activate:")
-        click.echo(f"  conda activate {env_name}")
-        click.echo("\nTo start Jupyter Lab:")
-        click.echo("  jupyter lab")
-        
-        return True
-    
-    def _setup_jupyter_extensions(self, env_name: str):
-        """Setup Jupyter extensions"""
-        click.echo("\n⚙️ Setting up Jupyter extensions...")
-        
-        extensions = [
-            "jupyterlab-geojson",
-            "jupyterlab-kernelspy"
+            await self._create_shortcuts(env_name)
+
+        # Final phase, after everything that may add Python files
+        if precompile:
+            await self.precompile_bytecode(env_name, pyc_mode)
+
+        result = await finish(True)
+
+        self._say("\n🎉 Installation Complete!")
+        self._say("=" * 50)
+        self._say(f"Environment: {env_name}")
+        self._say("\nTo activate:")
+        self._say(f"  conda activate {env_name}")
+        self._say("\nTo start Jupyter Lab:")
+        self._say("  jupyter lab")
+        self._say(f"\nInstall trace: {result.trace_file}")
+
+        return result
+
+    def child(
+        self, label: str, on_event: Optional[Callable[[Dict], Any]] = None
+    ) -> "AsyncGeoDistroInstaller":
+        """Installer for one of several concurrent builds, sharing limit and events"""
+        child = AsyncGeoDistroInstaller(verbose=self.verbose, on_event=self._emit,
+                                        semaphore=self.semaphore, label=label)
+        if on_event:
+            child._listeners.append(on_event)
+        child.install_method = self.install_method
+        child._platform = self._platform
+        return child
+
+    async def install_many(self, builds: List[Dict]) -> List[InstallResult]:
+        """Build several environments concurrently
+
+        Each build is a dict of install_all arguments. A failing build does
+        not stop the others; its result carries the error.
+        """
+        await self.check_prerequisites()
+        await self._conda_platform()
+
+        async def build(options: Dict) -> InstallResult:
+            env_name = options.get("env_name") or GeoDistroConfig.ENV_NAME
+            child = self.child(env_name)
+            try:
+                return await child.install_all(**options)
+            except Exception as e:
+                # Any error stays with its build, so the others run to completion
+                child._say(f"✗ Build of '{env_name}' failed: {e}")
+                return InstallResult(
+                    env_name,
+                    False,
+                    options.get("python"),
+                    list(child.trace),
+                    error=str(e),
+                )
+
+        return list(await asyncio.gather(*(build(options) for options in builds)))
+
+    async def install_matrix(self, env_name: str, pythons: List[str],
+                             **options) -> Dict[str, InstallResult]:
+        """Build one environment per Python version concurrently
+
+        The builds share conda's package cache and pip's wheel cache, so the
+        interpreter-independent packages (GDAL, PROJ, GEOS and their data) are
+        stored once. The mirror is refreshed once up front, and only the first
+        interpreter gets the shortcuts, since launcher names are not per env.
+        """
+        await self.check_prerequisites()
+        if options.get("use_mirror", True) and await self._mirror_ready():
+            await self.refresh_mirror()
+        create_shortcuts = options.pop("create_shortcuts", True)
+
+        builds = [
+            dict(
+                options,
+                env_name=matrix_env_name(env_name, python),
+                python=python,
+                create_shortcuts=create_shortcuts and index == 0,
+                refresh_mirror=False,
+            )
+            for index, python in enumerate(pythons)
         ]
-        
-        for ext in extensions:
-            if self.system == "windows":
-                cmd = f"conda activate {env_name} && jupyter labextension install {ext}"
-                subprocess.run(["cmd", "/c", cmd], capture_output=not self.verbose)
+        results = await self.install_many(builds)
+        return dict(zip(pythons, results))
+
+    async def tune_environment(self, env_name: str, profile: str) -> bool:
+        """Write a GDAL/PROJ performance profile into the environment"""
+        self._say(f"\n🏎️ Applying '{profile}' performance profile...")
+
+        prefix = await self._env_prefix(env_name)
+        if prefix is None:
+            self._say(f"✗ Environment '{env_name}' not found")
+            self._record(
+                "tune", "failed", profile=profile, reason="environment not found"
+            )
+            return False
+
+        host = tuning.host_resources()
+        config = tuning.build_profile(profile, host["cores"], host["ram_mb"])
+        await self._in_thread(
+            tuning.write_profile, prefix, profile, config, limit=False
+        )
+        for name, value in sorted(config.items()):
+            self._say(f"  {name:36} {value}")
+        self._say(f"✓ Profile sized for {host['cores']} cores, {host['ram_mb']} MB RAM")
+        self._record("tune", "ok", profile=profile, config=config, host=host)
+        return True
+
+    async def register_kernel_pool(self, env_name: str, pool_size: int = 2) -> bool:
+        """Register a kernelspec that starts kernels from a pre-warmed pool"""
+        self._say(f"\n🔥 Registering pre-warmed kernel pool ({pool_size} kernels)...")
+
+        prefix = await self._env_prefix(env_name)
+        python = await self._env_python(env_name)
+        if prefix is None or python is None:
+            self._say(f"✗ Environment '{env_name}' not found")
+            self._record("kernel_pool", "failed", reason="environment not found")
+            return False
+
+        # The provisioner is loaded by the Jupyter server running in the env
+        check = await self._exec(
+            [str(python), "-c", "import geodistro.kernelpool"], limit=False
+        )
+        if check.returncode != 0:
+            # Only ever from this checkout: "geo-distro" on PyPI is a different project
+            source = _local_source()
+            if source is None:
+                self._say(
+                    "✗ geodistro is not importable in the environment; install this "
+                    f"geo-distro checkout or wheel into '{env_name}' first"
+                )
+                self._record(
+                    "kernel_pool", "failed", reason="geodistro not in environment"
+                )
+                return False
+            if not await self._run_command(
+                [str(python), "-m", "pip", "install", "--no-deps", str(source)]
+            ):
+                self._say("✗ Failed to install geo-distro into the environment")
+                self._record(
+                    "kernel_pool", "failed", reason="geo-distro not installable"
+                )
+                return False
+
+        kernel_dir = (
+            prefix / "share" / "jupyter" / "kernels" / GeoDistroConfig.KERNEL_POOL_NAME
+        )
+        spec = {
+            "argv": [
+                str(python),
+                "-m",
+                "ipykernel_launcher",
+                "-f",
+                "{connection_file}",
+            ],
+            "display_name": "Python 3 (geo, pre-warmed)",
+            "language": "python",
+            "metadata": {
+                "kernel_provisioner": {
+                    "provisioner_name": "geodistro-pool",
+                    "config": {
+                        "pool_size": pool_size,
+                        "preload": GeoDistroConfig.PRELOAD_MODULES,
+                    },
+                }
+            },
+        }
+        await self._in_thread(self._write_kernelspec, kernel_dir, spec, limit=False)
+        self._say(f"✓ Kernelspec '{GeoDistroConfig.KERNEL_POOL_NAME}' registered")
+        self._record(
+            "kernel_pool", "ok", kernelspec=str(kernel_dir), pool_size=pool_size
+        )
+        return True
+
+    @staticmethod
+    def _write_kernelspec(kernel_dir: Path, spec: Dict):
+        kernel_dir.mkdir(parents=True, exist_ok=True)
+        (kernel_dir / "kernel.json").write_text(json.dumps(spec, indent=2))
+
+    async def precompile_bytecode(self, env_name: str, mode: str = "timestamp") -> bool:
+        """Precompile all site-packages of the environment in parallel"""
+        self._say(f"\n🧱 Precompiling bytecode ({mode})...")
+
+        python = await self._env_python(env_name)
+        if python is None:
+            self._say(f"✗ Environment '{env_name}' not found")
+            self._record("precompile", "failed", reason="environment not found")
+            return False
+
+        try:
+            report = await self._in_thread(
+                bytecode.precompile_environment, str(python), mode
+            )
+        except (subprocess.CalledProcessError, ValueError) as e:
+            self._say(f"✗ Bytecode precompilation failed: {e}")
+            self._record("precompile", "failed", mode=mode, error=str(e))
+            return False
+
+        # compileall exits nonzero as soon as one file fails to compile, so the
+        # verified counts decide; a nonzero exit with nothing valid is an error
+        invalid = report["sources"] - report["valid"]
+        if invalid > report["sources"] * MAX_INVALID_BYTECODE or (
+            report["returncode"] != 0 and not report["valid"]
+        ):
+            self._say(f"✗ Bytecode precompilation failed (compileall exited with "
+                      f"{report['returncode']}); {report['valid']}/{report['sources']} "
+                      f"modules have valid bytecode")
+            self._record("precompile", "failed", **report)
+            return False
+
+        self._say(f"✓ {report['valid']}/{report['sources']} modules compiled "
+                  f"in {report['seconds']:.1f}s")
+        if invalid:
+            self._say(
+                f"⚠ {invalid} modules have no valid .pyc "
+                f"(missing: {report['missing']}, stale: {report['stale']}, "
+                f"wrong interpreter: {report['wrong_magic']})"
+            )
+        self._record("precompile", "ok", **report)
+        return True
+
+    async def _setup_jupyter_extensions(self, env_name: str) -> Dict[str, str]:
+        """Provision JupyterLab extensions as prebuilt (federated) extensions
+
+        Extensions already shipped by installed packages are detected from
+        share/jupyter/labextensions; only missing ones are installed, as
+        binary wheels, so JupyterLab never has to run a Node/webpack build.
+        """
+        self._say("\n⚙️ Setting up Jupyter extensions...")
+        start = time.perf_counter()
+
+        results = {}
+        prefix = await self._env_prefix(env_name)
+        python = await self._env_python(env_name)
+        if prefix is None or python is None:
+            self._say(f"⚠ Environment '{env_name}' not found, skipping extensions")
+            self._record(
+                "jupyter_extensions", "skipped", reason="environment not found"
+            )
+            return results
+
+        present = await self._in_thread(find_prebuilt_extensions, prefix, limit=False)
+        missing = []
+        for package in GeoDistroConfig.JUPYTER_EXTENSIONS:
+            if _normalize_package(package) in present:
+                results[package] = "present"
             else:
-                cmd = f"source activate {env_name} && jupyter labextension install {ext}"
-                subprocess.run(["bash", "-c", cmd], capture_output=not self.verbose)
-    
-    def _create_shortcuts(self, env_name: str):
-        """Create desktop shortcuts"""
-        click.echo("\n📝 Creating shortcuts...")
-        
+                missing.append(package)
+
+        if missing:
+            cmd = [str(python), "-m", "pip", "install", "--only-binary=:all:"] + missing
+            result = await self._exec(cmd)
+            present = await self._in_thread(
+                find_prebuilt_extensions, prefix, limit=False
+            )
+            for package in missing:
+                if result.returncode == 0 and _normalize_package(package) in present:
+                    results[package] = "installed"
+                else:
+                    results[package] = "failed"
+            if result.returncode != 0:
+                output = (result.stderr or result.stdout).strip().splitlines()
+                reason = output[-1] if output else result.returncode
+                self._say(f"⚠ Extension install failed: {reason}")
+
+        for package, status in results.items():
+            mark = "✗" if status == "failed" else "✓"
+            extension = present.get(_normalize_package(package), "")
+            self._say(f"{mark} {package:25} {status} {extension}")
+
+        failed = [p for p, status in results.items() if status == "failed"]
+        self._record(
+            "jupyter_extensions",
+            "failed" if failed else "ok",
+            extensions=results,
+            seconds=round(time.perf_counter() - start, 3),
+        )
+        return results
+
+    async def _create_shortcuts(self, env_name: str) -> List[Path]:
+        """Create launcher scripts backed by a cached activation snapshot"""
+        self._say("\n📝 Creating shortcuts...")
+
         shortcuts_dir = Path.home() / "GeoDistribution"
-        shortcuts_dir.mkdir(exist_ok=True)
-        
-        # Create Jupyter Lab starter script
-        if self.system == "windows":
-            bat_content = f"""@echo off
-call conda activate {env_name}
-jupyter lab
-pause
-"""
-            bat_file = shortcuts_dir / "GeoJupyterLab.bat"
-            bat_file.write_text(bat_content)
-        else:
-            script_content = f"""#!/bin/bash
-conda activate {env_name}
-jupyter lab
-"""
-            script_file = shortcuts_dir / "geojupyterlab.sh"
-            script_file.write_text(script_content)
-            script_file.chmod(0o755)
\ No newline at end of file
+        prefix = await self._env_prefix(env_name)
+        conda = shutil.which(self.install_method) or self.install_method
+        if prefix is None:
+            self._say(f"⚠ Environment '{env_name}' not found, skipping shortcuts")
+            self._record("shortcuts", "skipped", reason="environment not found")
+            return []
+
+        try:
+            launchers = await self._in_thread(write_launchers, conda, env_name, prefix,
+                                              shortcuts_dir, self.system)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            self._say(f"✗ Failed to capture activation environment: {e}")
+            self._record("shortcuts", "failed", error=str(e))
+            return []
+
+        for launcher in launchers:
+            self._say(f"✓ {launcher}")
+        self._record("shortcuts", "ok", launchers=[str(p) for p in launchers],
+                     snapshot=str(snapshot_dir(prefix)))
+        return launchers
+
+
+class GeoDistroInstaller:
+    """Blocking wrapper around AsyncGeoDistroInstaller that prints its progress
+
+    Every coroutine method of the async installer is available here as a
+    plain method; attributes are read from and written to the wrapped
+    installer. Raises PrerequisiteError when neither mamba nor conda exists.
+    """
+
+    def __init__(self, verbose: bool = False,
+                 on_event: Optional[Callable[[Dict], Any]] = echo_event,
+                 max_concurrency: int = DEFAULT_CONCURRENCY):
+        object.__setattr__(self, "_installer", AsyncGeoDistroInstaller(
+            verbose=verbose, on_event=on_event, max_concurrency=max_concurrency
+        ))
+        asyncio.run(self._installer.check_prerequisites())
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._installer, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def blocking(*args, **kwargs):
+            return asyncio.run(attr(*args, **kwargs))
+        return blocking
+
+    def __setattr__(self, name: str, value):
+        setattr(self._installer, name, value)
+
+
+def install_matrix(env_name: str, pythons: List[str], verbose: bool = False,
+                   max_workers: Optional[int] = None, **options) -> Dict[str, bool]:
+    """Build one environment per Python version in parallel, printing progress
+
+    max_workers bounds how many commands run at once across the builds
+    (default: one per Python version).
+    """
+    installer = AsyncGeoDistroInstaller(verbose=verbose, on_event=echo_event,
+                                        max_concurrency=max_workers or len(pythons))
+    results = asyncio.run(installer.install_matrix(env_name, pythons, **options))
+
+    click.echo("\n🧪 Python matrix")
+    for python, result in results.items():
+        mark = "✓" if result.ok else "✗"
+        click.echo(f"{mark} Python {python:6} {result.env_name}")
+    return {python: result.ok for python, result in results.items()}
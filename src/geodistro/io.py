@@ -0,0 +1,352 @@
+"""
+Columnar GeoParquet cache for vector datasets
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from geodistro.core import GeoDistroConfig
+
+# Files that belong to a Shapefile and change its content without touching .shp
+SHAPEFILE_SIDECARS = [".shx", ".dbf", ".prj", ".cpg"]
+
+# Bytes hashed from the start, middle and end of a source file
+SAMPLE_BLOCK_SIZE = 1 << 20
+
+GEOPARQUET_VERSION = "1.1.0"
+CACHE_METADATA_KEY = "geodistro"
+
+PathLike = Union[str, Path]
+BBox = Tuple[float, float, float, float]
+
+
+def _source_files(source: Path) -> List[Path]:
+    """List the files whose state defines a vector source"""
+    if source.is_dir():
+        return sorted(p for p in source.rglob("*") if p.is_file())
+    files = [source]
+    if source.suffix.lower() == ".shp":
+        for suffix in SHAPEFILE_SIDECARS:
+            for candidate in (
+                source.with_suffix(suffix),
+                source.with_suffix(suffix.upper()),
+            ):
+                if candidate.exists():
+                    files.append(candidate)
+                    break
+    return files
+
+
+def _sample_hash(path: Path, size: int) -> str:
+    """Hash the head, middle and tail of a file instead of its full content"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        if size <= 3 * SAMPLE_BLOCK_SIZE:
+            digest.update(f.read())
+        else:
+            for offset in (0, size // 2, size - SAMPLE_BLOCK_SIZE):
+                f.seek(offset)
+                digest.update(f.read(SAMPLE_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def source_fingerprint(source: PathLike, layer: Optional[str] = None) -> str:
+    """Fingerprint a vector source from its path, mtimes, sizes and sampled content"""
+    source = Path(source).resolve()
+    if not source.exists():
+        raise FileNotFoundError(f"Vector source not found: {source}")
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(source).encode())
+    digest.update(str(layer).encode())
+    for path in _source_files(source):
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        if not source.is_dir():
+            digest.update(_sample_hash(path, stat.st_size).encode())
+    return digest.hexdigest()
+
+
+def _source_key(source: Path, layer: Optional[str]) -> str:
+    """Stable key for a source path and layer, independent of its content"""
+    return hashlib.sha1(f"{source}|{layer}".encode()).hexdigest()[:16]
+
+
+def _crs_to_projjson(crs: Optional[str]) -> Optional[Dict]:
+    """Convert the CRS reported by OGR into PROJJSON for GeoParquet metadata"""
+    if not crs:
+        return None
+    from pyproj import CRS
+
+    return CRS.from_user_input(crs).to_json_dict()
+
+
+def _bbox_array(geometry: pa.Array) -> pa.StructArray:
+    """Compute the per-row bounding box covering column from WKB geometries"""
+    import shapely
+
+    bounds = shapely.bounds(shapely.from_wkb(geometry.to_numpy(zero_copy_only=False)))
+    return pa.StructArray.from_arrays(
+        [pa.array(bounds[:, i], pa.float64()) for i in range(4)],
+        names=["xmin", "ymin", "xmax", "ymax"],
+    )
+
+
+def _geo_metadata(geometry_type: str, crs: Optional[str], bbox: List[float]) -> Dict:
+    """Build the GeoParquet "geo" file metadata"""
+    geometry_types = [] if geometry_type in (None, "Unknown") else [geometry_type]
+    return {
+        "version": GEOPARQUET_VERSION,
+        "primary_column": "geometry",
+        "columns": {
+            "geometry": {
+                "encoding": "WKB",
+                "geometry_types": geometry_types,
+                "crs": _crs_to_projjson(crs),
+                "bbox": bbox,
+                "covering": {
+                    "bbox": {
+                        "xmin": ["bbox", "xmin"],
+                        "ymin": ["bbox", "ymin"],
+                        "xmax": ["bbox", "xmax"],
+                        "ymax": ["bbox", "ymax"],
+                    }
+                },
+            }
+        },
+    }
+
+
+def convert_to_geoparquet(
+    source: PathLike,
+    destination: PathLike,
+    layer: Optional[str] = None,
+    batch_size: int = 65536,
+    metadata: Optional[Dict[str, str]] = None,
+) -> Path:
+    """Stream a vector source into a GeoParquet file with a bbox covering column"""
+    from pyogrio.raw import open_arrow
+
+    destination = Path(destination)
+    tmp_path = destination.with_suffix(f".{os.getpid()}.tmp")
+    total_bounds = [float("inf"), float("inf"), float("-inf"), float("-inf")]
+
+    writer = None
+    try:
+        with open_arrow(str(source), layer=layer, batch_size=batch_size,
+                        use_pyarrow=True) as (meta, reader):
+            geometry_name = meta["geometry_name"] or "wkb_geometry"
+            for batch in reader:
+                names = ["geometry" if n == geometry_name else n
+                         for n in batch.schema.names]
+                geometry = batch.column(geometry_name)
+                bbox = _bbox_array(geometry)
+                columns = [
+                    pa.array(geometry, pa.binary()) if n == geometry_name else col
+                    for n, col in zip(batch.schema.names, batch.columns)
+                ]
+                table = pa.Table.from_arrays(columns + [bbox], names=names + ["bbox"])
+
+                if len(bbox):
+                    total_bounds = [
+                        min(total_bounds[0], pc.min(bbox.field("xmin")).as_py()),
+                        min(total_bounds[1], pc.min(bbox.field("ymin")).as_py()),
+                        max(total_bounds[2], pc.max(bbox.field("xmax")).as_py()),
+                        max(total_bounds[3], pc.max(bbox.field("ymax")).as_py()),
+                    ]
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table)
+
+            if writer is None:
+                raise ValueError(f"Vector source has no readable batches: {source}")
+            if total_bounds[0] == float("inf"):
+                total_bounds = []
+            geo = _geo_metadata(meta["geometry_type"], meta["crs"], total_bounds)
+            writer.add_key_value_metadata({"geo": json.dumps(geo), **(metadata or {})})
+        writer.close()
+        writer = None
+        os.replace(tmp_path, destination)
+    finally:
+        if writer is not None:
+            writer.close()
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return destination
+
+
+def _bbox_filter(bbox: BBox) -> pc.Expression:
+    """Row filter matching features whose bbox intersects the query bbox"""
+    minx, miny, maxx, maxy = bbox
+    return (
+        (pc.field("bbox", "xmin") <= maxx)
+        & (pc.field("bbox", "xmax") >= minx)
+        & (pc.field("bbox", "ymin") <= maxy)
+        & (pc.field("bbox", "ymax") >= miny)
+    )
+
+
+def _to_geodataframe(table: pa.Table, geo: Dict):
+    """Convert a cached Arrow table into a GeoDataFrame"""
+    import geopandas
+    from pyproj import CRS
+
+    primary = geo["primary_column"]
+    crs = geo["columns"][primary].get("crs")
+    if isinstance(crs, dict):
+        crs = CRS.from_json_dict(crs)
+
+    attributes = table.drop_columns(
+        [n for n in (primary, "bbox") if n in table.column_names]
+    )
+    geometry = geopandas.GeoSeries.from_wkb(
+        table.column(primary).to_numpy(zero_copy_only=False), crs=crs
+    )
+    return geopandas.GeoDataFrame(
+        attributes.to_pandas(), geometry=geometry.values, crs=crs
+    )
+
+
+class VectorCache:
+    """GeoParquet cache of vector sources, keyed by path, mtime and content hash"""
+
+    def __init__(self, cache_dir: Optional[PathLike] = None, batch_size: int = 65536):
+        if cache_dir is None:
+            cache_dir = GeoDistroConfig.get_cache_dir("vector")
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+
+    def cache_path(self, source: PathLike, layer: Optional[str] = None) -> Path:
+        """Get the cache file path for the current state of a source"""
+        source = Path(source).resolve()
+        fingerprint = source_fingerprint(source, layer)
+        return self.cache_dir / f"{_source_key(source, layer)}-{fingerprint}.parquet"
+
+    def ensure(self, source: PathLike, layer: Optional[str] = None) -> Path:
+        """Make sure an up-to-date cache entry exists and return its path"""
+        source = Path(source).resolve()
+        path = self.cache_path(source, layer)
+        if path.exists():
+            os.utime(path)
+            return path
+
+        # Record the source in the file itself so stale entries can be found later
+        entry = {"source": str(source), "layer": layer, "created": time.time()}
+        convert_to_geoparquet(
+            source, path, layer=layer, batch_size=self.batch_size,
+            metadata={CACHE_METADATA_KEY: json.dumps(entry)},
+        )
+        self._evict_siblings(path)
+        return path
+
+    def _evict_siblings(self, path: Path):
+        """Remove older cache entries of the same source"""
+        key = path.name.split("-", 1)[0]
+        for sibling in self.cache_dir.glob(f"{key}-*.parquet"):
+            if sibling != path:
+                sibling.unlink(missing_ok=True)
+
+    def read_table(
+        self,
+        source: PathLike,
+        columns: Optional[Sequence[str]] = None,
+        bbox: Optional[BBox] = None,
+        layer: Optional[str] = None,
+    ) -> pa.Table:
+        """Read a source as a memory-mapped Arrow table with column and bbox pushdown"""
+        return self._read_path(self.ensure(source, layer), columns, bbox)
+
+    def _read_path(
+        self, path: Path, columns: Optional[Sequence[str]], bbox: Optional[BBox]
+    ) -> pa.Table:
+        """Read a cache file with column projection and bbox row filtering"""
+        if columns is not None:
+            columns = list(columns)
+            if "geometry" not in columns:
+                columns.append("geometry")
+        filters = _bbox_filter(bbox) if bbox is not None else None
+        return pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+
+    def read(
+        self,
+        source: PathLike,
+        columns: Optional[Sequence[str]] = None,
+        bbox: Optional[BBox] = None,
+        layer: Optional[str] = None,
+    ):
+        """Read a source as a GeoDataFrame through the cache"""
+        path = self.ensure(source, layer)
+        table = self._read_path(path, columns, bbox)
+        geo = json.loads(pq.read_metadata(path).metadata[b"geo"])
+        return _to_geodataframe(table, geo)
+
+    def entries(self) -> List[Dict]:
+        """List cache entries with their source, size and last access time"""
+        entries = []
+        for path in sorted(self.cache_dir.glob("*.parquet")):
+            try:
+                metadata = pq.read_metadata(path).metadata or {}
+                entry = json.loads(metadata.get(CACHE_METADATA_KEY.encode(), b"{}"))
+            except (pa.ArrowInvalid, OSError, ValueError):
+                entry = {}
+            stat = path.stat()
+            entry.update(
+                {"path": path, "size": stat.st_size, "accessed": stat.st_mtime}
+            )
+            entries.append(entry)
+        return entries
+
+    def evict_stale(self) -> int:
+        """Remove entries whose source was deleted or has changed"""
+        removed = 0
+        for entry in self.entries():
+            source = entry.get("source")
+            stale = source is None
+            if not stale:
+                try:
+                    expected = self.cache_path(source, entry.get("layer"))
+                    stale = expected != entry["path"]
+                except FileNotFoundError:
+                    stale = True
+            if stale:
+                entry["path"].unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def prune(self, max_bytes: int) -> int:
+        """Evict least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self.entries(), key=lambda e: e["accessed"])
+        total = sum(e["size"] for e in entries)
+        removed = 0
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            entry["path"].unlink(missing_ok=True)
+            total -= entry["size"]
+            removed += 1
+        return removed
+
+    def clear(self):
+        """Remove all cache entries"""
+        for path in self.cache_dir.glob("*.parquet"):
+            path.unlink(missing_ok=True)
+
+
+def read_vector(
+    source: PathLike,
+    columns: Optional[Sequence[str]] = None,
+    bbox: Optional[BBox] = None,
+    layer: Optional[str] = None,
+    cache_dir: Optional[PathLike] = None,
+):
+    """Read a vector source as a GeoDataFrame, transparently cached as GeoParquet"""
+    return VectorCache(cache_dir).read(source, columns=columns, bbox=bbox, layer=layer)
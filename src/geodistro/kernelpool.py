@@ -0,0 +1,301 @@
+"""
+Pre-warmed kernel pool for Jupyter and Voila
+
+PrewarmedProvisioner is a jupyter_client kernel provisioner. It keeps a pool of
+idle ipykernel processes that have already imported the geo stack; starting a
+kernel claims one from the pool, hands it the requested working directory and
+environment, and refills the pool in the background. When no warm kernel is
+ready (or on restart) it falls back to a regular local launch.
+
+The installer registers a kernelspec that selects this provisioner:
+
+    "metadata": {"kernel_provisioner": {"provisioner_name": "geodistro-pool",
+                                        "config": {"pool_size": 2}}}
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from jupyter_client.connect import write_connection_file
+from jupyter_client.launcher import launch_kernel
+from jupyter_client.localinterfaces import localhost
+from jupyter_client.provisioning import LocalProvisioner
+from jupyter_client.provisioning.local_provisioner import LocalPortCache
+from traitlets import Float, Integer, List as ListTrait, Unicode
+
+from geodistro.core import GeoDistroConfig
+
+# Runs inside each pooled kernel before it starts serving requests
+_PRELOAD_TEMPLATE = r'''
+def _geodistro_preload():
+    import importlib, json, os, threading, time
+    for name in {modules!r}:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    claim = {claim!r}
+
+    def apply_claim():
+        while not os.path.exists(claim):
+            time.sleep(0.005)
+        with open(claim) as f:
+            info = json.load(f)
+        os.environ.update(info.get("env", {{}}))
+        if info.get("cwd"):
+            os.chdir(info["cwd"])
+        os.replace(claim, claim + "ed")
+
+    threading.Thread(target=apply_claim, daemon=True).start()
+    open({ready!r}, "w").close()
+
+_geodistro_preload()
+del _geodistro_preload
+'''
+
+
+class PooledKernel:
+    """An idle kernel process waiting in the pool"""
+
+    def __init__(self, process, connection_file: Path, connection_info: Dict):
+        self.process = process
+        self.connection_file = connection_file
+        self.connection_info = connection_info
+        self.started = time.time()
+
+    @property
+    def ready_file(self) -> Path:
+        return self.connection_file.with_suffix(".ready")
+
+    @property
+    def claim_file(self) -> Path:
+        return self.connection_file.with_suffix(".claim")
+
+    def is_ready(self) -> bool:
+        """The kernel is alive and has finished importing the preload modules"""
+        return self.process.poll() is None and self.ready_file.exists()
+
+    async def hand_over(
+        self, cwd: Optional[str], env: Dict[str, str], timeout: float
+    ) -> bool:
+        """Pass the working directory and environment, and wait for the kernel to apply them"""
+        tmp = self.claim_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"cwd": cwd, "env": env}))
+        os.replace(tmp, self.claim_file)
+        acknowledged = self.connection_file.with_suffix(".claimed")
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if acknowledged.exists():
+                return True
+            await asyncio.sleep(0.005)
+        return False
+
+    def files(self) -> List[Path]:
+        return [self.connection_file.with_suffix(s)
+                for s in (".json", ".ready", ".claim", ".claimed", ".tmp", ".py")]
+
+    def discard(self):
+        """Stop the process and remove its files"""
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        for path in self.files():
+            if path.exists():
+                path.unlink()
+
+
+class KernelPool:
+    """Pool of pre-started kernels for one kernel command and preload list"""
+
+    def __init__(self, argv: List[str], size: int, preload: List[str],
+                 env: Optional[Dict[str, str]] = None):
+        self.argv = list(argv)
+        self.size = size
+        self.preload = list(preload)
+        self.env = dict(env or {})
+        self.kernels: List[PooledKernel] = []
+        self.directory = Path(tempfile.mkdtemp(prefix="geodistro-pool-"))
+        self._filling = False
+
+    def spawn(self) -> PooledKernel:
+        """Start one kernel that imports the preload modules"""
+        name = f"kernel-{uuid.uuid4().hex[:12]}"
+        connection_file, info = write_connection_file(
+            fname=str(self.directory / f"{name}.json"),
+            ip=localhost(),
+            key=uuid.uuid4().hex.encode(),
+        )
+        connection_file = Path(connection_file)
+        preload_file = connection_file.with_suffix(".py")
+        preload_file.write_text(_PRELOAD_TEMPLATE.format(
+            modules=self.preload,
+            claim=str(connection_file.with_suffix(".claim")),
+            ready=str(connection_file.with_suffix(".ready")),
+        ))
+
+        cmd = [
+            part.replace("{connection_file}", str(connection_file))
+            for part in self.argv
+        ]
+        cmd.append(f"--IPKernelApp.exec_files={preload_file}")
+        env = dict(os.environ, **self.env)
+        process = launch_kernel(cmd, env=env, cwd=str(Path.home()))
+        kernel = PooledKernel(process, connection_file, info)
+        self.kernels.append(kernel)
+        return kernel
+
+    def prune(self):
+        """Drop kernels that died while idle"""
+        for kernel in list(self.kernels):
+            if kernel.process.poll() is not None:
+                kernel.discard()
+                self.kernels.remove(kernel)
+
+    async def fill(self):
+        """Start kernels until the pool is back at its target size"""
+        if self._filling:
+            return
+        self._filling = True
+        try:
+            self.prune()
+            while len(self.kernels) < self.size:
+                self.spawn()
+                # Stagger starts so a refill does not compete with the claimed kernel
+                await asyncio.sleep(0.2)
+        finally:
+            self._filling = False
+
+    def claim(self) -> Optional[PooledKernel]:
+        """Take the oldest ready kernel out of the pool"""
+        self.prune()
+        for kernel in sorted(self.kernels, key=lambda k: k.started):
+            if kernel.is_ready():
+                self.kernels.remove(kernel)
+                return kernel
+        return None
+
+    def shutdown(self):
+        """Stop every idle kernel"""
+        for kernel in self.kernels:
+            kernel.discard()
+        self.kernels = []
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_pools: Dict[Tuple, KernelPool] = {}
+
+
+def get_pool(argv: List[str], size: int, preload: List[str],
+             env: Optional[Dict[str, str]] = None) -> KernelPool:
+    """Get the shared pool for a kernel command, creating it on first use"""
+    key = (tuple(argv), size, tuple(preload), tuple(sorted((env or {}).items())))
+    pool = _pools.get(key)
+    if pool is None:
+        pool = _pools[key] = KernelPool(argv, size, preload, env)
+    return pool
+
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown()
+
+
+class PrewarmedProvisioner(LocalProvisioner):
+    """Kernel provisioner that hands out pre-warmed kernels from a pool"""
+
+    pool_size = Integer(2, config=True, help="Number of idle kernels kept warm")
+    preload = ListTrait(
+        Unicode(), default_value=list(GeoDistroConfig.PRELOAD_MODULES), config=True,
+        help="Modules imported by pooled kernels before they are handed out",
+    )
+    claim_timeout = Float(2.0, config=True,
+                          help="Seconds to wait for a pooled kernel to accept a claim")
+
+    _restarting = False
+    _pooled: Optional[PooledKernel] = None
+
+    def _pool(self) -> KernelPool:
+        return get_pool(self.kernel_spec.argv, self.pool_size, self.preload,
+                        self.kernel_spec.env)
+
+    def _release_reserved_ports(self):
+        """Return ports reserved by pre_launch, which a pooled kernel does not use"""
+        if not self.ports_cached:
+            return
+        lpc = LocalPortCache.instance()
+        for name in (
+            "shell_port",
+            "iopub_port",
+            "stdin_port",
+            "hb_port",
+            "control_port",
+        ):
+            lpc.return_port(self.connection_info[name])
+        self.ports_cached = False
+
+    async def launch_kernel(self, cmd: List[str], **kwargs: Any):
+        """Claim a warm kernel, falling back to a regular launch"""
+        if self.pool_size > 0 and not self._restarting:
+            pool = self._pool()
+            kernel = pool.claim()
+            asyncio.ensure_future(pool.fill())
+            cwd = kwargs.get("cwd")
+            env = {k: v for k, v in (kwargs.get("env") or {}).items()
+                   if os.environ.get(k) != v}
+            if kernel is not None and await kernel.hand_over(
+                    str(cwd) if cwd else None, env, self.claim_timeout):
+                self._release_reserved_ports()
+                self._pooled = kernel
+                self.process = kernel.process
+                self.pid = kernel.process.pid
+                self.pgid = os.getpgid(self.pid) if hasattr(os, "getpgid") else None
+                self.cwd = cwd or str(Path.home())
+                self.connection_info = dict(kernel.connection_info)
+                if isinstance(self.connection_info.get("key"), str):
+                    self.connection_info["key"] = self.connection_info["key"].encode()
+                return self.connection_info
+            if kernel is not None:
+                kernel.discard()
+        return await super().launch_kernel(cmd, **kwargs)
+
+    async def cleanup(self, restart: bool = False) -> None:
+        """Clean up, remembering restarts so they use a regular launch"""
+        self._restarting = restart
+        if self._pooled is not None:
+            for path in self._pooled.files():
+                if path.exists():
+                    path.unlink()
+            self._pooled = None
+        await super().cleanup(restart=restart)
+
+
+async def warm(
+    argv: Optional[List[str]] = None,
+    size: int = 2,
+    preload: Optional[List[str]] = None,
+    timeout: float = 60.0,
+) -> KernelPool:
+    """Fill a pool and wait until all of its kernels are ready"""
+    argv = argv or [
+        sys.executable,
+        "-m",
+        "ipykernel_launcher",
+        "-f",
+        "{connection_file}",
+    ]
+    pool = get_pool(argv, size, preload or list(GeoDistroConfig.PRELOAD_MODULES))
+    await pool.fill()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not all(k.is_ready() for k in pool.kernels):
+        await asyncio.sleep(0.05)
+    return pool
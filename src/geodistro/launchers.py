@@ -0,0 +1,273 @@
+"""
+Fast launchers backed by a cached activation environment
+
+Activating a conda environment runs its activate.d hooks every time. Instead,
+the fully resolved activation variables (GDAL_DATA, PROJ_LIB, PATH entries and
+anything set by activate.d scripts) are captured once and stored inside the
+environment; launchers source that snapshot and exec their target directly.
+The snapshot is refreshed when conda-meta/history or an activation hook
+changes.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SNAPSHOT_DIR = Path("etc") / "geodistro"
+
+# Variables that describe the shell rather than the environment
+IGNORED_VARIABLES = {
+    "_", "PWD", "OLDPWD", "SHLVL", "PS1", "CONDA_PROMPT_MODIFIER", "CONDA_SHLVL",
+}
+
+_MARKER = "__GEODISTRO_ENV__"
+
+_CAPTURE_SCRIPT = (
+    "import json, os; "
+    f"print({_MARKER!r} + json.dumps(dict(os.environ)) + {_MARKER!r})"
+)
+
+# Launcher name -> command run inside the environment ("$@" is appended)
+LAUNCHERS = {
+    "geojupyterlab": ["jupyter", "lab"],
+    "georun": [],
+}
+
+
+def snapshot_dir(prefix: Path) -> Path:
+    """Directory inside the environment that holds the activation snapshot"""
+    return Path(prefix) / SNAPSHOT_DIR
+
+
+def _watched_paths(prefix: Path) -> List[Path]:
+    """conda-meta/history and the activation hook directories"""
+    prefix = Path(prefix)
+    hooks = prefix / "etc" / "conda"
+    return [
+        prefix / "conda-meta" / "history",
+        hooks / "activate.d",
+        hooks / "env_vars.d",
+    ]
+
+
+def _state_files(prefix: Path) -> List[Path]:
+    """Files whose modification means the activation snapshot may be stale"""
+    files = _watched_paths(prefix)
+    for hook_dir in files[1:]:
+        if hook_dir.is_dir():
+            files.extend(sorted(hook_dir.iterdir()))
+    return files
+
+
+def _state_mtime(prefix: Path) -> float:
+    """Latest modification time among the environment state files"""
+    return max(
+        (p.stat().st_mtime for p in _state_files(prefix) if p.exists()), default=0.0
+    )
+
+
+def is_stale(prefix: Path) -> bool:
+    """Check whether the activation snapshot is missing or out of date"""
+    snapshot = snapshot_dir(prefix) / "activation.json"
+    if not snapshot.exists():
+        return True
+    return _state_mtime(prefix) > snapshot.stat().st_mtime
+
+
+def capture_activation(conda: str, env_name: str) -> Dict[str, str]:
+    """Dump os.environ from inside a fully activated environment"""
+    result = subprocess.run(
+        [conda, "run", "-n", env_name, "python", "-c", _CAPTURE_SCRIPT],
+        capture_output=True, text=True, check=True,
+    )
+    # activate.d scripts may print, so look for the marked payload
+    _, payload, _ = result.stdout.split(_MARKER, 2)
+    return json.loads(payload)
+
+
+def _in_prefix(value: str, prefix: str) -> bool:
+    """Whether any path in an os.pathsep-separated value lies inside prefix
+
+    Compares whole path components, so /envs/geo does not match /envs/geo2.
+    """
+    prefix = os.path.normcase(os.path.normpath(prefix))
+    for entry in value.split(os.pathsep):
+        if not entry:
+            continue
+        entry = os.path.normcase(os.path.normpath(entry))
+        if entry == prefix or entry.startswith(prefix.rstrip(os.sep) + os.sep):
+            return True
+    return False
+
+
+def activation_delta(
+    activated: Dict[str, str], baseline: Dict[str, str], prefix: Path
+) -> Dict:
+    """Reduce an activated environment to what activation added or changed
+
+    Values pointing into the prefix are always kept, so a snapshot taken from
+    a shell where the environment is already active is still complete.
+    """
+    prefix = str(prefix)
+    variables = {
+        name: value for name, value in activated.items()
+        if name not in IGNORED_VARIABLES and name != "PATH"
+        and (baseline.get(name) != value or _in_prefix(value, prefix))
+    }
+    base_path = baseline.get("PATH", "").split(os.pathsep)
+    path_prepend = [p for p in activated.get("PATH", "").split(os.pathsep)
+                    if p and (p not in base_path or _in_prefix(p, prefix))]
+    return {"variables": variables, "path_prepend": list(dict.fromkeys(path_prepend))}
+
+
+def write_snapshot(prefix: Path, delta: Dict) -> Path:
+    """Store the activation delta as JSON plus sourceable shell/batch files"""
+    target = snapshot_dir(prefix)
+    target.mkdir(parents=True, exist_ok=True)
+    variables = delta["variables"]
+    path_prepend = delta["path_prepend"]
+
+    sh_lines = ["# Generated by geo-distro; cached conda activation"]
+    sh_lines += [
+        f"export {name}={shlex.quote(value)}"
+        for name, value in sorted(variables.items())
+    ]
+    if path_prepend:
+        sh_lines.append(
+            f'export PATH={shlex.quote(os.pathsep.join(path_prepend))}:"$PATH"'
+        )
+    (target / "activation.sh").write_text("\n".join(sh_lines) + "\n")
+
+    bat_lines = ["@rem Generated by geo-distro; cached conda activation"]
+    bat_lines += [f'set "{name}={value}"' for name, value in sorted(variables.items())]
+    if path_prepend:
+        bat_lines.append(f'set "PATH={os.pathsep.join(path_prepend)};%PATH%"')
+    (target / "activation.bat").write_text("\r\n".join(bat_lines) + "\r\n")
+
+    snapshot = dict(delta, captured=time.time())
+    # Written last: its mtime marks the snapshot as fresh
+    path = target / "activation.json"
+    path.write_text(json.dumps(snapshot, indent=2))
+    return path
+
+
+def refresh_snapshot(
+    conda: str, env_name: str, prefix: Path, force: bool = False
+) -> bool:
+    """Re-capture the activation snapshot if the environment changed"""
+    if not force and not is_stale(prefix):
+        return False
+    delta = activation_delta(
+        capture_activation(conda, env_name), dict(os.environ), prefix
+    )
+    write_snapshot(prefix, delta)
+    return True
+
+
+def _refresh_command(conda: str, env_name: str, prefix: Path) -> List[str]:
+    """Command a launcher runs to refresh a stale snapshot"""
+    return [sys.executable, "-m", "geodistro.launchers", "--conda", conda,
+            "--env-name", env_name, "--prefix", str(prefix)]
+
+
+def _posix_launcher(conda: str, env_name: str, prefix: Path, command: List[str]) -> str:
+    """Render a bash launcher"""
+    snapshot = snapshot_dir(prefix)
+    history, *hook_dirs = [shlex.quote(str(p)) for p in _watched_paths(prefix)]
+    # Same files as is_stale: editing a hook script leaves its directory's mtime alone
+    watched = " ".join([history] + [f"{d} {d}/*" for d in hook_dirs])
+    refresh = " ".join(
+        shlex.quote(part) for part in _refresh_command(conda, env_name, prefix)
+    )
+    target = " ".join(shlex.quote(part) for part in command)
+    exec_line = f'exec {target} "$@"' if target else 'exec "$@"'
+    return f"""#!/bin/bash
+# Generated by geo-distro for environment '{env_name}'
+stale=
+[ -f {shlex.quote(str(snapshot / 'activation.sh'))} ] || stale=1
+for watched in {watched}; do
+    if [ "$watched" -nt {shlex.quote(str(snapshot / 'activation.json'))} ]; then
+        stale=1
+        break
+    fi
+done
+if [ -n "$stale" ]; then
+    {refresh} >/dev/null 2>&1
+fi
+. {shlex.quote(str(snapshot / 'activation.sh'))}
+{exec_line}
+"""
+
+
+def _windows_launcher(
+    conda: str, env_name: str, prefix: Path, command: List[str]
+) -> str:
+    """Render a batch launcher"""
+    snapshot = snapshot_dir(prefix)
+    history, *hook_dirs = _watched_paths(prefix)
+    watched = " ".join([f'"{history}"'] + [f'"{d}\\*"' for d in hook_dirs])
+    state = snapshot / "state.txt"
+    refresh = subprocess.list2cmdline(_refresh_command(conda, env_name, prefix))
+    target = subprocess.list2cmdline(command)
+    # Starting Python costs more than the launch saves, so it only runs when
+    # the listing of watched files (time stamps and sizes) differs from the
+    # one recorded at the last refresh
+    return f"""@echo off
+rem Generated by geo-distro for environment '{env_name}'
+set "_GEODISTRO_STATE={state}"
+(for %%F in ({watched}) do @echo %%~tzF %%F) > "%_GEODISTRO_STATE%.new" 2>nul
+fc /b "%_GEODISTRO_STATE%.new" "%_GEODISTRO_STATE%" >nul 2>&1 || goto refresh
+if exist "{snapshot / 'activation.bat'}" goto launch
+:refresh
+{refresh} >nul 2>&1
+:launch
+move /y "%_GEODISTRO_STATE%.new" "%_GEODISTRO_STATE%" >nul
+set "_GEODISTRO_STATE="
+call "{snapshot / 'activation.bat'}"
+{target} %*
+"""
+
+
+def write_launchers(
+    conda: str,
+    env_name: str,
+    prefix: Path,
+    output_dir: Path,
+    system: Optional[str] = None,
+) -> List[Path]:
+    """Capture the activation snapshot and write launchers for every target"""
+    system = system or sys.platform
+    refresh_snapshot(conda, env_name, prefix, force=True)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    written = []
+    for name, command in LAUNCHERS.items():
+        if system.startswith("win"):
+            path = output_dir / f"{name}.bat"
+            path.write_text(_windows_launcher(conda, env_name, prefix, command))
+        else:
+            path = output_dir / f"{name}.sh"
+            path.write_text(_posix_launcher(conda, env_name, prefix, command))
+            path.chmod(0o755)
+        written.append(path)
+    return written
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Refresh a cached activation snapshot")
+    parser.add_argument("--conda", required=True)
+    parser.add_argument("--env-name", required=True)
+    parser.add_argument("--prefix", required=True, type=Path)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args(argv)
+    refresh_snapshot(args.conda, args.env_name, args.prefix, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
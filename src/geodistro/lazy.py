@@ -0,0 +1,184 @@
+"""
+Lazy imports of the geo stack for Geo Distribution
+
+Scripts often import geopandas, rasterio, folium and osmnx up front but use
+one of them per run. Modules returned here are created with
+importlib.util.LazyLoader: the module object exists immediately and its
+code runs on first attribute access.
+
+    from geodistro.lazy import geopandas as gpd   # one lazy module
+
+    import geodistro.lazy
+    geodistro.lazy.install()                      # every stack import is lazy
+    import geopandas, rasterio, folium, osmnx
+
+Missing libraries still raise ImportError at the import statement. Libraries
+whose import has side effects other code relies on (accessor or plugin
+registration) are always loaded eagerly, see EAGER.
+"""
+
+import importlib
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import json
+import statistics
+import subprocess
+import sys
+import types
+from typing import Dict, Iterable, List, Optional
+
+from geodistro.core import GeoDistroConfig
+
+# Distribution name -> top-level module, where they differ; None for C libraries
+MODULE_NAMES = {
+    "gdal": "osgeo",
+    "geos": None,
+    "proj": None,
+    "geotiff": None,
+    "libspatialindex": None,
+    "scikit-learn": "sklearn",
+    "scikit-image": "skimage",
+}
+
+# Imported eagerly even when lazy loading is installed
+EAGER = {
+    "rioxarray",    # registers the .rio accessor on xarray objects
+    "pytest",       # installs assertion rewriting hooks
+    "ipywidgets",   # registers widget comm targets with the kernel
+}
+
+
+def stack_modules() -> List[str]:
+    """Top-level modules of every package in the distribution"""
+    modules = []
+    for packages in GeoDistroConfig.get_all_packages().values():
+        for package in packages:
+            module = MODULE_NAMES.get(package, package.replace("-", "_"))
+            if module and module not in modules:
+                modules.append(module)
+    return modules
+
+
+def _lazy_spec(spec: importlib.machinery.ModuleSpec) -> importlib.machinery.ModuleSpec:
+    # Extension modules cannot be executed lazily
+    loader = spec.loader
+    if (loader is None or not hasattr(loader, "exec_module")
+            or isinstance(loader, importlib.machinery.ExtensionFileLoader)):
+        return spec
+    spec.loader = importlib.util.LazyLoader(loader)
+    return spec
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Import a module lazily; raises ImportError now if it is not installed"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    if name in EAGER:
+        return importlib.import_module(name)
+    spec = _lazy_spec(spec)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class LazyFinder(importlib.abc.MetaPathFinder):
+    """Meta path finder that makes imports of the given top-level modules lazy"""
+
+    def __init__(self, modules: Iterable[str], eager: Iterable[str] = ()):
+        self.modules = set(modules) - set(eager) - EAGER
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in self.modules:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                return _lazy_spec(spec)
+        return None
+
+
+_finder: Optional[LazyFinder] = None
+
+
+def install(
+    modules: Optional[Iterable[str]] = None, eager: Iterable[str] = ()
+) -> LazyFinder:
+    """Make later imports of the stack's top-level packages lazy
+
+    eager names extra modules to keep loading normally, for libraries that
+    misbehave when deferred.
+    """
+    global _finder
+    uninstall()
+    _finder = LazyFinder(stack_modules() if modules is None else modules, eager)
+    sys.meta_path.insert(0, _finder)
+    return _finder
+
+
+def uninstall():
+    """Restore normal imports; modules already imported lazily stay lazy"""
+    global _finder
+    if _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
+    _finder = None
+
+
+def __getattr__(name: str) -> types.ModuleType:
+    # from geodistro.lazy import geopandas
+    if name in stack_modules():
+        return lazy_import(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_STARTUP = r'''
+import importlib, importlib.util, json, sys, time
+mode, use = sys.argv[1], sys.argv[2]
+modules = [m for m in sys.argv[3].split(",") if importlib.util.find_spec(m)]
+start = time.perf_counter()
+if mode == "lazy":
+    import geodistro.lazy
+    geodistro.lazy.install(modules)
+loaded = {m: importlib.import_module(m) for m in modules}
+if use in loaded:
+    dir(loaded[use])
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": modules}))
+'''
+
+
+def benchmark_startup(python: Optional[str] = None, modules: Optional[List[str]] = None,
+                      use: str = "geopandas", repeat: int = 5) -> Dict:
+    """Startup of a script importing the stack and using one module, eager vs lazy
+
+    Each run is a fresh interpreter; returns the median seconds per mode and
+    the modules that were installed and imported.
+    """
+    python = python or sys.executable
+    modules = modules or stack_modules()
+    report = {}
+    for mode in ("eager", "lazy"):
+        timings = []
+        for _ in range(repeat):
+            result = subprocess.run(
+                [python, "-c", _STARTUP, mode, use, ",".join(modules)],
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode != 0:
+                lines = result.stderr.strip().splitlines()
+                report[mode] = {
+                    "error": lines[-1] if lines else f"exit code {result.returncode}"
+                }
+                break
+            run = json.loads(result.stdout.strip().splitlines()[-1])
+            timings.append(run["seconds"])
+            report["modules"] = run["modules"]
+        else:
+            report[mode] = {"seconds": statistics.median(timings)}
+    return report
@@ -0,0 +1,330 @@
+"""
+Local repodata mirror for Geo Distribution
+
+Every conda/mamba call against conda-forge may download its full repodata
+(hundreds of MB). The mirror keeps one upstream copy per channel and subdir,
+refreshed incrementally: a conditional request for the JLAP diff file
+(repodata.jlap, CEP 10), whose JSON patches are applied locally, and a
+conditional full download only when no usable diff exists.
+
+From that copy a pruned repodata.json is written with only the manifest
+packages and their dependency closure. It is served as a file:// channel whose
+info.base_url (repodata v2, CEP 15) points back at the upstream channel, so
+the solver reads a few MB locally while packages still download from upstream.
+"""
+
+import hashlib
+import json
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+import requests
+
+from geodistro.core import GeoDistroConfig
+from geodistro.solvecache import channel_urls
+
+PACKAGE_KEYS = ("packages", "packages.conda")
+
+_NAME_RE = re.compile(r"^\s*(?:[^:\s]+::)?([A-Za-z0-9_.\-]+)")
+
+
+def default_roots() -> List[str]:
+    """Package names the installer solves with conda"""
+    return ["python", "pip"] + list(GeoDistroConfig.CORE_GEOSPATIAL)
+
+
+def spec_name(spec: str) -> str:
+    """Package name of a match spec such as 'gdal >=3.6' or 'python=3.9'"""
+    match = _NAME_RE.match(spec)
+    if not match:
+        raise ValueError(f"Invalid package spec '{spec}'")
+    return match.group(1).lower()
+
+
+def dependency_closure(repodatas: Iterable[Dict], roots: Iterable[str]) -> Set[str]:
+    """Names reachable from roots through the depends of any record"""
+    depends: Dict[str, Set[str]] = {}
+    for repodata in repodatas:
+        for key in PACKAGE_KEYS:
+            for record in repodata.get(key, {}).values():
+                names = depends.setdefault(record["name"], set())
+                names.update(spec_name(d) for d in record.get("depends", []))
+
+    closure = set()
+    queue = deque(spec_name(root) for root in roots)
+    while queue:
+        name = queue.popleft()
+        # Virtual packages (__glibc, __cuda) are provided by the host
+        if name in closure or name.startswith("__"):
+            continue
+        closure.add(name)
+        queue.extend(depends.get(name, ()))
+    return closure
+
+
+def prune_repodata(repodata: Dict, names: Set[str], base_url: str) -> Dict:
+    """Keep only the records of the given packages"""
+    info = dict(repodata.get("info", {}), base_url=base_url.rstrip("/") + "/")
+    pruned = {"info": info, "repodata_version": 2}
+    for key in PACKAGE_KEYS:
+        pruned[key] = {fn: record for fn, record in repodata.get(key, {}).items()
+                       if record["name"] in names}
+    return pruned
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def apply_patch(document: Dict, operations: List[Dict]) -> Dict:
+    """Apply JSON Patch (RFC 6902) add/remove/replace operations in place"""
+    for operation in operations:
+        op = operation["op"]
+        if op not in ("add", "remove", "replace"):
+            raise ValueError(f"Unsupported patch operation '{op}'")
+        tokens = [_unescape(t) for t in operation["path"].split("/")[1:]]
+        if not tokens:
+            raise ValueError("Patches replacing the whole document are not supported")
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            index = len(parent) if last == "-" else int(last)
+            if op == "add":
+                parent.insert(index, operation["value"])
+            elif op == "remove":
+                del parent[index]
+            else:
+                parent[index] = operation["value"]
+        elif op == "remove":
+            del parent[last]
+        else:
+            if op == "replace" and last not in parent:
+                raise ValueError(f"Cannot replace missing member '{operation['path']}'")
+            parent[last] = operation["value"]
+    return document
+
+
+def parse_jlap(text: str) -> Dict:
+    """Parse and verify a repodata.jlap file
+
+    Lines are: an initialization vector, one JSON patch per line, a metadata
+    line with the latest repodata hash, and a trailing checksum; each line
+    is chained into a keyed BLAKE2b-256 hash of its predecessor.
+    """
+    lines = text.rstrip("\n").split("\n")
+    if len(lines) < 3:
+        raise ValueError("Truncated jlap file")
+    running = bytes.fromhex(lines[0])
+    for line in lines[1:-1]:
+        running = hashlib.blake2b(line.encode(), key=running, digest_size=32).digest()
+    if running.hex() != lines[-1]:
+        raise ValueError("jlap checksum mismatch")
+    metadata = json.loads(lines[-2])
+    return {"patches": [json.loads(line) for line in lines[1:-2]],
+            "latest": metadata["latest"]}
+
+
+def patch_chain(patches: List[Dict], have: str, latest: str) -> Optional[List[Dict]]:
+    """Patches leading from the hash we have to the latest one, if available"""
+    by_source = {patch["from"]: patch for patch in patches}
+    chain = []
+    current = have
+    while current != latest:
+        patch = by_source.get(current)
+        if patch is None or len(chain) > len(patches):
+            return None
+        chain.append(patch)
+        current = patch["to"]
+    return chain
+
+
+def _channel_key(url: str) -> str:
+    """Filesystem-safe directory name for a channel URL"""
+    return re.sub(r"[^A-Za-z0-9_.\-]+", "_", url.split("://", 1)[-1]).strip("_")
+
+
+class RepodataMirror:
+    """Pruned local copies of channel repodata for a set of root packages"""
+
+    def __init__(self, root: Optional[Path] = None, timeout: float = 60.0):
+        self.root = Path(root or GeoDistroConfig.get_cache_dir("mirror"))
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def upstream_dir(self, url: str, subdir: str) -> Path:
+        return self.root / "upstream" / _channel_key(url) / subdir
+
+    def channel_dir(self, url: str) -> Path:
+        """Directory of the pruned local channel for an upstream channel"""
+        return self.root / "channels" / _channel_key(url)
+
+    def _load_state(self, url: str, subdir: str) -> Dict:
+        path = self.upstream_dir(url, subdir) / "state.json"
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def _save_state(self, url: str, subdir: str, state: Dict):
+        path = self.upstream_dir(url, subdir) / "state.json"
+        path.write_text(json.dumps(state, indent=2))
+
+    def _write_json(self, path: Path, document: Dict):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(document, separators=(",", ":")))
+        tmp.replace(path)
+
+    def _fetch_jlap(self, base: str, state: Dict) -> Optional[Dict]:
+        """Bring the upstream copy up to date from repodata.jlap
+
+        Returns the new state, or None when a full download is needed.
+        """
+        headers = (
+            {"If-None-Match": state["jlap_etag"]} if state.get("jlap_etag") else {}
+        )
+        response = self.session.get(f"{base}/repodata.jlap", headers=headers,
+                                    timeout=self.timeout)
+        if response.status_code == 304:
+            return dict(state, status="not-modified")
+        if not response.ok:
+            return None
+        try:
+            jlap = parse_jlap(response.text)
+        except (ValueError, KeyError):
+            return None
+        state = dict(state, jlap_etag=response.headers.get("ETag"))
+        if jlap["latest"] == state["have"]:
+            return dict(state, status="not-modified")
+        chain = patch_chain(jlap["patches"], state["have"], jlap["latest"])
+        if chain is None:
+            return None
+        return dict(state, status="patched", chain=chain, have=jlap["latest"])
+
+    def _fetch_full(self, base: str, path: Path, state: Dict) -> Dict:
+        """Conditionally download the complete repodata.json"""
+        headers = {}
+        if path.exists() and state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if path.exists() and state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        response = self.session.get(f"{base}/repodata.json", headers=headers,
+                                    timeout=self.timeout, stream=True)
+        if response.status_code == 304:
+            return dict(state, status="not-modified")
+        response.raise_for_status()
+
+        digest = hashlib.blake2b(digest_size=32)
+        tmp = path.with_suffix(".download")
+        size = 0
+        with open(tmp, "wb") as f:
+            for chunk in response.iter_content(1024 * 1024):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        tmp.replace(path)
+        return {
+            "status": "downloaded",
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "have": digest.hexdigest(),
+            "bytes": size,
+        }
+
+    def refresh_upstream(self, url: str, subdir: str) -> Dict:
+        """Update the upstream copy of one subdir, downloading as little as possible"""
+        base = f"{url}/{subdir}"
+        directory = self.upstream_dir(url, subdir)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / "repodata.json"
+        state = self._load_state(url, subdir)
+
+        new_state = None
+        if path.exists() and state.get("have"):
+            new_state = self._fetch_jlap(base, state)
+            if new_state and new_state["status"] == "patched":
+                try:
+                    repodata = json.loads(path.read_text())
+                    for patch in new_state.pop("chain"):
+                        apply_patch(repodata, patch["patch"])
+                except (ValueError, KeyError, IndexError, TypeError):
+                    new_state = None
+                else:
+                    self._write_json(path, repodata)
+        if new_state is None:
+            new_state = self._fetch_full(base, path, state)
+
+        new_state["checked"] = time.time()
+        self._save_state(url, subdir, new_state)
+        downloaded = (
+            new_state.get("bytes", 0) if new_state["status"] == "downloaded" else 0
+        )
+        return {"url": base, "status": new_state["status"], "bytes": downloaded}
+
+    def refresh(self, channels: Optional[List[str]] = None, platform: str = "linux-64",
+                roots: Optional[List[str]] = None) -> List[Dict]:
+        """Refresh every channel subdir and rewrite the pruned local channels
+
+        Without explicit roots, the default roots are extended with the roots
+        a previous refresh was given.
+        """
+        channels = channels or GeoDistroConfig.SOLVER_CHANNELS
+        if roots is None:
+            roots = default_roots()
+            for manifest in self.status(channels).values():
+                roots += manifest["roots"] if manifest else []
+        roots = sorted({spec_name(r) for r in roots})
+        subdirs = [platform, "noarch"]
+        results = []
+        for url in channel_urls(channels):
+            for subdir in subdirs:
+                results.append(self.refresh_upstream(url, subdir))
+
+            upstream = {
+                subdir: json.loads(
+                    (self.upstream_dir(url, subdir) / "repodata.json").read_text()
+                )
+                for subdir in subdirs
+            }
+            names = dependency_closure(upstream.values(), roots)
+            for subdir, repodata in upstream.items():
+                pruned = prune_repodata(repodata, names, f"{url}/{subdir}")
+                self._write_json(
+                    self.channel_dir(url) / subdir / "repodata.json", pruned
+                )
+            manifest = {"upstream": url, "platform": platform, "roots": roots,
+                        "packages": sorted(names), "updated": time.time()}
+            (self.channel_dir(url) / "mirror.json").write_text(
+                json.dumps(manifest, indent=2)
+            )
+        return results
+
+    def status(self, channels: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+        """Manifest of the pruned channel for every upstream channel"""
+        channels = channels or GeoDistroConfig.SOLVER_CHANNELS
+        status = {}
+        for url in channel_urls(channels):
+            manifest = self.channel_dir(url) / "mirror.json"
+            status[url] = (
+                json.loads(manifest.read_text()) if manifest.exists() else None
+            )
+        return status
+
+    def local_channels(self, channels: List[str], platform: str,
+                       specs: Iterable[str] = ()) -> Optional[List[str]]:
+        """file:// URLs of the mirrored channels, if they can serve these specs
+
+        Returns None unless every channel is mirrored for the platform and its
+        roots cover every requested package.
+        """
+        wanted = {spec_name(spec) for spec in specs}
+        local = []
+        for url, manifest in self.status(channels).items():
+            if manifest is None or manifest["platform"] != platform:
+                return None
+            if not wanted.issubset(manifest["packages"]):
+                return None
+            local.append(self.channel_dir(url).as_uri())
+        return local
@@ -0,0 +1,403 @@
+"""
+Compact street network cache for Geo Distribution
+
+An osmnx graph of a metro area is millions of Python dicts. Here it is kept
+as CSR arrays (node ids and coordinates, per-node edge offsets, edge targets
+and one float array per edge weight) saved as .npy files that load back
+memory-mapped. Networks are cached by query, so a routing job downloads and
+converts each area once. Shortest paths and isochrones run on the arrays
+through scipy.sparse.csgraph, many sources per call. Chunks of sources can
+be spread over worker processes that map the same cached files.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import dijkstra
+
+from geodistro.core import GeoDistroConfig
+
+PathLike = Union[str, Path]
+
+# Edge attributes kept from osmnx graphs when every edge has them
+DEFAULT_WEIGHTS = ("length", "travel_time")
+
+# Sources per Dijkstra call; bounds the (sources x nodes) distance block
+DEFAULT_CHUNK_SIZE = 64
+
+_ARRAYS = ("node_ids", "x", "y", "indptr", "indices")
+
+
+class Network:
+    """Directed street network stored as CSR arrays
+
+    Nodes are sorted by id; edges leaving node i are indices[indptr[i]:indptr[i + 1]]
+    with one value per edge in each weights array. Parallel edges keep the
+    shortest one.
+    """
+
+    def __init__(
+        self,
+        node_ids: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        weights: Dict[str, np.ndarray],
+        crs: Optional[str] = None,
+        path: Optional[Path] = None,
+    ):
+        self.node_ids = node_ids
+        self.x = x
+        self.y = y
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.crs = crs
+        self.path = path
+        self._matrices: Dict[str, sparse.csr_matrix] = {}
+        self._tree = None
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def from_edges(
+        cls,
+        node_ids: Sequence[int],
+        x: Sequence[float],
+        y: Sequence[float],
+        u: Sequence[int],
+        v: Sequence[int],
+        weights: Dict[str, Sequence[float]],
+        crs: Optional[str] = None,
+    ) -> "Network":
+        """Build a network from node and edge arrays, edges given as node ids"""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        order = np.argsort(node_ids, kind="stable")
+        node_ids = node_ids[order]
+        if len(node_ids) and np.any(node_ids[1:] == node_ids[:-1]):
+            raise ValueError("Duplicate node ids")
+        x = np.asarray(x, dtype=np.float64)[order]
+        y = np.asarray(y, dtype=np.float64)[order]
+        if "length" not in weights:
+            raise ValueError("Edges need a 'length' weight")
+
+        u = _lookup(node_ids, np.asarray(u, dtype=np.int64))
+        v = _lookup(node_ids, np.asarray(v, dtype=np.int64))
+        weights = {
+            name: np.asarray(values, dtype=np.float64)
+            for name, values in weights.items()
+        }
+
+        # Sort edges by (u, v, length) and keep the first of each parallel group
+        edge_order = np.lexsort((weights["length"], v, u))
+        u, v = u[edge_order], v[edge_order]
+        keep = np.ones(len(u), dtype=bool)
+        keep[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        u, v = u[keep], v[keep]
+        weights = {name: values[edge_order][keep] for name, values in weights.items()}
+
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(u, minlength=len(node_ids)), out=indptr[1:])
+        return cls(node_ids, x, y, indptr, v.astype(np.int64), weights, crs=crs)
+
+    @classmethod
+    def from_networkx(
+        cls, graph, weights: Iterable[str] = DEFAULT_WEIGHTS
+    ) -> "Network":
+        """Convert an osmnx/networkx graph; nodes need 'x' and 'y', edges 'length'"""
+        nodes = list(graph.nodes(data=True))
+        node_ids = [node for node, _ in nodes]
+        x = [data["x"] for _, data in nodes]
+        y = [data["y"] for _, data in nodes]
+
+        edges = list(graph.edges(data=True))
+        if not graph.is_directed():
+            edges += [(v, u, data) for u, v, data in edges]
+        u = [edge[0] for edge in edges]
+        v = [edge[1] for edge in edges]
+        values = {}
+        for name in weights:
+            column = [data.get(name) for _, _, data in edges]
+            # Partially present attributes cannot be routed on
+            if name == "length" or all(value is not None for value in column):
+                values[name] = column
+        crs = graph.graph.get("crs")
+        return cls.from_edges(
+            node_ids, x, y, u, v, values, crs=str(crs) if crs else None
+        )
+
+    def save(self, path: PathLike) -> Path:
+        """Write the arrays as .npy files next to a meta.json, replacing any old copy"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir()
+        try:
+            for name in _ARRAYS:
+                np.save(tmp_path / f"{name}.npy", getattr(self, name))
+            for name, values in self.weights.items():
+                np.save(tmp_path / f"weight-{name}.npy", values)
+            meta = {
+                "nodes": self.n_nodes,
+                "edges": self.n_edges,
+                "weights": list(self.weights),
+                "crs": self.crs,
+                "created": time.time(),
+            }
+            (tmp_path / "meta.json").write_text(json.dumps(meta))
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.path = path
+        return path
+
+    @classmethod
+    def load(cls, path: PathLike, mmap: bool = True) -> "Network":
+        """Load a network written by save, memory-mapped by default"""
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text())
+
+        def array(name):
+            # Zero-length files cannot be mapped
+            mode = "r" if mmap and meta["edges"] and meta["nodes"] else None
+            return np.load(path / f"{name}.npy", mmap_mode=mode)
+
+        arrays = {name: array(name) for name in _ARRAYS}
+        weights = {name: array(f"weight-{name}") for name in meta["weights"]}
+        return cls(weights=weights, crs=meta["crs"], path=path, **arrays)
+
+    def matrix(self, weight: str = "length") -> sparse.csr_matrix:
+        """Sparse adjacency matrix weighted by an edge attribute"""
+        if weight not in self.weights:
+            raise KeyError(
+                f"Unknown weight '{weight}'; available: {', '.join(self.weights)}"
+            )
+        if weight not in self._matrices:
+            self._matrices[weight] = sparse.csr_matrix(
+                (self.weights[weight], self.indices, self.indptr),
+                shape=(self.n_nodes, self.n_nodes), copy=False)
+        return self._matrices[weight]
+
+    def node_index(self, ids) -> np.ndarray:
+        """Positions of node ids in the arrays"""
+        return _lookup(self.node_ids, np.atleast_1d(np.asarray(ids, dtype=np.int64)))
+
+    def nearest_nodes(self, x, y) -> np.ndarray:
+        """Ids of the nodes nearest to the given coordinates"""
+        from scipy.spatial import cKDTree
+
+        scale = self._x_scale()
+        if self._tree is None:
+            self._tree = cKDTree(np.column_stack([self.x * scale, self.y]))
+        _, idx = self._tree.query(
+            np.column_stack([np.atleast_1d(x) * scale, np.atleast_1d(y)])
+        )
+        return self.node_ids[idx]
+
+    def _x_scale(self) -> float:
+        # Degrees of longitude shrink with latitude; good enough for snapping points
+        if not self.crs or not len(self.y):
+            return 1.0
+        try:
+            import pyproj
+
+            if not pyproj.CRS(self.crs).is_geographic:
+                return 1.0
+        except Exception:
+            return 1.0
+        return float(np.cos(np.radians(np.mean(self.y))))
+
+    def shortest_path(self, source: int, target: int,
+                      weight: str = "length") -> Tuple[List[int], float]:
+        """Node ids along the shortest path and its total weight; ([], inf) if unreachable"""
+        source_idx, target_idx = self.node_index([source, target])
+        dist, predecessors = dijkstra(self.matrix(weight), indices=source_idx,
+                                      return_predecessors=True)
+        if not np.isfinite(dist[target_idx]):
+            return [], float("inf")
+        path = [target_idx]
+        while path[-1] != source_idx:
+            path.append(predecessors[path[-1]])
+        return self.node_ids[path[::-1]].tolist(), float(dist[target_idx])
+
+    def distances(self, sources, targets=None, weight: str = "length",
+                  limit: float = np.inf, n_jobs: int = 1,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+        """Shortest path weights from each source to each target (all nodes by default)
+
+        Returns a (sources, targets) array with inf where the target is
+        unreachable or beyond limit. With n_jobs > 1 and a saved network, chunks
+        of sources run in worker processes that memory-map the saved arrays.
+        """
+        source_idx = self.node_index(sources)
+        target_idx = None if targets is None else self.node_index(targets)
+        chunks = [source_idx[start:start + chunk_size]
+                  for start in range(0, len(source_idx), chunk_size)]
+        if n_jobs > 1 and self.path is not None and len(chunks) > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                     initargs=(str(self.path),)) as executor:
+                blocks = list(
+                    executor.map(
+                        _worker_distances,
+                        chunks,
+                        [target_idx] * len(chunks),
+                        [weight] * len(chunks),
+                        [limit] * len(chunks),
+                    )
+                )
+        else:
+            blocks = [
+                _chunk_distances(self, chunk, target_idx, weight, limit)
+                for chunk in chunks
+            ]
+        width = self.n_nodes if target_idx is None else len(target_idx)
+        return np.vstack(blocks) if blocks else np.empty((0, width))
+
+    def isochrones(self, sources, cutoffs: Sequence[float], weight: str = "length",
+                   n_jobs: int = 1) -> np.ndarray:
+        """Band of every node per source: index of the first cutoff reached, -1 if none
+
+        Dijkstra stops at the largest cutoff, so only the reachable part of
+        the network is searched.
+        """
+        cutoffs = np.sort(np.asarray(cutoffs, dtype=np.float64))
+        dist = self.distances(sources, weight=weight, limit=cutoffs[-1], n_jobs=n_jobs)
+        bands = np.searchsorted(cutoffs, dist, side="left").astype(np.int16)
+        bands[bands == len(cutoffs)] = -1
+        return bands
+
+    def isochrone_polygons(self, source: int, cutoffs: Sequence[float],
+                           weight: str = "length", ratio: float = 1.0) -> List:
+        """One shapely polygon per cutoff around the nodes reachable within it
+
+        ratio is passed to shapely.concave_hull; 1.0 gives the convex hull.
+        """
+        import shapely
+
+        cutoffs = sorted(cutoffs)
+        bands = self.isochrones([source], cutoffs, weight)[0]
+        polygons = []
+        for i in range(len(cutoffs)):
+            reached = (bands >= 0) & (bands <= i)
+            points = shapely.multipoints(
+                np.column_stack([self.x[reached], self.y[reached]])
+            )
+            polygons.append(shapely.concave_hull(points, ratio=ratio))
+        return polygons
+
+
+def _lookup(node_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Positions of ids in the sorted node_ids array"""
+    if not len(node_ids):
+        missing = np.ones(len(ids), dtype=bool)
+        idx = ids
+    else:
+        idx = np.minimum(np.searchsorted(node_ids, ids), len(node_ids) - 1)
+        missing = node_ids[idx] != ids
+    if np.any(missing):
+        raise KeyError(f"Unknown node ids: {ids[missing][:5].tolist()}")
+    return idx
+
+
+def _chunk_distances(
+    network: Network,
+    sources: np.ndarray,
+    targets: Optional[np.ndarray],
+    weight: str,
+    limit: float,
+) -> np.ndarray:
+    dist = dijkstra(network.matrix(weight), indices=sources, limit=limit)
+    return dist if targets is None else dist[:, targets]
+
+
+_worker_network: Optional[Network] = None
+
+
+def _init_worker(path: str):
+    global _worker_network
+    _worker_network = Network.load(path, mmap=True)
+
+
+def _worker_distances(sources, targets, weight, limit):
+    return _chunk_distances(_worker_network, sources, targets, weight, limit)
+
+
+def grid_network(rows: int, cols: int, spacing: float = 100.0, speed: float = 10.0,
+                 seed: Optional[int] = None) -> Network:
+    """Synthetic two-way street grid for tests and benchmarks
+
+    Nodes are numbered row by row from 1; lengths are the spacing, perturbed
+    by up to 10% when a seed is given, and travel_time is length / speed.
+    """
+    ids = np.arange(rows * cols, dtype=np.int64).reshape(rows, cols) + 1
+    ys, xs = np.meshgrid(
+        np.arange(rows) * spacing, np.arange(cols) * spacing, indexing="ij"
+    )
+    u = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    v = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    length = np.full(len(u), spacing)
+    if seed is not None:
+        length *= np.random.default_rng(seed).uniform(1.0, 1.1, len(u))
+    u, v = np.concatenate([u, v]), np.concatenate([v, u])
+    length = np.concatenate([length, length])
+    return Network.from_edges(ids.ravel(), xs.ravel(), ys.ravel(), u, v,
+                              {"length": length, "travel_time": length / speed})
+
+
+def cache_key(query, network_type: str = "drive", **kwargs) -> str:
+    """Stable key for an osmnx query and its options"""
+    payload = json.dumps([query, network_type, kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def _osmnx_graph(query, network_type: str, **kwargs):
+    """Download a graph: a place name, a (lat, lon) point with dist=, or a bbox"""
+    import osmnx as ox
+
+    if isinstance(query, str):
+        return ox.graph_from_place(query, network_type=network_type, **kwargs)
+    if len(query) == 2:
+        return ox.graph_from_point(tuple(query), network_type=network_type, **kwargs)
+    return ox.graph_from_bbox(tuple(query), network_type=network_type, **kwargs)
+
+
+def load_network(query, network_type: str = "drive", refresh: bool = False,
+                 max_age: Optional[float] = None, cache_dir: Optional[PathLike] = None,
+                 builder: Optional[Callable] = None, **kwargs) -> Network:
+    """Network for an osmnx query, converted once and memory-mapped from the cache after
+
+    builder(query, network_type, **kwargs) returns a networkx graph or a
+    Network; it defaults to downloading with osmnx. max_age (seconds)
+    rebuilds cached networks older than that.
+    """
+    cache_dir = (
+        Path(cache_dir) if cache_dir else GeoDistroConfig.get_cache_dir("network")
+    )
+    path = cache_dir / cache_key(query, network_type, **kwargs)
+    meta_file = path / "meta.json"
+    if not refresh and meta_file.exists():
+        created = json.loads(meta_file.read_text()).get("created", 0)
+        if max_age is None or time.time() - created <= max_age:
+            return Network.load(path)
+
+    graph = (builder or _osmnx_graph)(query, network_type, **kwargs)
+    network = graph if isinstance(graph, Network) else Network.from_networkx(graph)
+    network.save(path)
+    return Network.load(path)
@@ -0,0 +1,651 @@
+"""
+Pre-flight install plan for Geo Distribution
+
+Builds the dependency graph of an install from cached metadata only, before
+the environment is touched: the conda packages are solved offline (dry run)
+against the local repodata mirror, and the pip packages are resolved with
+resolvelib, pip's own resolver, from cached PyPI metadata (per-file
+Requires-Python, Requires-Dist and sizes).
+Unsatisfiable or conflicting requirements are reported with who asked for
+what, together with an estimate of the download size and install time.
+"""
+
+import io
+import json
+import os
+import re
+import subprocess
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import Parser
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urljoin
+
+import requests
+from packaging import tags
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.utils import (
+    InvalidWheelFilename,
+    canonicalize_name,
+    parse_wheel_filename,
+)
+from packaging.version import InvalidVersion, Version
+from resolvelib import (AbstractProvider, BaseReporter, ResolutionImpossible,
+                        ResolutionTooDeep, Resolver)
+
+from geodistro.core import GeoDistroConfig
+from geodistro.mirror import spec_name
+
+PYPI_URL = "https://pypi.org/pypi"
+
+# Rough per-package costs used by the install time estimate
+CONDA_LINK_SECONDS = 0.15
+PIP_INSTALL_SECONDS = 0.5
+SDIST_BUILD_SECONDS = 30.0
+DEFAULT_BANDWIDTH = 10e6  # bytes per second
+
+# Limits that keep a pathological dependency graph from running forever:
+# resolvelib rounds per resolution, and metadata fetch rounds per refresh
+MAX_RESOLUTION_ROUNDS = 10_000
+_MAX_ROUNDS = 20
+
+
+class _HTTPRangeFile(io.RawIOBase):
+    """Read-only file over HTTP range requests, enough for zipfile"""
+
+    def __init__(self, url: str, session: requests.Session, timeout: float,
+                 block: int = 64 * 1024):
+        self.url = url
+        self.session = session
+        self.timeout = timeout
+        self.block = block
+        self.position = 0
+        self.blocks: Dict[int, bytes] = {}
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+        response.raise_for_status()
+        self.length = int(response.headers["Content-Length"])
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.length}[
+            whence
+        ]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def _block(self, index: int) -> bytes:
+        if index not in self.blocks:
+            first = index * self.block
+            last = min(first + self.block, self.length) - 1
+            response = self.session.get(
+                self.url,
+                headers={"Range": f"bytes={first}-{last}"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise OSError("Server does not support range requests")
+            self.blocks[index] = response.content
+        return self.blocks[index]
+
+    def read(self, size: int = -1) -> bytes:
+        end = (
+            self.length
+            if size is None or size < 0
+            else min(self.length, self.position + size)
+        )
+        chunks = []
+        while self.position < end:
+            index, offset = divmod(self.position, self.block)
+            data = self._block(index)[offset:offset + end - self.position]
+            chunks.append(data)
+            self.position += len(data)
+        return b"".join(chunks)
+
+
+def _requires_from_metadata(text: str) -> List[str]:
+    """Requires-Dist entries of a core metadata (METADATA / PKG-INFO) file"""
+    return Parser().parsestr(text, headersonly=True).get_all("Requires-Dist") or []
+
+
+class WheelMetadataCache:
+    """On-disk cache of PyPI project metadata, one JSON file per project
+
+    Per release, the requirements come from the wheel's METADATA: the
+    separately served file (PEP 658) when the index has it, otherwise read
+    out of the wheel with HTTP range requests, without downloading it.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, timeout: float = 30.0,
+                 max_age: Optional[float] = None):
+        self.cache_dir = Path(cache_dir or GeoDistroConfig.get_cache_dir("pypi"))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        # Entries older than max_age seconds count as missing (None keeps them)
+        self.max_age = max_age
+        self.session = requests.Session()
+
+    def path(self, name: str) -> Path:
+        return self.cache_dir / f"{canonicalize_name(name)}.json"
+
+    def _load(self, name: str) -> Optional[Dict]:
+        path = self.path(name)
+        return json.loads(path.read_text()) if path.exists() else None
+
+    def get(self, name: str) -> Optional[Dict]:
+        path = self.path(name)
+        if not path.exists():
+            return None
+        if (
+            self.max_age is not None
+            and time.time() - path.stat().st_mtime > self.max_age
+        ):
+            return None
+        return self._load(name)
+
+    def _store(self, name: str, project: Dict):
+        tmp = self.path(name).with_suffix(".tmp")
+        tmp.write_text(json.dumps(project))
+        tmp.replace(self.path(name))
+
+    def fetch(self, name: str, versions: Iterable[Optional[str]] = (None,)) -> Dict:
+        """Download the file list of a project (None) and the requirements of releases"""
+        project = self._load(name) or {"name": name, "releases": {}, "requires": {}}
+        for version in versions:
+            if version is None:
+                project = self._fetch_project(name, project)
+            else:
+                project["requires"][version] = self._fetch_requires(
+                    name, project, version
+                )
+        self._store(name, project)
+        return project
+
+    def _fetch_project(self, name: str, project: Dict) -> Dict:
+        url = f"{PYPI_URL}/{name}/json"
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code == 404:
+            return {"name": name, "releases": {}, "requires": {}}
+        response.raise_for_status()
+        data = response.json()
+        requires = dict(project.get("requires", {}))
+        requires[data["info"]["version"]] = data["info"].get("requires_dist") or []
+        return {
+            "name": data["info"]["name"],
+            "releases": {
+                release: [{
+                    "filename": f["filename"],
+                    "url": urljoin(url, f["url"]),
+                    "requires_python": f.get("requires_python"),
+                    "size": f.get("size", 0),
+                    "yanked": f.get("yanked", False),
+                    "core_metadata": bool(f.get("core-metadata")
+                                          or f.get("data-dist-info-metadata")),
+                } for f in files]
+                for release, files in data["releases"].items()
+            },
+            "requires": requires,
+        }
+
+    def _fetch_requires(self, name: str, project: Dict, version: str) -> List[str]:
+        """Requirements of one release, from its wheel METADATA where possible"""
+        wheels = [f for f in project["releases"].get(version, [])
+                  if f["filename"].endswith(".whl")]
+        # Any wheel will do; pure Python ones are smallest to read from
+        wheels.sort(key=lambda f: ("none-any" not in f["filename"], f.get("size") or 0))
+        for wheel in wheels[:1]:
+            if wheel.get("core_metadata"):
+                response = self.session.get(
+                    wheel["url"] + ".metadata", timeout=self.timeout
+                )
+                if response.ok:
+                    return _requires_from_metadata(response.text)
+            try:
+                with zipfile.ZipFile(_HTTPRangeFile(wheel["url"], self.session,
+                                                    self.timeout)) as archive:
+                    for member in archive.namelist():
+                        parts = member.split("/")
+                        if len(parts) == 2 and parts[0].endswith(".dist-info") \
+                                and parts[1] == "METADATA":
+                            return _requires_from_metadata(
+                                archive.read(member).decode()
+                            )
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+                pass
+        response = self.session.get(
+            f"{PYPI_URL}/{name}/{version}/json", timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["info"].get("requires_dist") or []
+
+
+def target_tags(python: str) -> Set[str]:
+    """Wheel tags installable by a CPython version on this platform"""
+    version = tuple(int(part) for part in python.split(".")[:2])
+    platforms = list(tags.platform_tags())
+    interpreter = f"cp{version[0]}{version[1]}"
+    supported = list(tags.cpython_tags(python_version=version, platforms=platforms))
+    supported += list(
+        tags.compatible_tags(
+            python_version=version, interpreter=interpreter, platforms=platforms
+        )
+    )
+    return {str(tag) for tag in supported}
+
+
+def _python_ok(requires_python: Optional[str], python: Version) -> bool:
+    if not requires_python:
+        return True
+    try:
+        return SpecifierSet(requires_python).contains(python, prereleases=True)
+    except ValueError:
+        return True
+
+
+def _installable_file(
+    files: List[Dict], python: Version, supported: Set[str]
+) -> Optional[Dict]:
+    """Best file of a release for the target: a compatible wheel, else the sdist"""
+    sdist = None
+    for f in files:
+        if f.get("yanked") or not _python_ok(f.get("requires_python"), python):
+            continue
+        if f["filename"].endswith(".whl"):
+            try:
+                _, _, _, file_tags = parse_wheel_filename(f["filename"])
+            except InvalidWheelFilename:
+                continue
+            if any(str(tag) in supported for tag in file_tags):
+                return dict(f, sdist=False)
+        elif f["filename"].endswith((".tar.gz", ".zip")):
+            sdist = dict(f, sdist=True)
+    return sdist
+
+
+def _environment(python: str, extra: str = "") -> Dict[str, str]:
+    return {"python_version": ".".join(python.split(".")[:2]),
+            "python_full_version": python if python.count(".") >= 2 else f"{python}.0",
+            "extra": extra}
+
+
+def _provides(version: Optional[str], specifier: SpecifierSet) -> bool:
+    """Whether a conda-provided version satisfies a pip specifier"""
+    if version is None:
+        return True
+    try:
+        return specifier.contains(Version(version), prereleases=True)
+    except InvalidVersion:
+        return True
+
+
+def _releases(project: Dict) -> List[Tuple[Version, str, List[Dict]]]:
+    """Final releases of a project, newest first"""
+    releases = []
+    for release, files in project["releases"].items():
+        try:
+            version = Version(release)
+        except InvalidVersion:
+            continue
+        if not version.is_prerelease and files:
+            releases.append((version, release, files))
+    return sorted(releases, reverse=True)
+
+
+def _describe(constraints: List[Tuple[str, SpecifierSet]]) -> str:
+    return ", ".join(
+        f"{str(spec) or 'any'} (from {source})" for source, spec in constraints
+    )
+
+
+class _Candidate(NamedTuple):
+    """A release (or the conda-provided copy) of a project, with requested extras"""
+    name: str
+    extras: FrozenSet[str]
+    release: Optional[str]
+    file: Optional[Dict] = None
+    requires: Optional[List[str]] = None
+    # Installed by conda, or without cached metadata; either satisfies anything
+    provided: bool = False
+    unknown: bool = False
+
+
+def _identifier(name: str, extras: Iterable[str]) -> str:
+    extras = sorted(extras)
+    return f"{name}[{','.join(extras)}]" if extras else name
+
+
+def _source(parent: Optional[_Candidate]) -> str:
+    return "manifest" if parent is None else f"{parent.name} {parent.release}"
+
+
+class _MetadataProvider(AbstractProvider):
+    """resolvelib provider over cached PyPI metadata, never the network
+
+    Extras follow pip: name[extra] is its own identifier whose candidates
+    depend on the same release of the plain name.
+    """
+
+    def __init__(self, python: str, provided: Dict[str, Optional[str]],
+                 cache: WheelMetadataCache):
+        self.python = python
+        self.python_version = Version(
+            python if python.count(".") >= 2 else f"{python}.0"
+        )
+        self.supported = target_tags(python)
+        self.provided = {canonicalize_name(n): v for n, v in provided.items()}
+        self.cache = cache
+        self.missing: Set[Tuple[str, Optional[str]]] = set()
+
+    def identify(self, requirement_or_candidate) -> str:
+        if isinstance(requirement_or_candidate, Requirement):
+            return _identifier(canonicalize_name(requirement_or_candidate.name),
+                               requirement_or_candidate.extras)
+        return _identifier(
+            requirement_or_candidate.name, requirement_or_candidate.extras
+        )
+
+    def get_preference(self, identifier, resolutions, candidates, information,
+                       backtrack_causes):
+        # Settle what conda fixes first, then whatever caused the last conflict
+        name = identifier.partition("[")[0]
+        causes = {self.identify(cause.requirement) for cause in backtrack_causes}
+        return name not in self.provided, identifier not in causes, identifier
+
+    def find_matches(
+        self, identifier, requirements, incompatibilities
+    ) -> List[_Candidate]:
+        name, _, extras = identifier.partition("[")
+        extras = frozenset(extras.rstrip("]").split(",")) - {""}
+        specifier = SpecifierSet()
+        for requirement in requirements[identifier]:
+            specifier &= requirement.specifier
+        banned = {candidate.release for candidate in incompatibilities[identifier]}
+
+        if name in self.provided:
+            version = self.provided[name]
+            if version in banned or not _provides(version, specifier):
+                return []
+            return [_Candidate(name, extras, version, provided=True)]
+
+        project = self.cache.get(name)
+        if project is None:
+            self.missing.add((name, None))
+            return [_Candidate(name, extras, None, unknown=True)]
+
+        matches = []
+        for version, release, files in _releases(project):
+            if release in banned or not specifier.contains(version):
+                continue
+            file = _installable_file(files, self.python_version, self.supported)
+            if file is not None:
+                matches.append(_Candidate(name, extras, release, file,
+                                          project.get("requires", {}).get(release)))
+        return matches
+
+    def is_satisfied_by(self, requirement, candidate: _Candidate) -> bool:
+        if candidate.unknown:
+            return True
+        return _provides(candidate.release, requirement.specifier)
+
+    def get_dependencies(self, candidate: _Candidate) -> List[Requirement]:
+        if candidate.provided or candidate.unknown:
+            return []
+        dependencies = []
+        if candidate.extras:
+            dependencies.append(Requirement(f"{candidate.name}=={candidate.release}"))
+        if candidate.requires is None:
+            self.missing.add((candidate.name, candidate.release))
+            return dependencies
+
+        wanted = [""] + sorted(candidate.extras)
+        for line in candidate.requires:
+            try:
+                dependency = Requirement(line)
+            except InvalidRequirement:
+                continue
+            if dependency.marker and not any(
+                    dependency.marker.evaluate(_environment(self.python, extra))
+                    for extra in wanted):
+                continue
+            dependencies.append(dependency)
+        return dependencies
+
+    def explain(self, name: str, constraints: List[Tuple[str, SpecifierSet]]) -> Dict:
+        """Conflict entry for requirements on one project that cannot all be met"""
+        specifier = SpecifierSet()
+        for _, spec in constraints:
+            specifier &= spec
+        if name in self.provided:
+            version = self.provided[name]
+            source, spec = next(((source, spec) for source, spec in constraints
+                                 if not _provides(version, spec)), constraints[0])
+            return {"package": name, "source": source,
+                    "reason": f"{source} requires {name}{spec}, but the conda packages "
+                              f"provide {name} {version}"}
+
+        releases = _releases(self.cache.get(name) or {"releases": {}})
+        matching = [(release, files) for version, release, files in releases
+                    if specifier.contains(version)]
+        described = _describe(constraints)
+        if not matching:
+            reason = f"no release of {name} satisfies {described}"
+        elif any(_installable_file(files, self.python_version, self.supported)
+                 for _, files in matching):
+            # Each release fits on its own; the other requirements rule them out
+            reason = (
+                f"no release of {name} satisfies {described} together with the rest"
+            )
+        else:
+            newest, files = matching[0]
+            requires = sorted({f.get("requires_python") or "" for f in files} - {""})
+            blocker = (f"requires Python {' or '.join(requires)}" if requires
+                       else "has no file for this platform")
+            reason = (f"no release of {name} matching {described} installs on Python "
+                      f"{self.python}; the newest, {newest}, {blocker}")
+        return {"package": name, "source": "", "reason": reason}
+
+
+def resolve_pip(
+    packages: List[str],
+    python: str,
+    provided: Dict[str, Optional[str]],
+    cache: WheelMetadataCache,
+) -> Dict:
+    """Resolve pip requirements against cached metadata, without network access
+
+    provided maps names installed by conda to their versions (None when
+    unknown); requirements on them are checked rather than resolved. The
+    resolution itself is resolvelib's, the backtracking resolver pip uses,
+    with candidates ordered newest first as pip orders them.
+    """
+    provider = _MetadataProvider(python, provided, cache)
+    requirements, conflicts = [], []
+    for package in packages:
+        try:
+            requirement = Requirement(package)
+        except InvalidRequirement as e:
+            conflicts.append({"package": package, "source": "",
+                              "reason": f"invalid requirement: {e}"})
+            continue
+        if requirement.marker is None or requirement.marker.evaluate(
+            _environment(python)
+        ):
+            requirements.append(requirement)
+
+    selected = {}
+    try:
+        result = Resolver(provider, BaseReporter()).resolve(
+            requirements, max_rounds=MAX_RESOLUTION_ROUNDS)
+    except ResolutionImpossible as e:
+        by_name: Dict[str, List[Tuple[str, SpecifierSet]]] = {}
+        for cause in e.causes:
+            by_name.setdefault(canonicalize_name(cause.requirement.name), []).append(
+                (_source(cause.parent), cause.requirement.specifier))
+        conflicts += [provider.explain(name, constraints)
+                      for name, constraints in by_name.items()]
+    except ResolutionTooDeep:
+        conflicts.append(
+            {
+                "package": "pip",
+                "source": "",
+                "reason": f"no resolution within {MAX_RESOLUTION_ROUNDS} rounds",
+            }
+        )
+    else:
+        for candidate in result.mapping.values():
+            if candidate.extras or candidate.provided or candidate.unknown:
+                continue
+            selected[candidate.name] = {
+                "version": candidate.release,
+                "size": candidate.file.get("size") or 0,
+                "sdist": candidate.file["sdist"],
+                "filename": candidate.file["filename"],
+            }
+    return {"selected": selected, "conflicts": conflicts,
+            "missing": sorted(provider.missing, key=lambda m: (m[0], m[1] or ""))}
+
+
+def refresh_pip_metadata(
+    packages: List[str],
+    python: str,
+    provided: Dict[str, Optional[str]],
+    cache: Optional[WheelMetadataCache] = None,
+    workers: int = 16,
+) -> Dict:
+    """Fetch the metadata the offline resolution is missing, until none is"""
+    cache = cache or WheelMetadataCache()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(_MAX_ROUNDS):
+            result = resolve_pip(packages, python, provided, cache)
+            if not result["missing"]:
+                break
+            versions: Dict[str, List[Optional[str]]] = {}
+            for name, version in result["missing"]:
+                versions.setdefault(name, []).append(version)
+            # One task per project, since each project is a single cache file
+            fetches = [pool.submit(cache.fetch, name, wanted)
+                       for name, wanted in versions.items()]
+            for future in fetches:
+                try:
+                    future.result()
+                except requests.RequestException:
+                    pass
+    return resolve_pip(packages, python, provided, cache)
+
+
+def solve_conda_offline(conda: str, specs: List[str], channels: List[str]) -> Dict:
+    """Dry-run solve against local file:// channels only
+
+    --offline is not used: conda then refuses to read even local channels
+    that are not in its own repodata cache. Overriding the channels keeps
+    the solve off the network all the same.
+    """
+    cmd = [conda, "create", "--dry-run", "--json", "-n", "__geodistro_plan__",
+           "--override-channels"]
+    for channel in channels:
+        cmd += ["-c", channel]
+    env = dict(os.environ, CONDA_NOTIFY_OUTDATED_CONDA="false")
+    result = subprocess.run(cmd + list(specs), capture_output=True, text=True, env=env)
+    try:
+        report = json.loads(result.stdout or "{}")
+    except ValueError:
+        report = {}
+    if result.returncode != 0 or not report.get("success"):
+        message = report.get("message") or result.stderr.strip() or "solver failed"
+        return {"ok": False, "packages": {}, "download_bytes": 0,
+                "conflicts": [{"package": "conda", "reason": message.strip()}]}
+
+    actions = report.get("actions", {})
+    return {
+        "ok": True,
+        "packages": {link["name"]: link["version"] for link in actions.get("LINK", [])},
+        "download_bytes": sum(
+            entry.get("size") or 0 for entry in actions.get("FETCH", [])
+        ),
+        "conflicts": [],
+    }
+
+
+def estimate_seconds(conda_packages: int, download_bytes: int, pip_selected: Dict,
+                     bandwidth: float = DEFAULT_BANDWIDTH) -> float:
+    """Rough install time: downloads plus a fixed cost per package and source build"""
+    seconds = download_bytes / bandwidth
+    seconds += conda_packages * CONDA_LINK_SECONDS
+    seconds += len(pip_selected) * PIP_INSTALL_SECONDS
+    seconds += sum(
+        SDIST_BUILD_SECONDS for info in pip_selected.values() if info["sdist"]
+    )
+    return round(seconds, 1)
+
+
+def _requirement_name(spec: str) -> str:
+    return canonicalize_name(re.split(r"[\s\[<>=!~;]", spec.strip(), 1)[0])
+
+
+def build_plan(
+    conda: str,
+    python: str,
+    conda_specs: List[str],
+    pip_packages: List[str],
+    channels: Optional[List[str]],
+    cache: Optional[WheelMetadataCache] = None,
+    bandwidth: float = DEFAULT_BANDWIDTH,
+    fetch_missing: bool = False,
+) -> Dict:
+    """Analyse a whole install from cached metadata
+
+    channels are local (mirrored) channels for the offline conda solve, or
+    None when no conda metadata is cached and that part has to be skipped.
+    With fetch_missing, PyPI metadata absent from the cache is downloaded
+    first; nothing else touches the network.
+    """
+    cache = cache or WheelMetadataCache()
+    specs = [f"python={python}"] + list(conda_specs)
+    if channels:
+        conda_result = solve_conda_offline(conda, specs, channels)
+    else:
+        conda_result = {
+            "ok": None,
+            "packages": {},
+            "download_bytes": 0,
+            "conflicts": [],
+        }
+
+    provided = dict(conda_result["packages"])
+    if not provided:
+        # Without a conda solve, assume the requested packages at unknown versions
+        provided = {spec_name(spec): None for spec in specs}
+    # Packages also requested from pip but installed by conda are left to conda
+    pip_packages = [p for p in pip_packages if _requirement_name(p) not in provided]
+    if fetch_missing:
+        pip_result = refresh_pip_metadata(pip_packages, python, provided, cache)
+    else:
+        pip_result = resolve_pip(pip_packages, python, provided, cache)
+
+    download_bytes = conda_result["download_bytes"] + sum(
+        info["size"] for info in pip_result["selected"].values()
+    )
+    return {
+        "python": python,
+        "conda": conda_result,
+        "pip": pip_result,
+        "conflicts": conda_result["conflicts"] + pip_result["conflicts"],
+        "download_bytes": download_bytes,
+        "estimated_seconds": estimate_seconds(
+            len(conda_result["packages"]),
+            download_bytes,
+            pip_result["selected"],
+            bandwidth,
+        ),
+    }
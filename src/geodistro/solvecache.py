@@ -0,0 +1,186 @@
+"""
+Solver result cache for Geo Distribution
+
+The conda/mamba solve for the geo stack is recomputed for every environment
+built from the same configuration. Here the solved package list is stored as
+an @EXPLICIT spec, keyed by a hash of the requested specs, the platform and a
+snapshot of every channel's repodata (content hash for local channels, ETag or
+Last-Modified for remote ones). Identical requests skip the solver; any change
+to a channel's repodata changes the key, so stale entries are never used.
+"""
+
+import hashlib
+import json
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+import requests
+
+from geodistro.core import GeoDistroConfig
+
+CHANNEL_ALIAS = "https://conda.anaconda.org"
+
+# What "defaults" expands to on the Anaconda repository
+DEFAULT_CHANNELS = [
+    "https://repo.anaconda.com/pkgs/main",
+    "https://repo.anaconda.com/pkgs/r",
+]
+
+
+def channel_urls(channels: List[str]) -> List[str]:
+    """Expand channel names to base URLs"""
+    urls = []
+    for channel in channels:
+        if channel == "defaults":
+            urls.extend(DEFAULT_CHANNELS)
+        elif "://" in channel:
+            urls.append(channel.rstrip("/"))
+        elif Path(channel).is_absolute():
+            urls.append(Path(channel).as_uri())
+        else:
+            urls.append(f"{CHANNEL_ALIAS}/{channel}")
+    return urls
+
+
+def _repodata_token(url: str, timeout: float = 10.0) -> Optional[str]:
+    """Identify the current state of one repodata.json"""
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        path = Path(unquote(parsed.path))
+        if not path.exists():
+            return "missing"
+        return "sha256:" + hashlib.sha256(path.read_bytes()).hexdigest()
+
+    try:
+        response = requests.head(url, timeout=timeout, allow_redirects=True)
+    except requests.RequestException:
+        return None
+    if response.status_code == 404:
+        return "missing"
+    if not response.ok:
+        return None
+    etag = response.headers.get("ETag")
+    modified = response.headers.get("Last-Modified")
+    if etag:
+        return f"etag:{etag}"
+    if modified:
+        return f"modified:{modified}"
+    return None
+
+
+def channel_snapshot(channels: List[str], platform: str) -> Optional[Dict[str, str]]:
+    """Snapshot the repodata of every channel for a platform and noarch
+
+    Returns None when a channel cannot be identified, so callers solve without
+    the cache instead of trusting an unverifiable entry.
+    """
+    snapshot = {}
+    for base in channel_urls(channels):
+        for subdir in (platform, "noarch"):
+            url = f"{base}/{subdir}/repodata.json"
+            token = _repodata_token(url)
+            if token is None:
+                return None
+            snapshot[url] = token
+    return snapshot
+
+
+def solve_key(specs: List[str], channels: List[str], platform: str,
+              snapshot: Dict[str, str]) -> str:
+    """Hash everything that determines a solve result"""
+    payload = json.dumps({
+        "specs": sorted(specs),
+        "channels": channels,
+        "platform": platform,
+        "snapshot": snapshot,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SolveCache:
+    """On-disk store of explicit package lists, keyed by solve_key"""
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = Path(cache_dir or GeoDistroConfig.get_cache_dir("solves"))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.txt"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Get the explicit spec file for a key, if cached"""
+        path = self.path(key)
+        return path if path.exists() else None
+
+    def put(self, key: str, urls: List[str], meta: Dict) -> Path:
+        """Store an explicit package list"""
+        path = self.path(key)
+        header = [
+            f"# {name}: {json.dumps(value)}" for name, value in sorted(meta.items())
+        ]
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text("\n".join(header + ["@EXPLICIT"] + urls) + "\n")
+        tmp.replace(path)
+        return path
+
+    def prune(self, max_age_days: float = 30) -> int:
+        """Remove entries older than max_age_days"""
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        for path in self.cache_dir.glob("*.txt"):
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        return removed
+
+
+def _cached_package_record(pkgs_dirs: List[str], dist_name: str) -> Optional[Dict]:
+    """Find the repodata record of a package already in the package cache"""
+    for pkgs_dir in pkgs_dirs:
+        record = Path(pkgs_dir) / dist_name / "info" / "repodata_record.json"
+        if record.exists():
+            return json.loads(record.read_text())
+    return None
+
+
+def solve_explicit(
+    conda: str, specs: List[str], channels: List[str]
+) -> Optional[List[str]]:
+    """Run the solver once and return the result as explicit url#md5 lines
+
+    Returns None if a package URL cannot be determined.
+    """
+    cmd = [conda, "create", "--dry-run", "--json", "-n", "__geodistro_solve__",
+           "--override-channels"]
+    for channel in channels:
+        cmd += ["-c", channel]
+    result = subprocess.run(cmd + list(specs), capture_output=True, text=True)
+    plan = json.loads(result.stdout or "{}")
+    if result.returncode != 0 or not plan.get("success"):
+        raise subprocess.CalledProcessError(
+            result.returncode, cmd, result.stdout, result.stderr
+        )
+
+    actions = plan.get("actions", {})
+    fetched = {entry["fn"].rsplit(".tar.bz2", 1)[0].rsplit(".conda", 1)[0]: entry
+               for entry in actions.get("FETCH", [])}
+    pkgs_dirs = None
+    urls = []
+    for link in actions.get("LINK", []):
+        record = fetched.get(link["dist_name"])
+        if record is None:
+            if pkgs_dirs is None:
+                info = subprocess.run([conda, "info", "--json"],
+                                      capture_output=True, text=True, check=True)
+                pkgs_dirs = json.loads(info.stdout).get("pkgs_dirs", [])
+            record = _cached_package_record(pkgs_dirs, link["dist_name"])
+        if not record or not record.get("url"):
+            return None
+        url = record["url"]
+        if record.get("md5"):
+            url += f"#{record['md5']}"
+        urls.append(url)
+    return urls
@@ -0,0 +1,434 @@
+"""
+Streaming trajectory processing for large GPS feeds
+
+Points are read from CSV or Parquet in chunks and routed to a small state
+machine per vehicle that detects stops, splits on observation gaps and
+generalizes (drops points closer than a minimum distance) as points arrive.
+Segments and stops are written as soon as they close, and vehicles that stop
+reporting are flushed and evicted, so memory is bounded by the number of
+active vehicles and the per-segment point limit, not by the file size.
+
+Points of one vehicle must arrive in time order; out-of-order and
+duplicate timestamps are dropped and counted. Written segments load back as
+movingpandas Trajectory objects with read_trajectories().
+"""
+
+import math
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PathLike = Union[str, Path]
+
+EARTH_RADIUS_M = 6_371_008.8
+
+# Points buffered per open segment before it is written out and continued
+DEFAULT_MAX_POINTS = 10_000
+
+NS = 1_000_000_000
+
+SEGMENT_SCHEMA = pa.schema([
+    ("vehicle", pa.string()),
+    ("segment", pa.int32()),
+    ("t", pa.timestamp("ns")),
+    ("x", pa.float64()),
+    ("y", pa.float64()),
+])
+
+STOP_SCHEMA = pa.schema([
+    ("vehicle", pa.string()),
+    ("start", pa.timestamp("ns")),
+    ("end", pa.timestamp("ns")),
+    ("x", pa.float64()),
+    ("y", pa.float64()),
+])
+
+
+def haversine(x1: float, y1: float, x2: float, y2: float) -> float:
+    """Great-circle distance in meters between two lon/lat points"""
+    phi1, phi2 = math.radians(y1), math.radians(y2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(x2 - x1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def euclidean(x1: float, y1: float, x2: float, y2: float) -> float:
+    """Planar distance in CRS units"""
+    return math.hypot(x2 - x1, y2 - y1)
+
+
+@dataclass
+class Segment:
+    """Moving part of a vehicle's track between stops, gaps or splits"""
+    vehicle: str
+    segment: int
+    t: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+
+    def __len__(self):
+        return len(self.t)
+
+    def to_geodataframe(self, crs: str = "EPSG:4326"):
+        """Points as a GeoDataFrame indexed by timestamp"""
+        import geopandas
+        import pandas as pd
+
+        return geopandas.GeoDataFrame(
+            {"vehicle": self.vehicle, "segment": self.segment},
+            geometry=geopandas.points_from_xy(self.x, self.y),
+            index=pd.DatetimeIndex(self.t, name="t"), crs=crs,
+        )
+
+    def to_movingpandas(self, crs: str = "EPSG:4326"):
+        """movingpandas Trajectory with id '<vehicle>_<segment>'"""
+        import movingpandas
+
+        return movingpandas.Trajectory(self.to_geodataframe(crs),
+                                       f"{self.vehicle}_{self.segment}")
+
+
+@dataclass
+class Stop:
+    """Period a vehicle stayed within the stop diameter"""
+    vehicle: str
+    start: int
+    end: int
+    x: float
+    y: float
+
+    @property
+    def duration(self) -> float:
+        return (self.end - self.start) / NS
+
+
+class _Vehicle:
+    """Per-vehicle state: the open segment and the current stop candidate"""
+
+    __slots__ = ("t", "x", "y", "segment", "last", "stopped",
+                 "win_t0", "win_start", "minx", "miny", "maxx", "maxy")
+
+    def __init__(self, segment: int = 0):
+        self.t: List[int] = []
+        self.x: List[float] = []
+        self.y: List[float] = []
+        self.segment = segment
+        self.last = None
+        self.stopped = False
+
+    def reset_window(self, t: int, x: float, y: float):
+        # The window starts at the last buffered point
+        self.win_t0 = t
+        self.win_start = len(self.t) - 1
+        self.minx = self.maxx = x
+        self.miny = self.maxy = y
+
+
+class TrajectoryProcessor:
+    """Incremental stop detection, gap splitting and generalization
+
+    A stop is a stretch of at least min_stop_duration seconds whose points
+    fit in a bounding box with a diagonal of at most stop_diameter. The
+    segment before it is closed when the stop is confirmed and the stop is
+    emitted when the vehicle leaves. A gap longer than max_gap seconds
+    closes the segment. Points closer than min_distance to the last kept
+    point are dropped. Distances are meters for lon/lat input
+    (geographic=True) and CRS units otherwise.
+    """
+
+    def __init__(
+        self,
+        stop_diameter: float = 50.0,
+        min_stop_duration: float = 120.0,
+        max_gap: float = 600.0,
+        min_distance: float = 0.0,
+        max_points: int = DEFAULT_MAX_POINTS,
+        idle_timeout: Optional[float] = None,
+        geographic: bool = True,
+    ):
+        self.stop_diameter = stop_diameter
+        self.min_stop_duration = int(min_stop_duration * NS)
+        self.max_gap = int(max_gap * NS)
+        self.min_distance = min_distance
+        self.max_points = max(2, max_points)
+        # Vehicles silent for longer than this (stream time) are flushed and evicted
+        self.idle_timeout = int(
+            (idle_timeout if idle_timeout is not None else max_gap) * NS
+        )
+        self.distance = haversine if geographic else euclidean
+        self.vehicles: Dict[str, _Vehicle] = {}
+        # Next segment number of evicted vehicles, so one that reappears does
+        # not reuse ids (and merge unrelated segments in read_trajectories)
+        self.next_segment: Dict[str, int] = {}
+        self.stream_time: Optional[int] = None
+        self.stats = {
+            "points": 0,
+            "dropped": 0,
+            "segments": 0,
+            "stops": 0,
+            "peak_active": 0,
+        }
+
+    @property
+    def active(self) -> int:
+        return len(self.vehicles)
+
+    def _segment(self, vehicle_id: str, state: _Vehicle, end: Optional[int] = None):
+        """Close the open segment (up to index end) and start counting the next"""
+        end = len(state.t) if end is None else end
+        segment = None
+        if end >= 2:
+            segment = Segment(vehicle_id, state.segment,
+                              np.array(state.t[:end], dtype="datetime64[ns]"),
+                              np.array(state.x[:end]), np.array(state.y[:end]))
+            state.segment += 1
+            self.stats["segments"] += 1
+        del state.t[:], state.x[:], state.y[:]
+        return segment
+
+    def _stop(self, vehicle_id: str, state: _Vehicle) -> Stop:
+        self.stats["stops"] += 1
+        state.stopped = False
+        return Stop(vehicle_id, state.win_t0, state.last[0],
+                    (state.minx + state.maxx) / 2, (state.miny + state.maxy) / 2)
+
+    def _close(
+        self, vehicle_id: str, state: _Vehicle
+    ) -> Iterator[Union[Segment, Stop]]:
+        if state.stopped:
+            yield self._stop(vehicle_id, state)
+        segment = self._segment(vehicle_id, state)
+        if segment is not None:
+            yield segment
+
+    def _append(self, state: _Vehicle, t: int, x: float, y: float):
+        state.t.append(t)
+        state.x.append(x)
+        state.y.append(y)
+
+    def add(
+        self, vehicle_id: str, t: int, x: float, y: float
+    ) -> Iterator[Union[Segment, Stop]]:
+        """Feed one point (t in epoch nanoseconds); yields whatever it closes"""
+        state = self.vehicles.get(vehicle_id)
+        if state is None:
+            state = self.vehicles[vehicle_id] = _Vehicle(
+                self.next_segment.pop(vehicle_id, 0)
+            )
+            self.stats["peak_active"] = max(
+                self.stats["peak_active"], len(self.vehicles)
+            )
+        self.stats["points"] += 1
+        if self.stream_time is None or t > self.stream_time:
+            self.stream_time = t
+
+        last = state.last
+        if last is not None and t <= last[0]:
+            self.stats["dropped"] += 1
+            return
+        if last is None or t - last[0] > self.max_gap:
+            if last is not None:
+                yield from self._close(vehicle_id, state)
+            self._append(state, t, x, y)
+            state.reset_window(t, x, y)
+            state.last = (t, x, y)
+            return
+
+        minx, maxx = min(state.minx, x), max(state.maxx, x)
+        miny, maxy = min(state.miny, y), max(state.maxy, y)
+        if self.distance(minx, miny, maxx, maxy) > self.stop_diameter:
+            if state.stopped:
+                yield self._stop(vehicle_id, state)
+                # The next segment leaves from where the vehicle stood
+                self._append(state, *last)
+            if self.distance(state.x[-1], state.y[-1], x, y) >= self.min_distance:
+                self._append(state, t, x, y)
+            state.reset_window(t, x, y)
+        else:
+            state.minx, state.maxx, state.miny, state.maxy = minx, maxx, miny, maxy
+            if not state.stopped:
+                if t - state.win_t0 >= self.min_stop_duration:
+                    state.stopped = True
+                    segment = self._segment(vehicle_id, state, state.win_start + 1)
+                    if segment is not None:
+                        yield segment
+                elif self.distance(state.x[-1], state.y[-1], x, y) >= self.min_distance:
+                    self._append(state, t, x, y)
+        state.last = (t, x, y)
+
+        if len(state.t) >= self.max_points:
+            # Write the full buffer and continue from its last point
+            t_, x_, y_ = state.t[-1], state.x[-1], state.y[-1]
+            yield self._segment(vehicle_id, state)
+            self._append(state, t_, x_, y_)
+            state.reset_window(t_, x_, y_)
+
+    def feed(self, vehicles, t, x, y) -> Iterator[Union[Segment, Stop]]:
+        """Feed a chunk of points as parallel arrays, then evict idle vehicles"""
+        t = np.asarray(t)
+        if np.issubdtype(t.dtype, np.datetime64):
+            t = t.astype("datetime64[ns]").view(np.int64)
+        vehicles = np.asarray(vehicles).astype(str)
+        for v, t_, x_, y_ in zip(
+            vehicles.tolist(),
+            t.tolist(),
+            np.asarray(x, dtype=float).tolist(),
+            np.asarray(y, dtype=float).tolist(),
+        ):
+            yield from self.add(v, t_, x_, y_)
+        yield from self.evict_idle()
+
+    def evict_idle(self) -> Iterator[Union[Segment, Stop]]:
+        """Close and forget vehicles silent for longer than idle_timeout"""
+        if self.stream_time is None:
+            return
+        horizon = self.stream_time - self.idle_timeout
+        for vehicle_id in [v for v, s in self.vehicles.items() if s.last[0] < horizon]:
+            state = self.vehicles.pop(vehicle_id)
+            yield from self._close(vehicle_id, state)
+            self.next_segment[vehicle_id] = state.segment
+
+    def flush(self) -> Iterator[Union[Segment, Stop]]:
+        """Close every open segment and stop at the end of the stream"""
+        for vehicle_id in list(self.vehicles):
+            yield from self._close(vehicle_id, self.vehicles.pop(vehicle_id))
+
+
+def read_points(path: PathLike, columns: List[str],
+                chunk_size: int = 1_000_000) -> Iterator[Dict[str, np.ndarray]]:
+    """Read selected columns of a CSV or Parquet file in chunks"""
+    path = Path(path)
+    if path.suffix.lower() in (".parquet", ".pq", ".geoparquet"):
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield {
+                name: batch.column(name).to_numpy(zero_copy_only=False)
+                for name in columns
+            }
+        return
+
+    import pandas as pd
+
+    for frame in pd.read_csv(path, usecols=columns, chunksize=chunk_size):
+        yield {name: frame[name].to_numpy() for name in columns}
+
+
+def _timestamps(values: np.ndarray) -> np.ndarray:
+    """Epoch nanoseconds from datetime64 values, ISO strings or epoch seconds"""
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").view(np.int64)
+    if np.issubdtype(values.dtype, np.number):
+        return (values.astype(np.float64) * NS).astype(np.int64)
+    import pandas as pd
+
+    stamps = pd.to_datetime(values, utc=True).tz_localize(None).to_numpy()
+    return stamps.astype("datetime64[ns]").view(np.int64)
+
+
+class _Writer:
+    """Parquet writer that batches rows into row groups"""
+
+    def __init__(self, path: Path, schema: pa.Schema, rows_per_group: int = 500_000):
+        self.path = path
+        self.schema = schema
+        self.rows_per_group = rows_per_group
+        self.columns: Dict[str, list] = {name: [] for name in schema.names}
+        self.rows = 0
+        self.tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        self.writer = pq.ParquetWriter(self.tmp_path, schema)
+
+    def add(self, **columns):
+        for name, values in columns.items():
+            self.columns[name].append(values)
+        self.rows += len(columns[self.schema.names[-1]])
+        if self.rows >= self.rows_per_group:
+            self.write()
+
+    def write(self):
+        if not self.rows:
+            return
+        arrays = [pa.array(np.concatenate(self.columns[field.name]), type=field.type)
+                  for field in self.schema]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.columns = {name: [] for name in self.schema.names}
+        self.rows = 0
+
+    def close(self, commit: bool = True):
+        if commit:
+            self.write()
+        self.writer.close()
+        if commit:
+            os.replace(self.tmp_path, self.path)
+        elif self.tmp_path.exists():
+            self.tmp_path.unlink()
+
+
+def process_file(source: PathLike, output_dir: PathLike, vehicle: str = "vehicle_id",
+                 time_column: str = "timestamp", x: str = "lon", y: str = "lat",
+                 chunk_size: int = 1_000_000, **options) -> Dict:
+    """Stream a GPS file into segments.parquet and stops.parquet in output_dir
+
+    options are passed to TrajectoryProcessor. Returns the processor stats
+    with the elapsed seconds.
+    """
+    start = time.perf_counter()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    processor = TrajectoryProcessor(**options)
+    segments = _Writer(output_dir / "segments.parquet", SEGMENT_SCHEMA)
+    stops = _Writer(output_dir / "stops.parquet", STOP_SCHEMA)
+
+    def write(items):
+        for item in items:
+            if isinstance(item, Segment):
+                segments.add(vehicle=np.full(len(item), item.vehicle, dtype=object),
+                             segment=np.full(len(item), item.segment, dtype=np.int32),
+                             t=item.t, x=item.x, y=item.y)
+            else:
+                stops.add(vehicle=np.array([item.vehicle], dtype=object),
+                          start=np.array([item.start], dtype="datetime64[ns]"),
+                          end=np.array([item.end], dtype="datetime64[ns]"),
+                          x=np.array([item.x]), y=np.array([item.y]))
+
+    committed = False
+    try:
+        for chunk in read_points(source, [vehicle, time_column, x, y], chunk_size):
+            write(processor.feed(chunk[vehicle], _timestamps(chunk[time_column]),
+                                 chunk[x], chunk[y]))
+        write(processor.flush())
+        committed = True
+    finally:
+        segments.close(committed)
+        stops.close(committed)
+    return dict(processor.stats, seconds=round(time.perf_counter() - start, 3))
+
+
+def read_trajectories(path: PathLike, vehicles: Optional[List[str]] = None,
+                      crs: str = "EPSG:4326"):
+    """Load written segments as a movingpandas TrajectoryCollection
+
+    Only the requested vehicles are read when given.
+    """
+    import geopandas
+    import movingpandas
+
+    path = Path(path)
+    if path.is_dir():
+        path = path / "segments.parquet"
+    filters = [("vehicle", "in", list(vehicles))] if vehicles else None
+    frame = pq.read_table(path, filters=filters).to_pandas()
+    frame["traj_id"] = frame["vehicle"] + "_" + frame["segment"].astype(str)
+    gdf = geopandas.GeoDataFrame(
+        frame, geometry=geopandas.points_from_xy(frame["x"], frame["y"]), crs=crs
+    ).set_index("t")
+    return movingpandas.TrajectoryCollection(gdf, "traj_id")
@@ -0,0 +1,251 @@
+"""
+GDAL/PROJ performance tuning profiles for Geo Distribution
+
+A profile is a set of GDAL/PROJ configuration variables sized from the host's
+cores and RAM. It is written into the environment as activate.d/deactivate.d
+scripts, so every activation (and every launcher snapshot) picks it up.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROFILES = ["interactive", "batch", "low-memory", "cloud"]
+
+SCRIPT_NAME = "geodistro-tuning"
+
+# Prefix for variables saved by the activate script and restored on deactivate
+_SAVED_PREFIX = "_GEODISTRO_SAVED_"
+
+
+def host_resources() -> Dict[str, int]:
+    """Detect the number of CPU cores and total RAM in MB"""
+    cores = os.cpu_count() or 1
+    try:
+        import psutil
+        ram_mb = psutil.virtual_memory().total // (1024 * 1024)
+    except ImportError:
+        try:
+            ram_mb = (
+                os.sysconf("SC_PAGE_SIZE")
+                * os.sysconf("SC_PHYS_PAGES")
+                // (1024 * 1024)
+            )
+        except (AttributeError, ValueError, OSError):
+            ram_mb = 4096
+    return {"cores": cores, "ram_mb": int(ram_mb)}
+
+
+def build_profile(name: str, cores: Optional[int] = None,
+                  ram_mb: Optional[int] = None) -> Dict[str, str]:
+    """Build the configuration variables of a named profile for a host"""
+    if name not in PROFILES:
+        raise ValueError(
+            f"Unknown profile '{name}', choose from: {', '.join(PROFILES)}"
+        )
+    host = host_resources()
+    cores = cores or host["cores"]
+    ram_mb = ram_mb or host["ram_mb"]
+
+    # Settings that help every workload reading local or cloud-optimized data.
+    # Nothing here may change what GDAL can open: CPL_VSIL_CURL_ALLOWED_EXTENSIONS
+    # would stop /vsicurl/ from reading GeoJSON, STAC JSON, zipped shapefiles
+    # and extension-less URLs, and GDAL_DISABLE_READDIR_ON_OPEN (cloud profile
+    # only) hides sidecar files.
+    config = {
+        "GDAL_HTTP_MULTIPLEX": "YES",
+        "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+        "GDAL_HTTP_VERSION": "2",
+        "PROJ_NETWORK": "ON",
+    }
+
+    if name == "interactive":
+        # Leave headroom for the notebook and browser
+        config.update({
+            "GDAL_CACHEMAX": str(max(64, min(ram_mb // 10, 4096))),
+            "GDAL_NUM_THREADS": str(max(1, cores // 2)),
+            "VSI_CACHE": "TRUE",
+            "VSI_CACHE_SIZE": str(64 * 1024 * 1024),
+            "GDAL_INGESTED_BYTES_AT_OPEN": str(32 * 1024),
+        })
+    elif name in ("batch", "cloud"):
+        config.update({
+            "GDAL_CACHEMAX": str(max(128, min(ram_mb // 4, 16384))),
+            "GDAL_NUM_THREADS": "ALL_CPUS",
+            "VSI_CACHE": "TRUE",
+            "VSI_CACHE_SIZE": str(256 * 1024 * 1024),
+            "GDAL_INGESTED_BYTES_AT_OPEN": str(64 * 1024),
+            "GDAL_HTTP_MAX_RETRY": "5",
+            "GDAL_HTTP_RETRY_DELAY": "1",
+        })
+        if name == "cloud":
+            # Skips the directory listing GDAL does on open to find sidecars,
+            # one request per open over HTTP. Local .ovr overviews, .aux.xml
+            # and .tfw/.wld world files are then ignored too, so this profile
+            # is for hosts that read (cloud-optimized) data over the network
+            config["GDAL_DISABLE_READDIR_ON_OPEN"] = "EMPTY_DIR"
+    else:
+        config.update({
+            "GDAL_CACHEMAX": str(max(32, min(ram_mb // 40, 256))),
+            "GDAL_NUM_THREADS": str(min(2, cores)),
+            "VSI_CACHE": "FALSE",
+            "GDAL_INGESTED_BYTES_AT_OPEN": str(16 * 1024),
+        })
+    return config
+
+
+def _render_posix(config: Dict[str, str], profile: str):
+    """Render activate/deactivate scripts for POSIX shells"""
+    activate = [f"# Generated by geo-distro: '{profile}' performance profile"]
+    deactivate = [f"# Generated by geo-distro: undo '{profile}' performance profile"]
+    for name, value in sorted(config.items()):
+        saved = f"{_SAVED_PREFIX}{name}"
+        activate += [
+            f'if [ -n "${{{name}+x}}" ]; then export {saved}="${{{name}}}"; fi',
+            f"export {name}='{value}'",
+        ]
+        deactivate += [
+            f'if [ -n "${{{saved}+x}}" ]; then export {name}="${{{saved}}}"; '
+            f"unset {saved}; else unset {name}; fi",
+        ]
+    activate.append(f"export GEODISTRO_TUNING_PROFILE='{profile}'")
+    deactivate.append("unset GEODISTRO_TUNING_PROFILE")
+    return "\n".join(activate) + "\n", "\n".join(deactivate) + "\n"
+
+
+def _render_windows(config: Dict[str, str], profile: str):
+    """Render activate/deactivate scripts for cmd.exe"""
+    activate = [f"@rem Generated by geo-distro: '{profile}' performance profile"]
+    deactivate = [f"@rem Generated by geo-distro: undo '{profile}' performance profile"]
+    for name, value in sorted(config.items()):
+        saved = f"{_SAVED_PREFIX}{name}"
+        activate += [
+            f'if defined {name} set "{saved}=%{name}%"',
+            f'set "{name}={value}"',
+        ]
+        deactivate += [
+            f'if defined {saved} (set "{name}=%{saved}%" & set "{saved}=") '
+            f'else (set "{name}=")',
+        ]
+    activate.append(f'set "GEODISTRO_TUNING_PROFILE={profile}"')
+    deactivate.append('set "GEODISTRO_TUNING_PROFILE="')
+    return "\r\n".join(activate) + "\r\n", "\r\n".join(deactivate) + "\r\n"
+
+
+def write_profile(prefix: Path, profile: str,
+                  config: Optional[Dict[str, str]] = None) -> List[Path]:
+    """Write a profile into an environment's activate.d/deactivate.d"""
+    config = config or build_profile(profile)
+    hooks = Path(prefix) / "etc" / "conda"
+    scripts = {
+        "sh": _render_posix(config, profile),
+        "bat": _render_windows(config, profile),
+    }
+    written = []
+    for suffix, (activate, deactivate) in scripts.items():
+        for hook, content in (("activate.d", activate), ("deactivate.d", deactivate)):
+            path = hooks / hook / f"{SCRIPT_NAME}.{suffix}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+            written.append(path)
+    return written
+
+
+def remove_profile(prefix: Path) -> List[Path]:
+    """Remove a previously written profile from an environment"""
+    removed = []
+    for hook in ("activate.d", "deactivate.d"):
+        for path in (Path(prefix) / "etc" / "conda" / hook).glob(f"{SCRIPT_NAME}.*"):
+            path.unlink()
+            removed.append(path)
+    return removed
+
+
+# Runs inside the target environment, where GDAL reads its config at import
+_BENCHMARK_SCRIPT = r'''
+import json, sys, time
+import numpy as np
+import rasterio
+from rasterio.warp import reproject, Resampling, calculate_default_transform
+
+path, size = sys.argv[1], int(sys.argv[2])
+timings = {}
+with rasterio.open(path) as src:
+    start = time.perf_counter()
+    for _ in range(3):
+        for _, window in src.block_windows(1):
+            src.read(1, window=window)
+    timings["read_blocks"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    transform, width, height = calculate_default_transform(
+        src.crs, "EPSG:3857", src.width, src.height, *src.bounds)
+    destination = np.empty((height, width), dtype=np.float32)
+    reproject(rasterio.band(src, 1), destination, dst_transform=transform,
+              dst_crs="EPSG:3857", resampling=Resampling.bilinear, num_threads=0,
+              warp_mem_limit=0)
+    timings["warp"] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+_CREATE_SCRIPT = r'''
+import sys
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+path, size = sys.argv[1], int(sys.argv[2])
+data = np.random.default_rng(0).random((size, size), dtype=np.float32)
+profile = dict(driver="GTiff", width=size, height=size, count=1, dtype="float32",
+               crs="EPSG:4326", transform=from_origin(-10, 50, 20 / size, 20 / size),
+               tiled=True, blockxsize=256, blockysize=256, compress="deflate")
+with rasterio.open(path, "w", **profile) as dst:
+    dst.write(data, 1)
+'''
+
+
+def benchmark_profiles(
+    python: str,
+    profiles: Optional[List[str]] = None,
+    size: int = 4096,
+) -> Dict[str, Dict[str, float]]:
+    """Time a raster read/warp micro-benchmark under each profile
+
+    Every profile runs in a fresh interpreter because GDAL only reads its
+    configuration variables when it is first loaded.
+    """
+    profiles = profiles or PROFILES
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="geodistro-tune-") as tmp:
+        raster = str(Path(tmp) / "benchmark.tif")
+        subprocess.run([python, "-c", _CREATE_SCRIPT, raster, str(size)],
+                       check=True, capture_output=True)
+        for profile in ["default"] + list(profiles):
+            env = {
+                k: v
+                for k, v in os.environ.items()
+                if not k.startswith(("GDAL_", "VSI_"))
+            }
+            if profile != "default":
+                env.update(build_profile(profile))
+            start = time.perf_counter()
+            result = subprocess.run(
+                [python, "-c", _BENCHMARK_SCRIPT, raster, str(size)],
+                capture_output=True,
+                text=True,
+                env=env,
+                check=True,
+            )
+            timings = json.loads(result.stdout.strip().splitlines()[-1])
+            timings["total"] = time.perf_counter() - start
+            results[profile] = timings
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark_profiles(sys.executable), indent=2))
@@ -1,11 +1,117 @@
 """
 Verification utilities for Geo Distribution
+
+Import checks take seconds, so their result is cached under a fingerprint
+of the environment: conda-meta/history and the RECORD file of every
+installed distribution. While nothing is installed, removed or upgraded,
+verification returns the stored result after a few stat calls.
+
+The deep mode runs small functional probes (a GDAL driver round-trip, a
+PROJ transform, a GeoTIFF write, ...) in parallel, each in its own
+interpreter with a timeout, since an importable library can still be
+missing its drivers or data files.
 """
 
+import hashlib
 import importlib
+import json
+import os
 import subprocess
 import sys
-from typing import Dict, Tuple
+import sysconfig
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from geodistro.core import GeoDistroConfig
+
+LIBRARIES_TO_CHECK = [
+    ("geopandas", "__version__"),
+    ("rasterio", "__version__"),
+    ("fiona", "__version__"),
+    ("shapely", "__version__"),
+    ("pyproj", "__version__"),
+    ("folium", "__version__"),
+    ("googlemaps", "__version__"),
+    ("geopy", "__version__"),
+    ("cartopy", "__version__"),
+    ("osmnx", "__version__"),
+    ("contextily", "__version__"),
+    ("ipyleaflet", "__version__"),
+    ("pysal", "__version__"),
+    ("sklearn", "__version__"),
+    ("jupyter", "__version__"),
+]
+
+# Functional probe name -> code run in a fresh interpreter; raising fails the probe
+PROBES = {
+    "gdal-drivers": r"""
+from osgeo import gdal, ogr
+for name in ("GTiff", "COG", "VRT"):
+    assert gdal.GetDriverByName(name), f"GDAL raster driver {name} missing"
+for name in ("GPKG", "ESRI Shapefile", "GeoJSON"):
+    assert ogr.GetDriverByName(name), f"OGR vector driver {name} missing"
+ds = gdal.GetDriverByName("GTiff").Create("/vsimem/probe.tif", 8, 8, 1, gdal.GDT_Byte)
+ds.GetRasterBand(1).Fill(7)
+ds = None
+ds = gdal.Open("/vsimem/probe.tif")
+assert ds.GetRasterBand(1).Checksum() > 0, "GTiff round-trip lost the data"
+ds = None
+gdal.Unlink("/vsimem/probe.tif")
+""",
+    "proj-transform": r"""
+import os
+import pyproj
+assert os.path.exists(os.path.join(pyproj.datadir.get_data_dir(), "proj.db")), "proj.db not found"
+x, y = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True).transform(10, 50)
+assert abs(x - 1113194.9) < 1 and abs(y - 6446275.8) < 1, f"unexpected transform {x}, {y}"
+""",
+    "rasterio-geotiff": r"""
+import os, tempfile
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+data = np.arange(64, dtype="uint16").reshape(8, 8)
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "probe.tif")
+    with rasterio.open(path, "w", driver="GTiff", width=8, height=8, count=1, dtype="uint16",
+                       crs="EPSG:4326", transform=from_origin(0, 8, 1, 1), compress="deflate") as dst:
+        dst.write(data, 1)
+    with rasterio.open(path) as src:
+        assert (src.read(1) == data).all() and src.crs.to_epsg() == 4326, "GeoTIFF round-trip differs"
+""",
+    "geopandas-sjoin": r"""
+import os, tempfile
+import geopandas as gpd
+from shapely.geometry import Point, box
+cells = gpd.GeoDataFrame({"cell": [0, 1]}, geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs="EPSG:4326")
+points = gpd.GeoDataFrame(geometry=[Point(0.5, 0.5), Point(1.5, 0.5), Point(5, 5)], crs="EPSG:4326")
+joined = gpd.sjoin(points, cells, predicate="within")
+assert sorted(joined["cell"]) == [0, 1], "spatial join returned the wrong matches"
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "probe.gpkg")
+    cells.to_file(path, driver="GPKG")
+    assert len(gpd.read_file(path)) == 2, "GeoPackage round-trip lost rows"
+""",
+    "folium-render": r"""
+import os, tempfile
+import folium
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "map.html")
+    m = folium.Map(location=[40.7, -74.0], zoom_start=10)
+    folium.Marker([40.7, -74.0], popup="probe").add_to(m)
+    m.save(path)
+    assert "leaflet" in open(path).read().lower(), "rendered map has no Leaflet code"
+""",
+    "sklearn-fit": r"""
+import numpy as np
+from sklearn.cluster import KMeans
+points = np.vstack([np.random.default_rng(0).normal(c, 0.1, (50, 2)) for c in (0, 5)])
+labels = KMeans(n_clusters=2, n_init=3, random_state=0).fit_predict(points)
+assert len(set(labels[:50])) == 1 and labels[0] != labels[-1], "KMeans did not separate clusters"
+""",
+}
 
 def check_library(lib_name: str, version_attr: str = None) -> Tuple[bool, str]:
     """Check if a library can be imported and get its version"""
@@ -21,42 +127,189 @@ def check_library(lib_name: str, version_attr: str = None) -> Tuple[bool, str]:
     except ImportError as e:
         return False, str(e)
 
-def verify_installation(env_name: str = None) -> bool:
-    """Verify that all key libraries are installed and importable"""
-    libraries_to_check = [
-        ("geopandas", "__version__"),
-        ("rasterio", "__version__"),
-        ("fiona", "__version__"),
-        ("shapely", "__version__"),
-        ("pyproj", "__version__"),
-        ("folium", "__version__"),
-        ("googlemaps", "__version__"),
-        ("geopy", "__version__"),
-        ("cartopy", "__version__"),
-        ("osmnx", "__version__"),
-        ("contextily", "__version__"),
-        ("ipyleaflet", "__version__"),
-        ("pysal", "__version__"),
-        ("sklearn", "__version__"),
-        ("jupyter", "__version__"),
-    ]
-    
+def _stat_token(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+def environment_fingerprint(prefix: Optional[str] = None,
+                            site_dirs: Optional[List[str]] = None) -> str:
+    """Cheap hash of an environment's installed state
+
+    Covers conda's transaction history and, per site-packages entry, the
+    name plus the mtime and size of dist-info RECORD files, so any conda or
+    pip install, upgrade or removal changes it.
+    """
+    prefix = Path(prefix or sys.prefix)
+    if site_dirs is None:
+        paths = sysconfig.get_paths()
+        site_dirs = sorted({paths["purelib"], paths["platlib"]})
+    state = {
+        "python": sys.version,
+        "history": _stat_token(prefix / "conda-meta" / "history"),
+    }
+    for site_dir in site_dirs:
+        entries = {}
+        try:
+            scanned = sorted(os.scandir(site_dir), key=lambda entry: entry.name)
+        except OSError:
+            scanned = []
+        for entry in scanned:
+            # Written by the imports of a verification run itself
+            if entry.name == "__pycache__":
+                continue
+            if entry.name.endswith(".dist-info"):
+                entries[entry.name] = _stat_token(Path(entry.path) / "RECORD")
+            elif entry.name.endswith((".egg-info", ".egg-link", ".pth")):
+                entries[entry.name] = _stat_token(Path(entry.path))
+            else:
+                entries[entry.name] = None
+        state[site_dir] = entries
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+def _cache_file(prefix: str, kind: str = "imports") -> Path:
+    name = hashlib.sha256(str(Path(prefix).resolve()).encode()).hexdigest()[:16]
+    return GeoDistroConfig.get_cache_dir("verify") / f"{name}-{kind}.json"
+
+def load_cached_result(fingerprint: str, prefix: Optional[str] = None,
+                       kind: str = "imports") -> Optional[Dict]:
+    """Last verification result of the environment, if it still has this fingerprint"""
+    path = _cache_file(prefix or sys.prefix, kind)
+    try:
+        cached = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    return cached if cached.get("fingerprint") == fingerprint else None
+
+def save_result(fingerprint: str, results: Dict, ok: bool, prefix: Optional[str] = None,
+                kind: str = "imports"):
+    """Store a verification result under the environment fingerprint"""
+    path = _cache_file(prefix or sys.prefix, kind)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"fingerprint": fingerprint, "ok": ok, "results": results,
+                               "checked": time.time()}))
+    tmp.replace(path)
+
+def verify_installation(env_name: str = None, force: bool = False,
+                        use_cache: bool = True) -> bool:
+    """Verify that all key libraries are installed and importable
+
+    Unless force is set, a result cached for the unchanged environment is
+    reused instead of importing every library again.
+    """
     print("🔍 Verifying Geo Distribution Installation")
     print("=" * 50)
-    
+
+    fingerprint = environment_fingerprint() if use_cache else None
+    cached = load_cached_result(fingerprint) if use_cache and not force else None
+    if cached is not None and list(cached["results"]) != [
+        n for n, _ in LIBRARIES_TO_CHECK
+    ]:
+        cached = None
+    if cached is not None:
+        results = cached["results"]
+        checked = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(cached["checked"]))
+    else:
+        results = {}
+        for lib_name, version_attr in LIBRARIES_TO_CHECK:
+            success, version_info = check_library(lib_name, version_attr)
+            results[lib_name] = [success, str(version_info)]
+
     all_ok = True
-    for lib_name, version_attr in libraries_to_check:
-        success, version_info = check_library(lib_name, version_attr)
+    for lib_name, (success, version_info) in results.items():
         if success:
             print(f"✓ {lib_name:20} {version_info}")
         else:
             print(f"✗ {lib_name:20} {version_info}")
             all_ok = False
-    
+
     print("=" * 50)
+    if cached is not None:
+        print(
+            f"♻ Environment unchanged since the check at {checked} (use --force to re-check)"
+        )
+    elif use_cache:
+        save_result(fingerprint, results, all_ok)
     if all_ok:
         print("🎉 All libraries imported successfully!")
     else:
         print("⚠ Some libraries failed to import.")
-    
-    return all_ok
\ No newline at end of file
+
+    return all_ok
+
+def run_probe(name: str, python: Optional[str] = None, timeout: float = 30) -> Dict:
+    """Run one functional probe in a fresh interpreter"""
+    start = time.perf_counter()
+    try:
+        result = subprocess.run([python or sys.executable, "-c", PROBES[name]],
+                                capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"status": "timeout", "seconds": round(time.perf_counter() - start, 3),
+                "detail": f"no result after {timeout}s"}
+    seconds = round(time.perf_counter() - start, 3)
+    if result.returncode == 0:
+        return {"status": "ok", "seconds": seconds, "detail": ""}
+    lines = result.stderr.strip().splitlines()
+    return {"status": "failed", "seconds": seconds,
+            "detail": lines[-1] if lines else f"exit code {result.returncode}"}
+
+
+def run_probes(
+    names: Optional[List[str]] = None,
+    python: Optional[str] = None,
+    timeout: float = 30,
+    max_workers: Optional[int] = None,
+) -> Dict[str, Dict]:
+    """Run functional probes in parallel, one interpreter each"""
+    names = names or list(PROBES)
+    with ThreadPoolExecutor(
+        max_workers=max_workers or min(len(names), os.cpu_count() or 1)
+    ) as pool:
+        futures = {
+            name: pool.submit(run_probe, name, python, timeout) for name in names
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def verify_deep(
+    force: bool = False, timeout: float = 30, use_cache: bool = True
+) -> bool:
+    """Run the functional probes and report them, reusing results for an unchanged env"""
+    print("🔬 Running functional probes")
+    print("=" * 50)
+
+    fingerprint = environment_fingerprint() if use_cache else None
+    cached = (
+        load_cached_result(fingerprint, kind="deep")
+        if use_cache and not force
+        else None
+    )
+    if cached is not None and sorted(cached["results"]) != sorted(PROBES):
+        cached = None
+    start = time.perf_counter()
+    results = cached["results"] if cached else run_probes(timeout=timeout)
+
+    for name, result in results.items():
+        mark = "✓" if result["status"] == "ok" else "✗"
+        print(
+            f"{mark} {name:20} {result['seconds']:6.2f}s {result['status']:8} {result['detail']}"
+        )
+    all_ok = all(result["status"] == "ok" for result in results.values())
+
+    print("=" * 50)
+    if cached is not None:
+        print(
+            "♻ Environment unchanged since the last deep check (use --force to re-run)"
+        )
+    else:
+        print(f"⏱️ {len(results)} probes in {time.perf_counter() - start:.1f}s")
+        if use_cache:
+            save_result(fingerprint, results, all_ok, kind="deep")
+    if all_ok:
+        print("🎉 All functional probes passed!")
+    else:
+        print("⚠ Some functional probes failed.")
+
+    return all_ok
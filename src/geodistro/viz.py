@@ -0,0 +1,374 @@
+"""
+Multi-resolution point aggregation for web maps
+
+Millions of raw points serialized into a KeplerGl, Plotly or Folium widget
+freeze the notebook and the browser. Points are instead binned once into a
+pyramid of hexagon or square grids in Web Mercator, one level per map zoom
+with cells of a fixed on-screen size. Only the cells of the level matching
+the view are handed to the widget, so the payload depends on the view and
+the cell budget, not on the number of input rows.
+
+The finest level is built from the points in chunks. Each coarser level is
+built from the level below it: squares nest exactly, and hexagons re-bin
+the weighted centers of the finer cells. Pyramids are cached on disk,
+keyed by a hash of the input arrays.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from geodistro.core import GeoDistroConfig
+
+PathLike = Union[str, Path]
+BBox = Tuple[float, float, float, float]
+
+# Web Mercator half-extent and meters per pixel at zoom 0 (256 px tiles)
+MERCATOR_EXTENT = 20037508.342789244
+METERS_PER_PIXEL_Z0 = 2 * MERCATOR_EXTENT / 256
+MAX_LATITUDE = 85.05112878
+
+# Cells handed to a widget at most; about 3 MB of JSON with a few value columns
+DEFAULT_MAX_CELLS = 50_000
+
+# Points binned per pass when building the finest level
+DEFAULT_CHUNK_SIZE = 5_000_000
+
+SQRT3 = np.sqrt(3.0)
+
+_KEY_SHIFT = np.int64(1 << 32)
+_KEY_OFFSET = np.int64(1 << 31)
+
+
+def to_mercator(lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+    """Project lon/lat degrees to Web Mercator meters"""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    x = np.radians(lon) * 6378137.0
+    y = np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) * 6378137.0
+    return x, y
+
+
+def from_mercator(x, y) -> Tuple[np.ndarray, np.ndarray]:
+    """Web Mercator meters back to lon/lat degrees"""
+    lon = np.degrees(np.asarray(x) / 6378137.0)
+    lat = np.degrees(2 * np.arctan(np.exp(np.asarray(y) / 6378137.0)) - np.pi / 2)
+    return lon, lat
+
+
+def cell_size(zoom: int, pixels: float) -> float:
+    """Cell width in Mercator meters for cells pixels wide at a zoom level"""
+    return pixels * METERS_PER_PIXEL_Z0 / 2 ** zoom
+
+
+def _hex_index(
+    x: np.ndarray, y: np.ndarray, size: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Axial (q, r) of the pointy-top hexagons, size wide, containing each point"""
+    radius = size / SQRT3
+    q = (SQRT3 / 3 * x - y / 3) / radius
+    r = (2 / 3 * y) / radius
+    # Cube rounding: round all three coordinates, then fix the one that moved most
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def _hex_center(
+    q: np.ndarray, r: np.ndarray, size: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    radius = size / SQRT3
+    return radius * SQRT3 * (q + r / 2), radius * 1.5 * r
+
+
+def _aggregate(i: np.ndarray, j: np.ndarray, count: np.ndarray,
+               sums: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Sum counts and values of rows sharing a cell index"""
+    keys = i * _KEY_SHIFT + (j + _KEY_OFFSET)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    level = {
+        "i": unique // _KEY_SHIFT,
+        "j": unique % _KEY_SHIFT - _KEY_OFFSET,
+        "count": np.bincount(inverse, weights=count, minlength=len(unique)).astype(
+            np.int64
+        ),
+    }
+    for name, values in sums.items():
+        level[f"sum:{name}"] = np.bincount(
+            inverse, weights=values, minlength=len(unique)
+        )
+    return level
+
+
+def _sums(level: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return {key[4:]: values for key, values in level.items() if key.startswith("sum:")}
+
+
+class BinPyramid:
+    """Point counts and value sums per cell, one grid level per zoom"""
+
+    def __init__(self, levels: Dict[int, Dict[str, np.ndarray]], kind: str = "hex",
+                 pixels: float = 20.0):
+        self.levels = levels
+        self.kind = kind
+        self.pixels = pixels
+
+    @property
+    def zooms(self) -> List[int]:
+        return sorted(self.levels)
+
+    @classmethod
+    def build(
+        cls,
+        lon,
+        lat,
+        values: Optional[Dict[str, np.ndarray]] = None,
+        kind: str = "hex",
+        min_zoom: int = 2,
+        max_zoom: int = 14,
+        pixels: float = 20.0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> "BinPyramid":
+        """Bin points into cells pixels wide for every zoom from min_zoom to max_zoom"""
+        if kind not in ("hex", "square"):
+            raise ValueError(f"Unknown grid kind '{kind}'; use 'hex' or 'square'")
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        values = {
+            name: np.asarray(v, dtype=np.float64) for name, v in (values or {}).items()
+        }
+        pyramid = cls({}, kind, pixels)
+
+        partials = []
+        for start in range(0, len(lon), chunk_size):
+            stop = start + chunk_size
+            x, y = to_mercator(lon[start:stop], lat[start:stop])
+            i, j = pyramid._index(x, y, max_zoom)
+            partials.append(_aggregate(i, j, np.ones(len(i)),
+                                       {n: v[start:stop] for n, v in values.items()}))
+        if partials:
+            merged = {
+                key: np.concatenate([p[key] for p in partials]) for key in partials[0]
+            }
+            level = _aggregate(merged["i"], merged["j"], merged["count"], _sums(merged))
+        else:
+            level = _aggregate(
+                np.empty(0, np.int64),
+                np.empty(0, np.int64),
+                np.empty(0),
+                {n: np.empty(0) for n in values},
+            )
+        pyramid.levels[max_zoom] = level
+
+        for zoom in range(max_zoom - 1, min_zoom - 1, -1):
+            finer = pyramid.levels[zoom + 1]
+            if kind == "square":
+                i, j = finer["i"] // 2, finer["j"] // 2
+            else:
+                i, j = pyramid._index(*pyramid._centers(finer, zoom + 1), zoom)
+            pyramid.levels[zoom] = _aggregate(i, j, finer["count"], _sums(finer))
+        return pyramid
+
+    def _index(
+        self, x: np.ndarray, y: np.ndarray, zoom: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        size = cell_size(zoom, self.pixels)
+        if self.kind == "square":
+            return np.floor(x / size).astype(np.int64), np.floor(y / size).astype(
+                np.int64
+            )
+        return _hex_index(x, y, size)
+
+    def _centers(
+        self, level: Dict[str, np.ndarray], zoom: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        size = cell_size(zoom, self.pixels)
+        if self.kind == "square":
+            return (level["i"] + 0.5) * size, (level["j"] + 0.5) * size
+        return _hex_center(level["i"], level["j"], size)
+
+    def zoom_level(self, zoom: float) -> int:
+        """Pyramid level for a map zoom, clamped to the levels built"""
+        zooms = self.zooms
+        return int(min(max(round(zoom), zooms[0]), zooms[-1]))
+
+    def cells(self, zoom: float, bbox: Optional[BBox] = None,
+              max_cells: int = DEFAULT_MAX_CELLS) -> Tuple[int, Dict[str, np.ndarray]]:
+        """Cells of the level for a zoom, clipped to a lon/lat bbox
+
+        Drops to coarser levels while more than max_cells remain. Returns the
+        level used and columns lon, lat, count and the mean of each value.
+        """
+        level = self.zoom_level(zoom)
+        while True:
+            cells = self._level_cells(level, bbox)
+            if len(cells["count"]) <= max_cells or level == self.zooms[0]:
+                return level, cells
+            level -= 1
+
+    def _level_cells(self, zoom: int, bbox: Optional[BBox]) -> Dict[str, np.ndarray]:
+        level = self.levels[zoom]
+        x, y = self._centers(level, zoom)
+        lon, lat = from_mercator(x, y)
+        keep = slice(None)
+        if bbox is not None:
+            keep = (
+                (lon >= bbox[0])
+                & (lat >= bbox[1])
+                & (lon <= bbox[2])
+                & (lat <= bbox[3])
+            )
+        cells = {
+            "i": level["i"][keep],
+            "j": level["j"][keep],
+            "lon": lon[keep],
+            "lat": lat[keep],
+            "count": level["count"][keep],
+        }
+        for name, sums in _sums(level).items():
+            cells[name] = sums[keep] / np.maximum(cells["count"], 1)
+        return cells
+
+    def polygons(self, zoom: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """Lon/lat outlines of cells, shape (cells, vertices + 1, 2), closed"""
+        size = cell_size(zoom, self.pixels)
+        cx, cy = self._centers({"i": np.asarray(i), "j": np.asarray(j)}, zoom)
+        if self.kind == "square":
+            dx = np.array([-0.5, 0.5, 0.5, -0.5, -0.5]) * size
+            dy = np.array([-0.5, -0.5, 0.5, 0.5, -0.5]) * size
+        else:
+            angles = np.radians(30 + 60 * np.arange(7))
+            dx, dy = size / SQRT3 * np.cos(angles), size / SQRT3 * np.sin(angles)
+        lon, lat = from_mercator(cx[:, None] + dx, cy[:, None] + dy)
+        return np.stack([lon, lat], axis=-1)
+
+    def save(self, path: PathLike) -> Path:
+        """Write every level into one .npz file"""
+        path = Path(path)
+        arrays = {
+            f"{zoom}/{key}": values
+            for zoom, level in self.levels.items()
+            for key, values in level.items()
+        }
+        meta = json.dumps({"kind": self.kind, "pixels": self.pixels})
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, __meta__=np.array(meta), **arrays)
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path: PathLike) -> "BinPyramid":
+        with np.load(path) as data:
+            meta = json.loads(str(data["__meta__"]))
+            levels: Dict[int, Dict[str, np.ndarray]] = {}
+            for name in data.files:
+                if name == "__meta__":
+                    continue
+                zoom, key = name.split("/", 1)
+                levels.setdefault(int(zoom), {})[key] = data[name]
+        return cls(levels, meta["kind"], meta["pixels"])
+
+
+def _arrays_key(arrays: List[np.ndarray], options: Dict) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        digest.update(str(array.shape).encode())
+        digest.update(memoryview(array).cast("B"))
+    return digest.hexdigest()
+
+
+def cached_pyramid(lon, lat, values: Optional[Dict[str, np.ndarray]] = None,
+                   cache_dir: Optional[PathLike] = None, **options) -> BinPyramid:
+    """BinPyramid.build, reusing a cached pyramid of identical input and options"""
+    values = values or {}
+    cache_dir = Path(cache_dir) if cache_dir else GeoDistroConfig.get_cache_dir("viz")
+    key = _arrays_key([lon, lat] + [values[n] for n in sorted(values)],
+                      dict(options, values=sorted(values)))
+    path = cache_dir / f"{key}.npz"
+    if path.exists():
+        return BinPyramid.load(path)
+    pyramid = BinPyramid.build(lon, lat, values, **options)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    pyramid.save(path)
+    return pyramid
+
+
+def to_frame(cells: Dict[str, np.ndarray]):
+    """Cells as a pandas DataFrame without the grid indices"""
+    import pandas as pd
+
+    return pd.DataFrame({k: v for k, v in cells.items() if k not in ("i", "j")})
+
+
+def to_geojson(pyramid: BinPyramid, zoom: int, cells: Dict[str, np.ndarray]) -> Dict:
+    """Cells as a GeoJSON FeatureCollection of polygons"""
+    rings = np.round(pyramid.polygons(zoom, cells["i"], cells["j"]), 6).tolist()
+    columns = [k for k in cells if k not in ("i", "j", "lon", "lat")]
+    rows = zip(*[cells[k].tolist() for k in columns])
+    return {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [ring]},
+         "properties": dict(zip(columns, row))}
+        for ring, row in zip(rings, rows)
+    ]}
+
+
+def to_keplergl(pyramid: BinPyramid, zoom: float, bbox: Optional[BBox] = None,
+                max_cells: int = DEFAULT_MAX_CELLS, name: str = "cells", **kwargs):
+    """KeplerGl widget holding only the cell centers and their aggregates"""
+    from keplergl import KeplerGl
+
+    _, cells = pyramid.cells(zoom, bbox, max_cells)
+    return KeplerGl(data={name: to_frame(cells)}, **kwargs)
+
+
+def to_plotly(pyramid: BinPyramid, zoom: float, bbox: Optional[BBox] = None,
+              max_cells: int = DEFAULT_MAX_CELLS, color: str = "count", **kwargs):
+    """Plotly tile-map scatter of the cells, colored by count or a value mean"""
+    import plotly.express as px
+
+    _, cells = pyramid.cells(zoom, bbox, max_cells)
+    frame = to_frame(cells)
+    # plotly 5.24 renamed the Mapbox traces to MapLibre ones
+    scatter = getattr(px, "scatter_map", None) or px.scatter_mapbox
+    return scatter(frame, lat="lat", lon="lon", color=color, zoom=zoom,
+                   hover_data=list(frame.columns), **kwargs)
+
+
+def to_folium(pyramid: BinPyramid, zoom: float, bbox: Optional[BBox] = None,
+              max_cells: int = 10_000, color: str = "count", folium_map=None):
+    """Folium GeoJson layer of cell polygons, added to folium_map if given"""
+    import branca.colormap
+    import folium
+
+    level, cells = pyramid.cells(zoom, bbox, max_cells)
+    geojson = to_geojson(pyramid, level, cells)
+    values = cells[color]
+    colormap = branca.colormap.linear.YlOrRd_09.scale(
+        float(values.min()) if len(values) else 0,
+        float(values.max()) if len(values) else 1,
+    )
+    layer = folium.GeoJson(
+        geojson,
+        name=f"{color} (zoom {level})",
+        style_function=lambda feature: {
+            "fillColor": colormap(feature["properties"][color]),
+            "color": None,
+            "fillOpacity": 0.6,
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=[k for k in cells if k not in ("i", "j", "lon", "lat")]
+        ),
+    )
+    if folium_map is not None:
+        layer.add_to(folium_map)
+    return layer
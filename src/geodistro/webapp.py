@@ -0,0 +1,443 @@
+"""
+Computed-layer cache for Dash / dash-leaflet map apps
+
+A map callback that filters a GeoDataFrame to the view and serializes it to
+GeoJSON redoes that work for every pan, every filter change and every user.
+Here a layer is computed per slippy-map tile, filter set and dataset
+version, serialized once (GeoJSON, or MVT when mapbox-vector-tile is
+installed), gzip-compressed and kept in an LRU memory tier backed by a
+bounded disk tier shared by all worker processes.
+
+Concurrent requests for the same missing layer wait for one computation
+instead of each running it. Layers are served pre-compressed from a Flask
+route with ETags, so callbacks only return tile URLs and browsers revalidate
+instead of downloading again. When a dataset's fingerprint changes, layers
+of its older versions are dropped.
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from geodistro.core import GeoDistroConfig
+
+PathLike = Union[str, Path]
+BBox = Tuple[float, float, float, float]
+Tile = Tuple[int, int, int]
+
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024
+DEFAULT_DISK_BYTES = 4 * 1024 * 1024 * 1024
+
+# Seconds between fingerprint checks of a file-backed dataset
+DEFAULT_CHECK_INTERVAL = 5.0
+
+MVT_EXTENT = 4096
+
+# Most tiles a single view may request
+DEFAULT_MAX_TILES = 64
+
+CONTENT_TYPES = {"geojson": "application/geo+json",
+                 "mvt": "application/vnd.mapbox-vector-tile"}
+
+
+def tile_bounds(z: int, x: int, y: int) -> BBox:
+    """Lon/lat bounds of a slippy-map tile"""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def _tile_range(bbox: BBox, z: int) -> Tuple[range, range]:
+    """Tile columns and rows at zoom z covering a lon/lat bbox"""
+    n = 2 ** z
+
+    def column(lon):
+        return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+
+    def row(lat):
+        lat = max(-85.05112878, min(85.05112878, lat))
+        r = math.radians(lat)
+        return min(n - 1, max(0, int((1 - math.asinh(math.tan(r)) / math.pi) / 2 * n)))
+
+    minx, miny, maxx, maxy = bbox
+    return range(column(minx), column(maxx) + 1), range(row(maxy), row(miny) + 1)
+
+
+def tiles_for_bbox(bbox: BBox, z: int) -> List[Tile]:
+    """Tiles at zoom z covering a lon/lat bbox"""
+    columns, rows = _tile_range(bbox, z)
+    return [(z, x, y) for x in columns for y in rows]
+
+
+def params_key(params: Optional[Dict]) -> str:
+    """Short stable digest of filter parameters"""
+    payload = json.dumps(params or {}, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def clean_params(gdf, params: Optional[Dict] = None) -> Dict:
+    """Equality filters restricted to the frame's attribute columns
+
+    Arguments that are not columns (cache busters such as ?_=123) are
+    dropped, and values for numeric columns, which arrive from query strings
+    as text, are converted to floats. Raises ValueError for a value that is
+    not a number on a numeric column.
+    """
+    from pandas.api.types import is_numeric_dtype
+
+    cleaned = {}
+    for column, value in (params or {}).items():
+        if column not in gdf.columns or column == gdf.geometry.name:
+            continue
+        if is_numeric_dtype(gdf[column]):
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            try:
+                values = [float(v) for v in values]
+            except (TypeError, ValueError):
+                raise ValueError(f"Filter '{column}' needs numeric values") from None
+            value = values if isinstance(value, (list, tuple, set)) else values[0]
+        cleaned[column] = value
+    return cleaned
+
+
+def filter_tile(gdf, tile: Tile, params: Optional[Dict] = None, simplify: bool = True):
+    """Features of a tile matching equality filters ({column: value or [values]})
+
+    Uses the GeoDataFrame's spatial index. Filters go through clean_params
+    first. Lines and polygons are simplified to about one pixel of a 256 px
+    tile.
+    """
+    import shapely
+
+    bounds = tile_bounds(*tile)
+    subset = gdf.iloc[gdf.sindex.query(shapely.box(*bounds), predicate="intersects")]
+    for column, value in clean_params(gdf, params).items():
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        subset = subset[subset[column].isin(values)]
+    if (
+        simplify
+        and len(subset)
+        and not subset.geom_type.isin(["Point", "MultiPoint"]).all()
+    ):
+        subset = subset.copy()
+        subset["geometry"] = subset.geometry.simplify((bounds[2] - bounds[0]) / 256)
+    return subset
+
+
+def encode_geojson(gdf) -> bytes:
+    return gdf.to_json(drop_id=True).encode()
+
+
+def encode_mvt(gdf, tile: Tile, layer_name: str = "layer") -> bytes:
+    """Mapbox vector tile of features in lon/lat (needs mapbox-vector-tile)"""
+    import mapbox_vector_tile
+
+    bounds = tile_bounds(*tile)
+    properties = gdf.drop(columns=gdf.geometry.name)
+    features = [{"geometry": geometry, "properties": row}
+                for geometry, row in zip(gdf.geometry, properties.to_dict("records"))]
+    layers = [{"name": layer_name, "features": features}]
+    try:
+        return mapbox_vector_tile.encode(
+            layers, default_options={"quantize_bounds": bounds, "extents": MVT_EXTENT})
+    except TypeError:
+        # mapbox-vector-tile < 2 takes the options as keywords
+        return mapbox_vector_tile.encode(
+            layers, quantize_bounds=bounds, extents=MVT_EXTENT
+        )
+
+
+class LayerSource:
+    """A vector dataset whose version follows its file, or an in-memory frame
+
+    File-backed sources are read with geodistro.io.read_vector and re-read
+    when the file's fingerprint changes (checked at most every
+    check_interval seconds).
+    """
+
+    def __init__(self, path: Optional[PathLike] = None, layer: Optional[str] = None,
+                 frame=None, version: Optional[str] = None,
+                 check_interval: float = DEFAULT_CHECK_INTERVAL,
+                 loader: Optional[Callable] = None):
+        if path is None and frame is None:
+            raise ValueError("LayerSource needs a path or a frame")
+        self.path = Path(path) if path is not None else None
+        self.layer = layer
+        self.check_interval = check_interval
+        self.loader = loader
+        self._frame = frame
+        self._version = version or ("static" if frame is not None else None)
+        self._loaded_version = self._version if frame is not None else None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        if (
+            self.path is not None
+            and time.monotonic() - self._checked >= self.check_interval
+        ):
+            from geodistro.io import source_fingerprint
+
+            self._version = source_fingerprint(self.path, self.layer)
+            self._checked = time.monotonic()
+        return self._version
+
+    def set_frame(self, frame, version: str):
+        """Replace an in-memory dataset; layers of the old version are dropped"""
+        with self._lock:
+            self._frame, self._version, self._loaded_version = frame, version, version
+
+    def frame(self):
+        version = self.version
+        with self._lock:
+            if self._loaded_version != version:
+                if self.loader is not None:
+                    self._frame = self.loader(self.path)
+                else:
+                    from geodistro.io import read_vector
+
+                    self._frame = read_vector(self.path, layer=self.layer)
+                # Build the spatial index now rather than in the first request
+                self._frame.sindex
+                self._loaded_version = version
+            return self._frame
+
+    def clean_params(self, params: Optional[Dict] = None) -> Dict:
+        """The filters that apply to this dataset (see clean_params)"""
+        return clean_params(self.frame(), params)
+
+    def render(self, tile: Tile, params: Optional[Dict] = None, fmt: str = "geojson",
+               name: str = "layer") -> bytes:
+        subset = filter_tile(self.frame(), tile, params)
+        if fmt == "mvt":
+            return encode_mvt(subset, tile, name)
+        return encode_geojson(subset)
+
+
+class LayerCache:
+    """Two-tier cache of compressed layers keyed by dataset version, tile and filters
+
+    The memory tier holds at most memory_bytes of compressed layers and
+    evicts least recently used ones. The disk tier (the "layers" cache
+    directory by default) is shared across processes and trimmed to
+    disk_bytes by dropping the least recently read files.
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = DEFAULT_MEMORY_BYTES,
+        disk_dir: Optional[PathLike] = None,
+        disk_bytes: int = DEFAULT_DISK_BYTES,
+        compresslevel: int = 6,
+    ):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = (
+            Path(disk_dir) if disk_dir else GeoDistroConfig.get_cache_dir("layers")
+        )
+        self.disk_bytes = disk_bytes
+        self.compresslevel = compresslevel
+        self._memory: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._disk_used: Optional[int] = None
+        self._versions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple, threading.Lock] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evicted": 0}
+
+    def _path(self, key: Tuple) -> Path:
+        dataset, version, fmt, (z, x, y), params = key
+        return self.disk_dir / dataset / version / f"{z}-{x}-{y}-{params}.{fmt}.gz"
+
+    def _remember(self, key: Tuple, body: bytes):
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = body
+            self._memory_used += len(body)
+            while self._memory_used > self.memory_bytes and self._memory:
+                _, old = self._memory.popitem(last=False)
+                self._memory_used -= len(old)
+                self.stats["evicted"] += 1
+
+    def _check_version(self, dataset: str, version: str):
+        """Drop every layer of older versions when a dataset's version changes"""
+        with self._lock:
+            previous = self._versions.get(dataset)
+            self._versions[dataset] = version
+            if previous is None or previous == version:
+                return
+            for key in [k for k in self._memory if k[0] == dataset and k[1] != version]:
+                self._memory_used -= len(self._memory.pop(key))
+        directory = self.disk_dir / dataset
+        if directory.is_dir():
+            for old in directory.iterdir():
+                if old.name != version:
+                    shutil.rmtree(old, ignore_errors=True)
+        self._disk_used = None
+
+    def _trim_disk(self, added: int):
+        with self._lock:
+            if self._disk_used is None:
+                self._disk_used = sum(
+                    p.stat().st_size for p in self.disk_dir.rglob("*.gz")
+                )
+            else:
+                self._disk_used += added
+            if self._disk_used <= self.disk_bytes:
+                return
+            files = sorted(self.disk_dir.rglob("*.gz"), key=lambda p: p.stat().st_mtime)
+            target = self.disk_bytes * 0.9
+            for path in files:
+                if self._disk_used <= target:
+                    break
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                except OSError:
+                    continue
+                self._disk_used -= size
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        """Compressed layer from memory or disk, or None"""
+        with self._lock:
+            body = self._memory.get(key)
+            if body is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return body
+        path = self._path(key)
+        try:
+            body = path.read_bytes()
+        except OSError:
+            return None
+        # Reads refresh the mtime the disk tier evicts by; another process
+        # may have trimmed the file since it was read
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats["disk_hits"] += 1
+        self._remember(key, body)
+        return body
+
+    def layer(self, source: LayerSource, dataset: str, tile: Tile,
+              params: Optional[Dict] = None, fmt: str = "geojson") -> Tuple[bytes, str]:
+        """Gzip-compressed layer and its ETag, computed once per version, tile, filters
+
+        Raises ValueError for filters that do not fit the dataset.
+        """
+        version = source.version
+        self._check_version(dataset, version)
+        # Filters that cannot change the layer must not split the cache
+        params = source.clean_params(params)
+        key = (dataset, version, fmt, tuple(tile), params_key(params))
+        etag = hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest()
+        body = self.get(key)
+        if body is not None:
+            return body, etag
+
+        with self._lock:
+            lock = self._inflight.setdefault(key, threading.Lock())
+        with lock:
+            # Another request may have computed it while this one waited
+            body = self.get(key)
+            if body is None:
+                self.stats["misses"] += 1
+                raw = source.render(tuple(tile), params, fmt, name=dataset)
+                body = gzip.compress(raw, compresslevel=self.compresslevel, mtime=0)
+                path = self._path(key)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(
+                    f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+                )
+                tmp.write_bytes(body)
+                tmp.replace(path)
+                self._remember(key, body)
+                self._trim_disk(len(body))
+        with self._lock:
+            self._inflight.pop(key, None)
+        return body, etag
+
+    def clear(self):
+        """Drop both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+            self._disk_used = None
+        shutil.rmtree(self.disk_dir, ignore_errors=True)
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+
+def add_layer_routes(server, cache: LayerCache, sources: Dict[str, LayerSource],
+                     prefix: str = "/layers", max_age: int = 60):
+    """Serve cached layers from a Flask server (a Dash app's app.server)
+
+    GET {prefix}/<dataset>/<z>/<x>/<y>.<geojson|mvt>?column=value&column=value
+    Repeated query arguments filter on any of the values. Arguments that are
+    not columns of the dataset are ignored; a non-numeric value for a numeric
+    column is answered with 400.
+    """
+    from flask import Response, abort, request
+
+    def serve(dataset, z, x, y, fmt):
+        source = sources.get(dataset)
+        if source is None or fmt not in CONTENT_TYPES:
+            abort(404)
+        params = {k: v if len(v) > 1 else v[0] for k, v in request.args.lists()}
+        try:
+            params = source.clean_params(params)
+        except ValueError as e:
+            abort(400, description=str(e))
+        body, etag = cache.layer(source, dataset, (z, x, y), params, fmt)
+        headers = {"ETag": f'"{etag}"', "Cache-Control": f"public, max-age={max_age}",
+                   "Vary": "Accept-Encoding"}
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+        else:
+            body = gzip.decompress(body)
+        return Response(body, mimetype=CONTENT_TYPES[fmt], headers=headers)
+
+    server.add_url_rule(f"{prefix}/<dataset>/<int:z>/<int:x>/<int:y>.<fmt>",
+                        endpoint="geodistro_layers", view_func=serve)
+    return server
+
+
+def layer_urls(dataset: str, bbox: BBox, zoom: float, params: Optional[Dict] = None,
+               prefix: str = "/layers", min_zoom: int = 0, max_zoom: int = 14,
+               fmt: str = "geojson", max_tiles: int = DEFAULT_MAX_TILES) -> List[str]:
+    """URLs of the cached tiles covering a view, for dash-leaflet GeoJSON(url=...)
+
+    Views zoomed out below min_zoom get no layers. A view that needs more
+    than max_tiles tiles is served from coarser tiles, down to min_zoom, and
+    gets no layers if even those are too many.
+    """
+    from urllib.parse import urlencode
+
+    if math.floor(zoom) < min_zoom:
+        return []
+    z = int(min(math.floor(zoom), max_zoom))
+    while True:
+        columns, rows = _tile_range(bbox, z)
+        if len(columns) * len(rows) <= max_tiles:
+            break
+        if z <= min_zoom:
+            return []
+        z -= 1
+    query = urlencode(params or {}, doseq=True)
+    suffix = f"?{query}" if query else ""
+    return [f"{prefix}/{dataset}/{z}/{x}/{y}.{fmt}{suffix}"
+            for z, x, y in tiles_for_bbox(bbox, z)]
@@ -0,0 +1,10 @@
+import pytest
+from geodistro.core import GeoDistroConfig
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keep every cache a test writes out of the user's ~/.cache/geodistro"""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv(GeoDistroConfig.CACHE_DIR_ENV, str(cache_dir))
+    return cache_dir
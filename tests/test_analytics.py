@@ -0,0 +1,105 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+shapely = pytest.importorskip("shapely")
+
+from geodistro import analytics
+
+
+def _grid(side):
+    edges = np.arange(side + 1, dtype=float)
+    cols, rows = np.meshgrid(np.arange(side), np.arange(side))
+    rows, cols = rows.ravel(), cols.ravel()
+    return shapely.box(edges[cols], edges[rows], edges[cols + 1], edges[rows + 1])
+
+
+def test_contiguity_weights_on_grid():
+    """Test queen and rook neighbour counts on a regular grid"""
+    polygons = _grid(5)
+    queen = analytics.contiguity_weights(polygons, chunk_size=7)
+    rook = analytics.contiguity_weights(polygons, rook=True, chunk_size=7)
+    assert queen.shape == (25, 25)
+    # Corner, edge and interior cells
+    assert np.diff(queen.indptr)[[0, 1, 6]].tolist() == [3, 5, 8]
+    assert np.diff(rook.indptr)[[0, 1, 6]].tolist() == [2, 3, 4]
+    assert (queen != queen.T).nnz == 0
+
+
+def test_knn_weights_excludes_self():
+    """Test k-nearest-neighbour weights against brute force"""
+    rng = np.random.default_rng(1)
+    coords = rng.uniform(size=(200, 2))
+    w = analytics.knn_weights(coords, k=4, chunk_size=33)
+    dist = np.linalg.norm(coords[:, None] - coords[None], axis=2)
+    np.fill_diagonal(dist, np.inf)
+    expected = np.sort(np.argsort(dist, axis=1)[:, :4], axis=1)
+    assert np.array_equal(np.sort(w.indices.reshape(200, 4), axis=1), expected)
+
+
+def test_weights_round_trip_memory_mapped(tmp_path):
+    """Test that persisted weights load back memory-mapped"""
+    w = analytics.row_standardize(analytics.contiguity_weights(_grid(4)))
+    loaded = analytics.load_weights(analytics.save_weights(w, tmp_path / "w"))
+    assert not loaded.data.flags.writeable
+    assert (loaded != w).nnz == 0
+    assert np.allclose(loaded.sum(axis=1), 1.0)
+
+
+def test_moran_matches_esda():
+    """Test global and local Moran's I against esda"""
+    esda = pytest.importorskip("esda")
+    libpysal = pytest.importorskip("libpysal")
+
+    side = 10
+    w = analytics.row_standardize(analytics.contiguity_weights(_grid(side)))
+    rng = np.random.default_rng(0)
+    y = np.add.outer(np.arange(side), np.arange(side)).ravel() + rng.normal(
+        0, 2, side * side
+    )
+
+    lattice = libpysal.weights.lat2W(side, side, rook=False)
+    lattice.transform = "r"
+    expected = esda.Moran(y, lattice, permutations=0)
+    result = analytics.moran(y, w, permutations=99, seed=0)
+    assert result["I"] == pytest.approx(expected.I)
+    assert result["z_norm"] == pytest.approx(expected.z_norm)
+    assert 0 < result["p_sim"] <= 0.05
+
+    local = analytics.local_moran(y, w, permutations=99, seed=0)
+    expected_local = esda.Moran_Local(y, lattice, permutations=0)
+    np.testing.assert_allclose(local["Is"], expected_local.Is)
+    assert np.array_equal(local["q"], expected_local.q)
+    assert local["p_sim"].shape == (side * side,)
+
+
+def test_local_moran_islands_and_distinct_draws():
+    """Test that islands get NaN inference and permuted neighbours never repeat"""
+    rng = np.random.default_rng(0)
+    draws = analytics._sample_without_replacement(rng, 6, 5, (50, 40))
+    assert all(len(set(row)) == 5 for row in draws.reshape(-1, 5))
+    assert np.bincount(draws[..., 0].ravel(), minlength=6).min() > 0
+
+    polygons = list(_grid(3)[:3]) + [shapely.box(10, 10, 11, 11)]
+    w = analytics.row_standardize(analytics.contiguity_weights(polygons))
+    local = analytics.local_moran(
+        np.array([1.0, 2.0, 3.0, 4.0]), w, permutations=99, seed=0
+    )
+    assert np.isnan(local["p_sim"][3]) and np.isnan(local["z_sim"][3])
+    assert np.all(local["p_sim"][:3] > 0.01)
+
+
+def test_permutations_bounded_and_reproducible_across_workers(monkeypatch):
+    """Test that the buffer caps concurrent chunks and chunks ignore the worker count"""
+    monkeypatch.setattr(analytics, "PERMUTATION_BUFFER", 4_000)
+    monkeypatch.setattr(analytics, "PERMUTATION_CHUNK", 1_000)
+    assert analytics._permutation_workers(64) == 4
+    assert analytics._permutation_workers(2) == 2
+
+    w = analytics.row_standardize(analytics.contiguity_weights(_grid(6)))
+    y = np.random.default_rng(0).normal(size=36)
+    serial = analytics.local_moran(y, w, permutations=99, seed=1, n_jobs=1)
+    parallel = analytics.local_moran(y, w, permutations=99, seed=1, n_jobs=8)
+    np.testing.assert_array_equal(serial["p_sim"], parallel["p_sim"])
+    serial = analytics.moran(y, w, permutations=99, seed=1, n_jobs=1)
+    assert analytics.moran(y, w, permutations=99, seed=1, n_jobs=8) == serial
@@ -0,0 +1,27 @@
+import sys
+
+from geodistro import bench
+
+
+def test_benchmark_reports_time_and_memory():
+    """Test running workloads in a fresh interpreter and comparing interpreters"""
+    results = bench.benchmark_interpreters(
+        {"a": sys.executable, "b": sys.executable},
+        workloads=["haversine", "geojson"], repeat=2, scale=0.01,
+    )
+    for label in ("a", "b"):
+        for report in results[label].values():
+            assert len(report["timings"]) == 2
+            assert report["seconds"] > 0
+            assert report["max_rss_mb"] > 0
+            assert report["python"] == sys.version.split()[0]
+    speed = bench.relative_speed(results, "a")
+    assert speed["a"] == {"haversine": 1.0, "geojson": 1.0}
+    assert set(speed["b"]) == {"haversine", "geojson"}
+
+
+def test_missing_library_is_reported(monkeypatch):
+    """Test that a workload whose library is absent yields an error, not a crash"""
+    monkeypatch.setitem(bench.WORKLOADS, "missing", (1, "import not_a_real_module\n"))
+    report = bench.run_workload(sys.executable, "missing", repeat=1)
+    assert "not_a_real_module" in report["error"]
@@ -0,0 +1,42 @@
+from geodistro import budget
+
+
+def test_check_budgets_flags_slow_and_missing_imports(tmp_path, monkeypatch):
+    """Test median-based budget checks on modules imported in fresh interpreters"""
+    (tmp_path / "slowgeo.py").write_text("import time\ntime.sleep(0.2)\n")
+    (tmp_path / "biggeo.py").write_text("blob = bytes(range(256)) * (256 * 1024)\n")
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+    limits = {
+        "libraries": {
+            "slowgeo": {"seconds": 0.1},
+            "biggeo": {"seconds": 5, "rss_mb": 32},
+            "json": {"seconds": 1, "rss_mb": 32},
+        },
+        "stack": {"seconds": 5},
+    }
+    results = {r["name"]: r for r in budget.check_budgets(limits, repeat=2)}
+
+    assert (
+        results["slowgeo"]["status"] == "over" and results["slowgeo"]["seconds"] >= 0.2
+    )
+    assert results["biggeo"]["status"] == "over" and results["biggeo"]["rss_mb"] >= 64
+    assert results["json"]["status"] == "ok" and results["json"]["runs"] == 2
+    assert results[budget.STACK]["status"] == "ok"
+
+    missing = budget.check_budgets({"libraries": {"nogeo": {}}, "stack": {}}, repeat=1)
+    assert missing[0]["status"] == "error" and "nogeo" in missing[0]["error"]
+
+    recorded = budget.record_budgets(list(results.values()), headroom=2)
+    assert recorded["libraries"]["slowgeo"]["seconds"] >= 0.4
+    assert set(recorded["stack"]) == {"seconds", "rss_mb"}
+
+
+def test_shipped_budget_file_covers_the_verifier_libraries():
+    """Test that the default budget file budgets every verified library"""
+    from pathlib import Path
+
+    limits = budget.load_budgets(
+        Path(__file__).parent.parent / budget.DEFAULT_BUDGET_FILE
+    )
+    assert set(limits["libraries"]) == set(budget.default_libraries())
+    assert limits["stack"]["seconds"] > 0
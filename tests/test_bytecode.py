@@ -0,0 +1,34 @@
+import sys
+
+import pytest
+
+from geodistro import bytecode
+
+
+@pytest.mark.parametrize("mode", bytecode.INVALIDATION_MODES)
+def test_compile_and_verify_tree(tmp_path, mode):
+    """Test that compiled trees verify for the interpreter and mode"""
+    package = tmp_path / "pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "module.py").write_text("VALUE = 1\n")
+
+    result = bytecode.compile_trees(sys.executable, [str(tmp_path)], mode)
+    assert result.returncode == 0
+    report = bytecode.verify_trees(sys.executable, [str(tmp_path)], mode)
+    assert report["sources"] == report["valid"] == 2
+
+    other = "timestamp" if mode != "timestamp" else "checked-hash"
+    assert bytecode.verify_trees(sys.executable, [str(tmp_path)], other)["valid"] == 0
+
+
+def test_verify_reports_missing_and_stale(tmp_path):
+    """Test that missing and outdated .pyc files are reported"""
+    (tmp_path / "ok.py").write_text("x = 1\n")
+    bytecode.compile_trees(sys.executable, [str(tmp_path)], "checked-hash")
+    (tmp_path / "ok.py").write_text("x = 2\n")
+    (tmp_path / "new.py").write_text("y = 1\n")
+
+    report = bytecode.verify_trees(sys.executable, [str(tmp_path)], "checked-hash")
+    assert report["missing"] == 1
+    assert report["stale"] == 1
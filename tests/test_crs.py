@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pyproj")
+
+from pyproj import Transformer
+
+from geodistro import crs
+
+
+def test_transformer_cache_is_thread_local():
+    """Test that transformers are reused per thread but not shared across threads"""
+    first = crs.get_transformer("EPSG:4326", "EPSG:3857")
+    assert crs.get_transformer("EPSG:4326", "EPSG:3857") is first
+
+    other = []
+    thread = threading.Thread(
+        target=lambda: other.append(crs.get_transformer("EPSG:4326", "EPSG:3857"))
+    )
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+
+
+def test_transform_in_place_matches_pyproj(monkeypatch):
+    """Test in-place and multi-threaded transforms against plain pyproj"""
+    monkeypatch.setattr(crs, "PARALLEL_THRESHOLD", 100)
+    monkeypatch.setattr(crs, "MIN_CHUNK_SIZE", 10)
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-170, 170, 1000)
+    y = rng.uniform(-80, 80, 1000)
+    expected = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True).transform(
+        x, y
+    )
+
+    xs, ys = x.copy(), y.copy()
+    result = crs.transform_xy(xs, ys, "EPSG:4326", "EPSG:3857", threads=4)
+    assert result[0] is xs
+    np.testing.assert_allclose(xs, expected[0])
+    np.testing.assert_allclose(ys, expected[1])
+
+    coords = np.column_stack([x, y])
+    crs.transform_coords(coords, "EPSG:4326", "EPSG:3857")
+    np.testing.assert_allclose(coords[:, 0], expected[0])
+
+    with pytest.raises(ValueError):
+        crs.transform_xy(x[::2], y[::2], "EPSG:4326", "EPSG:3857")
+
+
+def test_parallel_transforms_reuse_worker_transformers(monkeypatch):
+    """Test that repeated parallel calls share one pool whose threads keep their Transformers"""
+    monkeypatch.setattr(crs, "PARALLEL_THRESHOLD", 100)
+    monkeypatch.setattr(crs, "MIN_CHUNK_SIZE", 10)
+    created = []
+    from_crs = Transformer.from_crs
+
+    def counting_from_crs(*args, **kwargs):
+        created.append(threading.current_thread().name)
+        return from_crs(*args, **kwargs)
+
+    monkeypatch.setattr(crs.Transformer, "from_crs", counting_from_crs)
+    x, y = np.full(1000, 10.0), np.full(1000, 50.0)
+    for _ in range(10):
+        crs.transform_xy(x.copy(), y.copy(), "EPSG:4326", "EPSG:32632", threads=4)
+    pool = crs._pool(1)
+    assert crs._pool(2) is pool
+    # At most one Transformer per worker thread, however many calls were made
+    assert len(created) == len(set(created)) <= pool._max_workers
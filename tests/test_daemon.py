@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from geodistro import daemon
+from geodistro.installer import AsyncGeoDistroInstaller, InstallResult
+
+
+def test_manifest_hash_normalizes_defaults():
+    """Test that requests differing only in spelled-out defaults share a hash"""
+    assert daemon.manifest_hash({}) == daemon.manifest_hash({"env_name": "geo-distro",
+                                                              "kernel_pool": 2})
+    assert daemon.manifest_hash({}) != daemon.manifest_hash({"python": "3.12"})
+    with pytest.raises(ValueError):
+        daemon.manifest_hash({"packages": ["gdal"]})
+
+
+def test_identical_requests_share_one_build(monkeypatch):
+    """Test coalescing of identical in-flight requests and the metrics endpoint"""
+    builds = []
+
+    async def fake_install_all(self, **options):
+        builds.append(options)
+        self._say(f"building {options['env_name']}")
+        await asyncio.sleep(0.2)
+        return InstallResult(
+            options["env_name"], options["python"] != "3.12", options["python"]
+        )
+
+    monkeypatch.setattr(AsyncGeoDistroInstaller, "install_all", fake_install_all)
+
+    async def scenario():
+        provisioner = daemon.ProvisioningDaemon(max_builds=2)
+        provisioner.installer.install_method = "conda"
+        server = await provisioner.start(port=0)
+        address = "127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+        loop = asyncio.get_running_loop()
+        submit = lambda options: loop.run_in_executor(
+            None, daemon.submit_build, address, options
+        )
+        try:
+            jobs = await asyncio.gather(
+                submit({}),
+                submit({}),
+                submit({"env_name": "geo-distro"}),
+                submit({"env_name": "other", "python": "3.12"}),
+            )
+            status, missing = await loop.run_in_executor(
+                None, daemon.request, address, "GET", "/builds/nope")
+            _, metrics = await loop.run_in_executor(
+                None, daemon.request, address, "GET", "/metrics"
+            )
+            status_bad, _ = await loop.run_in_executor(
+                None, daemon.request, address, "POST", "/builds", {"bogus": 1})
+        finally:
+            server.close()
+            await provisioner.close()
+        return jobs, status, metrics, status_bad
+
+    jobs, status, metrics, status_bad = asyncio.run(scenario())
+    assert len(builds) == 2
+    assert len({job["id"] for job in jobs[:3]}) == 1
+    assert jobs[0]["requests"] == 3 and jobs[0]["status"] == "ok"
+    assert jobs[0]["log"] == ["building geo-distro"]
+    assert jobs[3]["status"] == "failed"
+    assert status == 404 and status_bad == 400
+    assert "geodistro_requests_coalesced_total 2" in metrics
+    assert 'geodistro_builds_total{status="ok"} 1' in metrics
+    assert "geodistro_queue_depth 0" in metrics
+    assert "geodistro_build_seconds_count 2" in metrics
+
+
+def test_unexpected_build_errors_keep_the_worker(monkeypatch):
+    """Test that any exception fails only its job and the worker builds the next one"""
+    import subprocess
+
+    async def fake_install_all(self, **options):
+        if options["env_name"] == "broken":
+            raise subprocess.CalledProcessError(1, ["conda", "create"])
+        return InstallResult(options["env_name"], True, options["python"])
+
+    monkeypatch.setattr(AsyncGeoDistroInstaller, "install_all", fake_install_all)
+
+    async def scenario():
+        provisioner = daemon.ProvisioningDaemon(max_builds=1)
+        provisioner.installer.install_method = "conda"
+        server = await provisioner.start(port=0)
+        try:
+            broken, _ = await provisioner.submit({"env_name": "broken"})
+            fine, _ = await provisioner.submit({"env_name": "fine"})
+            return (await asyncio.wait_for(provisioner.wait(broken["id"]), 5),
+                    await asyncio.wait_for(provisioner.wait(fine["id"]), 5))
+        finally:
+            server.close()
+            await provisioner.close()
+
+    broken, fine = asyncio.run(scenario())
+    assert (
+        broken["status"] == "failed"
+        and "CalledProcessError" in broken["result"]["error"]
+    )
+    assert fine["status"] == "ok"
+
+
+def test_builds_share_one_mirror_refresh_and_skip_shortcuts(monkeypatch):
+    """Test that concurrent builds refresh the mirror once and write no shortcuts by default"""
+    builds, refreshes = [], []
+
+    async def fake_install_all(self, **options):
+        builds.append(options)
+        return InstallResult(options["env_name"], True, options["python"])
+
+    async def fake_ready(self):
+        return True
+
+    async def fake_refresh(self, roots=None):
+        refreshes.append(roots)
+        await asyncio.sleep(0.1)
+        return True
+
+    monkeypatch.setattr(AsyncGeoDistroInstaller, "install_all", fake_install_all)
+    monkeypatch.setattr(AsyncGeoDistroInstaller, "_mirror_ready", fake_ready)
+    monkeypatch.setattr(AsyncGeoDistroInstaller, "refresh_mirror", fake_refresh)
+
+    async def scenario():
+        provisioner = daemon.ProvisioningDaemon(max_builds=3)
+        provisioner.installer.install_method = "conda"
+        server = await provisioner.start(port=0)
+        try:
+            jobs = [
+                (await provisioner.submit({"env_name": f"env{i}"}))[0] for i in range(3)
+            ]
+            return [
+                await asyncio.wait_for(provisioner.wait(job["id"]), 5) for job in jobs
+            ]
+        finally:
+            server.close()
+            await provisioner.close()
+
+    jobs = asyncio.run(scenario())
+    assert [job["status"] for job in jobs] == ["ok"] * 3
+    assert len(refreshes) == 1
+    assert all(not b["refresh_mirror"] and not b["create_shortcuts"] for b in builds)
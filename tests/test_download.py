@@ -0,0 +1,170 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from geodistro import download
+
+
+class FakeProductServer:
+    """Serves fake products with Range support and injected failures"""
+
+    def __init__(self, ranges=True):
+        self.products = {}
+        self.failures = []   # "503" or "truncate", consumed one per request
+        self.served = 0
+        self.ranges = ranges
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = server.products.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                with server.lock:
+                    failure = server.failures.pop(0) if server.failures else None
+                if failure == "503":
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                start, end, status = 0, len(body) - 1, 200
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if match and server.ranges:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2) or end), end)
+                    status = 206
+                chunk = body[start:end + 1]
+                self.send_response(status)
+                self.send_header("ETag", '"%s"' % hashlib.md5(body).hexdigest())
+                self.send_header("Content-Length", str(len(chunk)))
+                if status == 206:
+                    self.send_header(
+                        "Content-Range", f"bytes {start}-{end}/{len(body)}"
+                    )
+                self.end_headers()
+                if failure == "truncate":
+                    chunk = chunk[:len(chunk) // 2]
+                    self.close_connection = True
+                self.wfile.write(chunk)
+                with server.lock:
+                    server.served += len(chunk)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add(self, name, size):
+        body = os.urandom(size)
+        self.products[f"/{name}"] = body
+        return f"{self.url}/{name}", "md5:" + hashlib.md5(body).hexdigest()
+
+
+@pytest.fixture
+def server():
+    fake = FakeProductServer()
+    yield fake
+    fake.server.shutdown()
+
+
+def test_parallel_download_with_injected_failures(server, tmp_path):
+    """Test that parts retry through 503s and dropped connections and verify checksums"""
+    items = []
+    for i in range(3):
+        url, checksum = server.add(f"S2A_{i}.zip", 300_000 + i)
+        items.append(download.DownloadItem(url, tmp_path / f"S2A_{i}.zip", checksum))
+    server.failures = ["503", "truncate", "503", "truncate"]
+    events = []
+    downloader = download.Downloader(max_concurrency=3, part_size=64 * 1024, backoff=0,
+                                     on_event=events.append)
+
+    results = downloader.download(items)
+    assert [r.ok for r in results] == [True] * 3
+    for item in items:
+        assert download.file_checksum_ok(item.path, item.checksum)
+        assert not item.path.with_name(item.path.name + ".part.json").exists()
+    assert any(e["type"] == "progress" and e["done"] == e["total"] for e in events)
+
+    # Already complete files are not fetched again
+    served = server.served
+    assert all(downloader.download(items))
+    assert server.served == served
+
+
+def test_resume_after_interruption(server, tmp_path):
+    """Test that a failed run keeps finished parts and the next run fetches only the rest"""
+    url, checksum = server.add("scene.zip", 500_000)
+    item = download.DownloadItem(url, tmp_path / "scene.zip", checksum)
+    # Probe, then the third of five parts fails; the other parts still finish
+    server.failures = [None, None, None, "503"]
+    first = download.Downloader(max_concurrency=1, part_size=100_000, max_retries=0)
+    assert not first.download([item])[0].ok
+    assert item.path.with_name("scene.zip.part.json").exists()
+
+    server.served = 0
+    result = download.Downloader(max_concurrency=2, part_size=100_000).download([item])[
+        0
+    ]
+    assert result.ok and result.resumed == 400_000
+    assert result.bytes == 100_000
+    assert server.served == 100_000 + 1
+    assert download.file_checksum_ok(item.path, checksum)
+
+
+def test_checksum_mismatch_and_disk_limit(server, tmp_path):
+    """Test that corrupt files are discarded and downloads that would fill the disk refused"""
+    url, _ = server.add("bad.zip", 1000)
+    bad = download.DownloadItem(url, tmp_path / "bad.zip", "md5:" + "0" * 32)
+    result = download.Downloader(backoff=0).download([bad])[0]
+    assert not result.ok and "checksum" in result.error
+    assert (
+        not (tmp_path / "bad.zip").exists() and not (tmp_path / "bad.zip.part").exists()
+    )
+
+    url, _ = server.add("big.zip", 1000)
+    huge = download.Downloader(min_free_bytes=1 << 60)
+    result = huge.download([download.DownloadItem(url, tmp_path / "big.zip")])[0]
+    assert not result.ok and "free" in result.error
+
+
+def test_bandwidth_limit_and_stream_fallback(tmp_path):
+    """Test the shared rate limit on a server without range support"""
+    fake = FakeProductServer(ranges=False)
+    try:
+        url, checksum = fake.add("dem.tif", 400_000)
+        fake.failures = [None, "truncate"]
+        start = time.perf_counter()
+        result = download.Downloader(rate_limit=1_000_000, backoff=0).download(
+            [download.DownloadItem(url, tmp_path / "dem.tif", checksum)])[0]
+        assert result.ok and result.bytes == 400_000
+        assert fake.failures == []
+        assert time.perf_counter() - start >= 0.35
+    finally:
+        fake.server.shutdown()
+
+
+def test_stale_part_file_is_discarded(server, tmp_path):
+    """Test that a leftover part of another file version does not leak into the result"""
+    url, _ = server.add("scene.zip", 5000)
+    item = download.DownloadItem(url, tmp_path / "scene.zip")
+    server.failures = [None, "503"]
+    assert not download.Downloader(max_retries=0).download([item])[0].ok
+    assert (tmp_path / "scene.zip.part").stat().st_size == 5000
+
+    # The product is republished smaller; without a checksum nothing else would notice
+    body = os.urandom(1000)
+    server.products["/scene.zip"] = body
+    result = download.Downloader(backoff=0).download([item])[0]
+    assert result.ok and result.resumed == 0
+    assert item.path.read_bytes() == body
@@ -0,0 +1,73 @@
+import json
+
+from geodistro.envindex import EnvIndex
+
+
+def _conda_package(prefix, name, version, files=()):
+    meta = prefix / "conda-meta"
+    meta.mkdir(parents=True, exist_ok=True)
+    path = meta / f"{name}-{version}-0.json"
+    path.write_text(
+        json.dumps(
+            {
+                "name": name,
+                "version": version,
+                "build": "h0_0",
+                "channel": "https://conda.anaconda.org/conda-forge/linux-64",
+                "files": list(files),
+            }
+        )
+    )
+    return path
+
+
+def _pip_package(prefix, name, version, installer="pip"):
+    dist_info = (
+        prefix / "lib" / "python3.11" / "site-packages" / f"{name}-{version}.dist-info"
+    )
+    dist_info.mkdir(parents=True)
+    (dist_info / "METADATA").write_text(
+        f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n"
+    )
+    (dist_info / "INSTALLER").write_text(installer + "\n")
+    (dist_info / "RECORD").write_text(f"{name}/__init__.py,sha256=x,1\n")
+    return dist_info
+
+
+def test_index_queries_and_incremental_updates(tmp_path):
+    """Test version queries across envs and that updates re-read only changed metadata"""
+    old, new = tmp_path / "envs" / "geo-old", tmp_path / "envs" / "geo-new"
+    _conda_package(old, "gdal", "3.5.3", ["lib/libgdal.so.31"])
+    _conda_package(new, "gdal", "3.8.4", ["lib/libgdal.so.34"])
+    _pip_package(new, "Geo_Tool", "1.2")
+    _pip_package(new, "shapely", "2.0.1", installer="conda")
+
+    index = EnvIndex(tmp_path / "index.sqlite")
+    stats = index.update([old, new])
+    assert stats["changed"] == {str(old): 1, str(new): 3}
+
+    assert [row["env"] for row in index.query("gdal<3.6")] == ["geo-old"]
+    assert [row["env"] for row in index.query("GDAL")] == ["geo-new", "geo-old"]
+    assert [(row["name"], row["manager"]) for row in index.query("geo-tool>=1")] == [
+        ("geo-tool", "pip")
+    ]
+    # Conda-installed Python packages are not indexed twice
+    assert index.query("shapely") == []
+    assert [row["env"] for row in index.owners("*libgdal.so.3[0-9]")] == [
+        "geo-new",
+        "geo-old",
+    ]
+
+    # Nothing changed: no metadata is read again
+    assert index.update([old, new])["changed"] == {str(old): 0, str(new): 0}
+
+    # An upgrade replaces the conda-meta record
+    (old / "conda-meta" / "gdal-3.5.3-0.json").unlink()
+    _conda_package(old, "gdal", "3.6.4")
+    assert index.update([old, new])["changed"][str(old)] == 1
+    assert index.query("gdal<3.6") == []
+    assert index.owners("*libgdal.so.31") == []
+
+    # Environments missing from a full update are dropped
+    assert index.update([new])["removed"] == [str(old)]
+    assert [env["name"] for env in index.envs()] == ["geo-new"]
@@ -1,5 +1,16 @@
+import asyncio
+import json
+import subprocess
+import sys
+
 import pytest
-from geodistro.installer import GeoDistroInstaller
+from geodistro.installer import (
+    AsyncGeoDistroInstaller,
+    GeoDistroInstaller,
+    InstallResult,
+    PrerequisiteError,
+    find_prebuilt_extensions,
+)
 from geodistro.core import GeoDistroConfig
 
 def test_config():
@@ -12,4 +23,312 @@ def test_installer_initialization():
     """Test installer initialization"""
     installer = GeoDistroInstaller(verbose=False)
     assert installer.verbose == False
-    assert installer.system in ["windows", "linux", "darwin"]
\ No newline at end of file
+    assert installer.system in ["windows", "linux", "darwin"]
+
+def _add_extension(prefix, extension, package):
+    ext_dir = prefix / "share" / "jupyter" / "labextensions" / extension
+    ext_dir.mkdir(parents=True)
+    (ext_dir / "install.json").write_text(
+        '{"packageManager": "python", "packageName": "%s"}' % package
+    )
+
+
+def test_find_prebuilt_extensions(tmp_path):
+    """Test detection of prebuilt extensions from install.json"""
+    _add_extension(tmp_path, "@jupyterlab/geojson-extension", "jupyterlab_geojson")
+    _add_extension(tmp_path, "jupyterlab-kernelspy", "jupyterlab-kernelspy")
+    found = find_prebuilt_extensions(tmp_path)
+    assert found == {
+        "jupyterlab-geojson": "@jupyterlab/geojson-extension",
+        "jupyterlab-kernelspy": "jupyterlab-kernelspy",
+    }
+    assert find_prebuilt_extensions(tmp_path / "missing") == {}
+
+
+def test_setup_jupyter_extensions_installs_only_missing(tmp_path, monkeypatch):
+    """Test that only missing extensions are installed, without a lab build"""
+    installer = AsyncGeoDistroInstaller(verbose=False)
+    _add_extension(tmp_path, "@jupyterlab/geojson-extension", "jupyterlab-geojson")
+
+    async def fake_prefix(env_name):
+        return tmp_path
+
+    monkeypatch.setattr(installer, "_env_prefix", fake_prefix)
+
+    calls = []
+
+    async def fake_exec(cmd, limit=True):
+        calls.append(cmd)
+        _add_extension(tmp_path, "jupyterlab-kernelspy", "jupyterlab-kernelspy")
+        return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+
+    monkeypatch.setattr(installer, "_exec", fake_exec)
+    results = asyncio.run(installer._setup_jupyter_extensions("geo-test"))
+
+    assert results == {
+        "jupyterlab-geojson": "present",
+        "jupyterlab-kernelspy": "installed",
+    }
+    assert len(calls) == 1
+    assert calls[0][-2:] == ["--only-binary=:all:", "jupyterlab-kernelspy"]
+    assert not any("build" in part for part in calls[0])
+    assert installer.trace[-1]["step"] == "jupyter_extensions"
+
+
+def test_kernel_pool_installs_geodistro_only_from_source(tmp_path, monkeypatch):
+    """Test that a missing geodistro is installed from this checkout, never by name"""
+    from geodistro import installer as installer_module
+
+    installer = AsyncGeoDistroInstaller(verbose=False)
+
+    async def fake_prefix(env_name):
+        return tmp_path
+
+    calls = []
+
+    async def fake_exec(cmd, limit=True):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(
+            cmd, 1 if cmd[1] == "-c" else 0, stdout="", stderr=""
+        )
+
+    monkeypatch.setattr(installer, "_env_prefix", fake_prefix)
+    monkeypatch.setattr(installer, "_exec", fake_exec)
+
+    assert asyncio.run(installer.register_kernel_pool("geo-test"))
+    assert calls[-1][-2:] == ["--no-deps", str(installer_module._local_source())]
+
+    calls.clear()
+    monkeypatch.setattr(installer_module, "_local_source", lambda: None)
+    assert not asyncio.run(installer.register_kernel_pool("geo-test"))
+    assert len(calls) == 1
+    assert installer.trace[-1]["status"] == "failed"
+
+
+def test_cached_solve_skips_solver_until_repodata_changes(tmp_path, monkeypatch):
+    """Test that identical requests reuse the solve until the channel changes"""
+    from geodistro import solvecache
+
+    repodata = tmp_path / "channel" / "noarch" / "repodata.json"
+    repodata.parent.mkdir(parents=True)
+    repodata.write_text('{"packages": {}}')
+    (tmp_path / "channel" / "linux-64").mkdir()
+    monkeypatch.setenv(GeoDistroConfig.CACHE_DIR_ENV, str(tmp_path / "cache"))
+    monkeypatch.setattr(
+        GeoDistroConfig, "SOLVER_CHANNELS", [(tmp_path / "channel").as_uri()]
+    )
+
+    solves = []
+    monkeypatch.setattr(
+        solvecache,
+        "solve_explicit",
+        lambda conda, specs, channels: solves.append(specs) or ["file:///x#1"],
+    )
+    installer = AsyncGeoDistroInstaller(verbose=False)
+    installer.install_method = "conda"
+    installer._platform = "linux-64"
+    solve = lambda specs: asyncio.run(installer._cached_solve(specs))
+
+    first = solve(["python=3.9", "gdal"])
+    assert solve(["gdal", "python=3.9"]) == first
+    assert len(solves) == 1
+
+    repodata.write_text('{"packages": {"changed": {}}}')
+    assert solve(["python=3.9", "gdal"]) != first
+    assert len(solves) == 2
+    assert [e["status"] for e in installer.trace] == ["miss", "hit", "miss"]
+
+
+def test_solver_uses_mirror_when_it_covers_specs(tmp_path, monkeypatch):
+    """Test that the solver is pointed at the local mirror only when it can serve the specs"""
+    from geodistro import mirror
+
+    monkeypatch.setenv(GeoDistroConfig.CACHE_DIR_ENV, str(tmp_path))
+    installer = GeoDistroInstaller(verbose=False, on_event=None)
+    installer._platform = "linux-64"
+    assert installer._solver_channels(["gdal"]) == GeoDistroConfig.SOLVER_CHANNELS
+    assert installer._channel_args(GeoDistroConfig.SOLVER_CHANNELS) == [
+        "-c",
+        "conda-forge",
+    ]
+
+    repo_mirror = mirror.RepodataMirror()
+    url = "https://conda.anaconda.org/conda-forge"
+    repo_mirror.channel_dir(url).mkdir(parents=True)
+    (repo_mirror.channel_dir(url) / "mirror.json").write_text(json.dumps(
+        {"upstream": url, "platform": "linux-64", "roots": ["gdal"],
+         "packages": ["gdal", "libgdal", "python"]}
+    ))
+    local = [repo_mirror.channel_dir(url).as_uri()]
+    assert installer._solver_channels(["python=3.9", "gdal"]) == local
+    assert installer._channel_args(local)[-1] == "--override-channels"
+    assert installer._solver_channels(["cartopy"]) == GeoDistroConfig.SOLVER_CHANNELS
+
+    installer.use_mirror = False
+    assert installer._solver_channels(["gdal"]) == GeoDistroConfig.SOLVER_CHANNELS
+
+
+def test_install_matrix_builds_one_env_per_python(monkeypatch):
+    """Test that a Python matrix builds suffixed environments concurrently"""
+    from geodistro import installer as installer_module
+
+    calls = []
+    labels = []
+
+    async def fake_install_all(self, **kwargs):
+        calls.append(kwargs)
+        labels.append(self.label)
+        await asyncio.sleep(0)
+        return InstallResult(
+            kwargs["env_name"], kwargs["python"] != "3.12", kwargs["python"]
+        )
+
+    monkeypatch.setattr(AsyncGeoDistroInstaller, "install_all", fake_install_all)
+    monkeypatch.setattr(
+        installer_module.mirror.RepodataMirror, "status", lambda self: {}
+    )
+    results = installer_module.install_matrix(
+        "geo", ["3.9", "3.11", "3.12"], kernel_pool=0
+    )
+
+    assert results == {"3.9": True, "3.11": True, "3.12": False}
+    by_python = {call["python"]: call for call in calls}
+    assert by_python["3.11"]["env_name"] == "geo-py311"
+    assert sorted(labels) == ["geo-py311", "geo-py312", "geo-py39"]
+    assert (
+        by_python["3.9"]["create_shortcuts"]
+        and not by_python["3.11"]["create_shortcuts"]
+    )
+    assert all(
+        call["refresh_mirror"] is False and call["kernel_pool"] == 0 for call in calls
+    )
+
+
+def test_install_many_keeps_failures_per_build(monkeypatch):
+    """Test that an unexpected error fails only its own build"""
+    finished = []
+
+    async def fake_install_all(self, **kwargs):
+        if kwargs["env_name"] == "broken":
+            raise RuntimeError("boom")
+        await asyncio.sleep(0.05)
+        finished.append(kwargs["env_name"])
+        return InstallResult(kwargs["env_name"], True, kwargs["python"])
+
+    async def fake_prerequisites(self):
+        return "conda"
+
+    async def fake_platform():
+        return "linux-64"
+
+    installer = AsyncGeoDistroInstaller(verbose=False)
+    monkeypatch.setattr(AsyncGeoDistroInstaller, "install_all", fake_install_all)
+    monkeypatch.setattr(
+        AsyncGeoDistroInstaller, "check_prerequisites", fake_prerequisites
+    )
+    monkeypatch.setattr(installer, "_conda_platform", fake_platform)
+    results = asyncio.run(installer.install_many([
+        {"env_name": "broken", "python": "3.11"}, {"env_name": "geo", "python": "3.11"},
+    ]))
+
+    assert [bool(result) for result in results] == [False, True]
+    assert results[0].error == "boom"
+    assert finished == ["geo"]
+
+
+def test_commands_share_the_concurrency_limit():
+    """Test that concurrent commands never exceed the limit and stream their events"""
+    events = []
+    installer = AsyncGeoDistroInstaller(max_concurrency=2, on_event=events.append)
+    installer.install_method = "conda"
+    script = "import time; print(time.time()); time.sleep(0.3); print(time.time())"
+
+    async def run_all():
+        children = [installer.child(f"env{i}") for i in range(2)]
+        commands = [child._exec([sys.executable, "-c", script])
+                    for child in children + [installer] * 3]
+        queue = installer.subscribe()
+        results = await asyncio.gather(*commands)
+        children[0]._say("done")
+        return results, queue.get_nowait()
+
+    results, queued = asyncio.run(run_all())
+    spans = [tuple(map(float, r.stdout.split())) for r in results]
+    overlap = max(sum(start <= t < end for start, end in spans) for t, _ in spans)
+    assert all(r.returncode == 0 for r in results)
+    assert overlap == 2
+    assert queued == {"type": "message", "message": "done", "label": "env0"}
+    assert events[-1] == queued
+
+
+def test_missing_conda_raises(monkeypatch):
+    """Test that the installer raises instead of exiting when conda is missing"""
+    monkeypatch.setattr("shutil.which", lambda name: None)
+    with pytest.raises(PrerequisiteError):
+        asyncio.run(AsyncGeoDistroInstaller().check_prerequisites())
+    with pytest.raises(PrerequisiteError):
+        GeoDistroInstaller()
+
+
+def test_preflight_plan_reads_cached_metadata_only(monkeypatch):
+    """Test that the install pre-flight resolves offline unless fetching is asked for"""
+    from geodistro import plan
+
+    events = []
+    installer = AsyncGeoDistroInstaller(verbose=False, on_event=events.append)
+    calls = []
+
+    async def fake_prerequisites():
+        return "conda"
+
+    async def fake_platform():
+        return "linux-64"
+
+    def fake_build_plan(
+        conda, python, specs, pip, channels, cache, bandwidth, fetch_missing
+    ):
+        calls.append((fetch_missing, cache.max_age))
+        return {
+            "conda": {"ok": None, "packages": {}},
+            "pip": {"selected": {}, "missing": []},
+            "conflicts": [],
+            "download_bytes": 0,
+            "estimated_seconds": 0,
+        }
+
+    monkeypatch.setattr(installer, "check_prerequisites", fake_prerequisites)
+    monkeypatch.setattr(installer, "_conda_platform", fake_platform)
+    monkeypatch.setattr(plan, "build_plan", fake_build_plan)
+    report = asyncio.run(installer.plan_install())
+    asyncio.run(installer.plan_install(fetch_missing=True))
+    assert calls == [(False, None), (True, 86400)]
+    # Skipping the conda check leaves the plan incomplete, which is not silent
+    assert report["status"] == "incomplete"
+    assert any("plan is incomplete" in e.get("message", "") for e in events)
+
+
+def test_precompile_fails_only_when_much_bytecode_is_missing(tmp_path, monkeypatch):
+    """Test that a few uncompilable files warn, while a broken run fails the step"""
+    from geodistro import bytecode
+
+    installer = AsyncGeoDistroInstaller(verbose=False)
+
+    async def fake_python(env_name):
+        return tmp_path / "bin" / "python"
+
+    report = {"sources": 100, "valid": 99, "missing": 1, "stale": 0, "wrong_magic": 0,
+              "paths": [], "mode": "timestamp", "returncode": 1, "seconds": 0.1}
+    monkeypatch.setattr(installer, "_env_python", fake_python)
+    monkeypatch.setattr(
+        bytecode, "precompile_environment", lambda python, mode: dict(report)
+    )
+    assert asyncio.run(installer.precompile_bytecode("geo-test"))
+    assert installer.trace[-1]["status"] == "ok"
+
+    report.update(valid=50, missing=50)
+    assert not asyncio.run(installer.precompile_bytecode("geo-test"))
+    assert installer.trace[-1]["status"] == "failed"
+
+    report.update(sources=0, valid=0, missing=0)
+    assert not asyncio.run(installer.precompile_bytecode("geo-test"))
+    assert installer.trace[-1]["status"] == "failed"
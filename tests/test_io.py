@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pyogrio")
+pytest.importorskip("geopandas")
+
+from geodistro.io import VectorCache, source_fingerprint
+
+
+def _write_points(path, count):
+    features = [
+        {
+            "type": "Feature",
+            "properties": {"id": i, "name": f"p{i}"},
+            "geometry": {"type": "Point", "coordinates": [float(i), float(i)]},
+        }
+        for i in range(count)
+    ]
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+
+
+def test_read_through_cache(tmp_path):
+    """Test that a source is converted once and read back with pushdown"""
+    source = tmp_path / "points.geojson"
+    _write_points(source, 20)
+    cache = VectorCache(tmp_path / "cache")
+
+    gdf = cache.read(source)
+    assert len(gdf) == 20
+    assert gdf.crs.to_epsg() == 4326
+    assert len(cache.entries()) == 1
+
+    subset = cache.read(source, columns=["id"], bbox=(2.5, 2.5, 5.5, 5.5))
+    assert sorted(subset["id"]) == [3, 4, 5]
+    assert list(subset.columns) == ["id", "geometry"]
+
+
+def test_changed_source_replaces_entry(tmp_path):
+    """Test that a modified source invalidates its old cache entry"""
+    source = tmp_path / "points.geojson"
+    _write_points(source, 5)
+    cache = VectorCache(tmp_path / "cache")
+    old_path = cache.ensure(source)
+    old_fingerprint = source_fingerprint(source)
+
+    _write_points(source, 8)
+    os.utime(source, ns=(0, 10**9))
+    assert source_fingerprint(source) != old_fingerprint
+
+    assert len(cache.read_table(source)) == 8
+    assert not old_path.exists()
+    assert len(cache.entries()) == 1
+
+    source.unlink()
+    assert cache.evict_stale() == 1
+    assert cache.entries() == []
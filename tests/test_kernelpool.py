@@ -0,0 +1,54 @@
+import asyncio
+import sys
+
+import pytest
+
+pytest.importorskip("ipykernel")
+pytest.importorskip("jupyter_client")
+
+from jupyter_client.kernelspec import KernelSpec
+from jupyter_client.manager import AsyncKernelManager
+
+from geodistro import kernelpool
+
+ARGV = [sys.executable, "-m", "ipykernel_launcher", "-f", "{connection_file}"]
+
+
+def test_pooled_kernel_is_claimed_with_cwd(tmp_path):
+    """Test that a warm kernel is handed out with the requested working directory"""
+
+    async def run():
+        pool = await kernelpool.warm(ARGV, size=1, preload=["json"])
+        assert all(k.is_ready() for k in pool.kernels)
+
+        km = AsyncKernelManager()
+        km._kernel_spec = KernelSpec(
+            argv=ARGV, display_name="pool", language="python",
+            metadata={"kernel_provisioner": {
+                "provisioner_name": "geodistro-pool",
+                "config": {"pool_size": 1, "preload": ["json"]},
+            }},
+        )
+        await km.start_kernel(cwd=str(tmp_path))
+        assert km.provisioner._pooled is not None
+
+        client = km.client()
+        client.start_channels()
+        outputs = []
+        try:
+            await client.wait_for_ready(timeout=30)
+            await client.execute_interactive(
+                "import os, sys; print(os.getcwd(), 'json' in sys.modules)",
+                output_hook=lambda msg: outputs.append(msg["content"].get("text", "")),
+                timeout=30,
+            )
+        finally:
+            client.stop_channels()
+            await km.shutdown_kernel(now=True)
+            pool.shutdown()
+        assert "".join(outputs).split() == [str(tmp_path), "True"]
+
+    try:
+        asyncio.run(run())
+    except ModuleNotFoundError as e:
+        pytest.skip(f"provisioner entry point not installed: {e}")
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from geodistro import launchers
+
+
+def test_activation_delta_keeps_env_variables(tmp_path):
+    """Test that only activation-specific variables are kept"""
+    prefix = tmp_path / "env"
+    baseline = {"HOME": "/home/user", "PATH": "/usr/bin", "CONDA_PREFIX": str(prefix)}
+    activated = dict(
+        baseline,
+        GDAL_DATA=str(prefix / "share" / "gdal"),
+        PROJ_LIB=str(prefix / "share" / "proj"),
+        SHLVL="2",
+        PATH=os.pathsep.join([str(prefix / "bin"), "/usr/bin"]),
+    )
+    # A sibling environment whose name merely starts with this one's
+    baseline["SIBLING_DATA"] = activated["SIBLING_DATA"] = str(
+        tmp_path / "env2" / "share"
+    )
+    delta = launchers.activation_delta(activated, baseline, prefix)
+    assert set(delta["variables"]) == {"GDAL_DATA", "PROJ_LIB", "CONDA_PREFIX"}
+    assert delta["path_prepend"] == [str(prefix / "bin")]
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="bash launchers")
+def test_launcher_exports_snapshot_and_refreshes(tmp_path, monkeypatch):
+    """Test that launchers use the snapshot and refresh it when the env changes"""
+    prefix = tmp_path / "env"
+    (prefix / "conda-meta").mkdir(parents=True)
+    history = prefix / "conda-meta" / "history"
+    history.write_text("")
+    os.utime(history, (0, 0))
+
+    captured = {"GDAL_DATA": "/opt/gdal"}
+    monkeypatch.setattr(launchers, "capture_activation",
+                        lambda conda, env_name: dict(os.environ, **captured))
+    written = launchers.write_launchers(
+        "conda", "geo-test", prefix, tmp_path / "bin", "linux"
+    )
+    georun = tmp_path / "bin" / "georun.sh"
+    assert georun in written
+    assert not launchers.is_stale(prefix)
+
+    output = subprocess.run([str(georun), "sh", "-c", "echo $GDAL_DATA"],
+                            capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "/opt/gdal"
+
+    history.write_text("# changed\n")
+    assert launchers.is_stale(prefix)
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="bash launchers")
+def test_launcher_refreshes_after_hook_script_edit(tmp_path):
+    """Test that editing an activate.d script in place makes the launcher refresh"""
+    prefix = tmp_path / "env"
+    hooks = prefix / "etc" / "conda" / "activate.d"
+    hooks.mkdir(parents=True)
+    script = hooks / "gdal.sh"
+    script.write_text("export GDAL_DATA=/opt/gdal-1\n")
+    # Stands in for 'conda run -n <env> <cmd>': runs the hooks, then the command
+    conda = tmp_path / "conda"
+    conda.write_text(
+        f'#!/bin/sh\nfor f in {hooks}/*.sh; do . "$f"; done\nshift 3\nexec "$@"\n'
+    )
+    conda.chmod(0o755)
+
+    launchers.write_launchers(str(conda), "geo-test", prefix, tmp_path / "bin", "linux")
+    georun = [str(tmp_path / "bin" / "georun.sh"), "sh", "-c", "echo $GDAL_DATA"]
+    assert (
+        subprocess.run(georun, capture_output=True, text=True).stdout.strip()
+        == "/opt/gdal-1"
+    )
+
+    # Rewriting a file keeps its directory's mtime
+    directory_mtime = hooks.stat().st_mtime
+    script.write_text("export GDAL_DATA=/opt/gdal-2\n")
+    future = (
+        launchers.snapshot_dir(prefix).joinpath("activation.json").stat().st_mtime + 10
+    )
+    os.utime(script, (future, future))
+    os.utime(hooks, (directory_mtime, directory_mtime))
+    assert launchers.is_stale(prefix)
+    assert (
+        subprocess.run(georun, capture_output=True, text=True).stdout.strip()
+        == "/opt/gdal-2"
+    )
+
+
+def test_windows_launcher_refreshes_only_on_change(tmp_path):
+    """Test that the batch launcher skips Python unless the watched files changed"""
+    script = launchers._windows_launcher(
+        "conda", "geo-test", tmp_path, ["jupyter", "lab"]
+    )
+    lines = script.splitlines()
+    refresh = next(i for i, line in enumerate(lines) if "geodistro.launchers" in line)
+    assert lines[refresh - 1] == ":refresh"
+    assert any(
+        line.startswith("fc /b") and "goto refresh" in line for line in lines[:refresh]
+    )
+    assert "goto launch" in lines[refresh - 2]
@@ -0,0 +1,59 @@
+import sys
+
+import pytest
+
+from geodistro import lazy
+
+
+@pytest.fixture
+def fake_package(tmp_path, monkeypatch):
+    """A package that records when its code runs"""
+    package = tmp_path / "fakegeo"
+    package.mkdir()
+    (package / "__init__.py").write_text(
+        "import builtins\nbuiltins.fakegeo_loads = getattr(builtins, 'fakegeo_loads', 0) + 1\n"
+        "AREA = 42\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import builtins
+    builtins.fakegeo_loads = 0
+    yield builtins
+    lazy.uninstall()
+    sys.modules.pop("fakegeo", None)
+
+
+def test_install_defers_execution_until_attribute_access(fake_package):
+    """Test that the import hook returns a module that runs on first use"""
+    lazy.install(["fakegeo"])
+    import fakegeo
+    assert fake_package.fakegeo_loads == 0
+    assert fakegeo.AREA == 42
+    assert fake_package.fakegeo_loads == 1
+
+    # Missing libraries still fail at the import statement
+    with pytest.raises(ImportError):
+        import nogeo_installed  # noqa: F401
+
+
+def test_eager_exceptions_and_proxies(fake_package):
+    """Test forced eager modules and explicit lazy proxies"""
+    lazy.install(["fakegeo"], eager=["fakegeo"])
+    import fakegeo  # noqa: F401
+    assert fake_package.fakegeo_loads == 1
+    lazy.uninstall()
+    sys.modules.pop("fakegeo")
+
+    module = lazy.lazy_import("fakegeo")
+    assert fake_package.fakegeo_loads == 1
+    assert module.AREA == 42 and fake_package.fakegeo_loads == 2
+    with pytest.raises(ImportError):
+        lazy.lazy_import("nogeo_installed")
+
+
+def test_stack_modules_map_distributions_to_imports():
+    """Test the config-derived module list and attribute proxies"""
+    modules = lazy.stack_modules()
+    assert "sklearn" in modules and "osgeo" in modules and "dash_leaflet" in modules
+    assert "scikit-learn" not in modules and "geos" not in modules
+    with pytest.raises(AttributeError):
+        lazy.not_a_library
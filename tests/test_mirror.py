@@ -0,0 +1,150 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from geodistro import mirror
+
+
+class FakeChannel:
+    """In-memory conda channel served over HTTP with ETag support"""
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []
+        channel = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                channel.requests.append(self.path)
+                body = channel.files.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/channel"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def put(self, path, document):
+        body = json.dumps(document).encode() if isinstance(document, dict) else document
+        self.files[f"/channel/{path}"] = body
+        return body
+
+
+def _record(name, version, depends=()):
+    return {"name": name, "version": version, "build": "0", "build_number": 0,
+            "depends": list(depends), "subdir": "noarch", "md5": "0" * 32, "size": 10}
+
+
+def _jlap(patches, latest):
+    lines = ["0" * 64] + [json.dumps(p) for p in patches]
+    lines.append(json.dumps({"url": "repodata.json", "latest": latest}))
+    running = bytes.fromhex(lines[0])
+    for line in lines[1:]:
+        running = hashlib.blake2b(line.encode(), key=running, digest_size=32).digest()
+    return ("\n".join(lines + [running.hex()]) + "\n").encode()
+
+
+def _digest(body):
+    return hashlib.blake2b(body, digest_size=32).hexdigest()
+
+
+@pytest.fixture
+def channel():
+    fake = FakeChannel()
+    yield fake
+    fake.server.shutdown()
+
+
+def test_mirror_prunes_and_refreshes_incrementally(tmp_path, channel):
+    """Test pruning to the dependency closure and refreshing through conditional requests and jlap diffs"""
+    repodata = {
+        "info": {"subdir": "noarch"},
+        "packages": {
+            "geofoo-1.0-0.tar.bz2": _record("geofoo", "1.0", ["geobar >=2", "__glibc"]),
+            "geobar-2.0-0.tar.bz2": _record("geobar", "2.0"),
+            "unrelated-1.0-0.tar.bz2": _record("unrelated", "1.0"),
+        },
+        "packages.conda": {},
+    }
+    first = channel.put("noarch/repodata.json", repodata)
+    channel.put(
+        "linux-64/repodata.json", {"info": {"subdir": "linux-64"}, "packages": {}}
+    )
+
+    repo_mirror = mirror.RepodataMirror(tmp_path)
+    results = repo_mirror.refresh([channel.url], "linux-64", ["geofoo"])
+    assert [r["status"] for r in results] == ["downloaded", "downloaded"]
+
+    local = repo_mirror.channel_dir(channel.url) / "noarch" / "repodata.json"
+    pruned = json.loads(local.read_text())
+    assert sorted(pruned["packages"]) == [
+        "geobar-2.0-0.tar.bz2",
+        "geofoo-1.0-0.tar.bz2",
+    ]
+    assert pruned["info"]["base_url"] == f"{channel.url}/noarch/"
+    assert repo_mirror.local_channels([channel.url], "linux-64", ["geofoo >=1"]) == [
+        repo_mirror.channel_dir(channel.url).as_uri()
+    ]
+    assert repo_mirror.local_channels([channel.url], "linux-64", ["unrelated"]) is None
+    assert repo_mirror.local_channels([channel.url], "osx-64", ["geofoo"]) is None
+
+    # Nothing changed upstream: conditional requests only, no repodata body
+    results = repo_mirror.refresh([channel.url], "linux-64", ["geofoo"])
+    assert [r["status"] for r in results] == ["not-modified", "not-modified"]
+
+    # A new geobar is published as a jlap patch on top of the first repodata
+    new_record = _record("geobar", "3.0")
+    updated = json.loads(first)
+    updated["packages"]["geobar-3.0-0.tar.bz2"] = new_record
+    patch = {"from": _digest(first), "to": "1" * 64, "patch": [
+        {"op": "add", "path": "/packages/geobar-3.0-0.tar.bz2", "value": new_record},
+    ]}
+    channel.put("noarch/repodata.json", updated)
+    channel.put("noarch/repodata.jlap", _jlap([patch], "1" * 64))
+    channel.requests.clear()
+
+    results = repo_mirror.refresh([channel.url], "linux-64", ["geofoo"])
+    assert [r["status"] for r in results] == ["not-modified", "patched"]
+    assert "/channel/noarch/repodata.json" not in channel.requests
+    pruned = json.loads(local.read_text())
+    assert "geobar-3.0-0.tar.bz2" in pruned["packages"]
+    assert "unrelated-1.0-0.tar.bz2" not in pruned["packages"]
+
+    # A jlap that does not start from our copy falls back to a full download
+    channel.put(
+        "noarch/repodata.jlap", _jlap([dict(patch, **{"from": "2" * 64})], "3" * 64)
+    )
+    results = repo_mirror.refresh([channel.url], "linux-64", ["geofoo"])
+    assert results[1]["status"] == "downloaded"
+
+
+def test_apply_patch_operations():
+    """Test the JSON Patch subset used by repodata diffs"""
+    document = {"packages": {"a~b/c": 1, "d": 2}, "removed": ["x"]}
+    mirror.apply_patch(document, [
+        {"op": "remove", "path": "/packages/a~0b~1c"},
+        {"op": "replace", "path": "/packages/d", "value": 3},
+        {"op": "add", "path": "/removed/-", "value": "y"},
+    ])
+    assert document == {"packages": {"d": 3}, "removed": ["x", "y"]}
+    with pytest.raises(ValueError):
+        mirror.apply_patch(
+            document, [{"op": "move", "path": "/packages/d", "from": "/x"}]
+        )
@@ -0,0 +1,87 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from geodistro import network
+
+
+def test_grid_shortest_paths_and_isochrones():
+    """Test routing on a synthetic grid against Manhattan distances"""
+    grid = network.grid_network(6, 8, spacing=100.0)
+    assert (grid.n_nodes, grid.n_edges) == (48, 2 * (6 * 7 + 5 * 8))
+
+    path, length = grid.shortest_path(1, 48)
+    assert path[0] == 1 and path[-1] == 48
+    assert len(path) == 5 + 7 + 1
+    assert length == pytest.approx(1200.0)
+    _, seconds = grid.shortest_path(1, 48, weight="travel_time")
+    assert seconds == pytest.approx(120.0)
+
+    rows, cols = np.divmod(grid.node_ids - 1, 8)
+    dist = grid.distances([1, 20], chunk_size=1)
+    assert np.allclose(dist[0], 100.0 * (rows + cols))
+    assert grid.distances([1], targets=[8, 41]).tolist() == [[700.0, 500.0]]
+
+    bands = grid.isochrones([1], cutoffs=[250.0, 100.0])[0]
+    manhattan = rows + cols
+    assert (bands[manhattan <= 1] == 0).all()
+    assert (bands[manhattan == 2] == 1).all()
+    assert (bands[manhattan > 2] == -1).all()
+
+    assert grid.nearest_nodes([690.0, 10.0], [-20.0, 480.0]).tolist() == [8, 41]
+    with pytest.raises(KeyError):
+        grid.shortest_path(1, 999)
+
+
+def test_parallel_edges_keep_shortest():
+    """Test that from_edges keeps the shortest of parallel edges"""
+    net = network.Network.from_edges(
+        [10, 20],
+        [0, 1],
+        [0, 0],
+        [10, 10, 20],
+        [20, 20, 10],
+        {"length": [5.0, 3.0, 4.0]},
+    )
+    assert net.n_edges == 2
+    assert net.shortest_path(10, 20) == ([10, 20], 3.0)
+
+
+def test_cache_round_trip_memory_mapped(tmp_path):
+    """Test that a query is built once and then served memory-mapped from the cache"""
+    calls = []
+
+    def builder(query, network_type, **kwargs):
+        calls.append(query)
+        return network.grid_network(5, 5, seed=1)
+
+    first = network.load_network("Test Town", builder=builder, cache_dir=tmp_path)
+    second = network.load_network("Test Town", builder=builder, cache_dir=tmp_path)
+    assert calls == ["Test Town"]
+    assert isinstance(second.indices, np.memmap)
+    assert not second.weights["length"].flags.writeable
+    assert np.array_equal(first.distances([1, 13]), second.distances([1, 13]))
+
+    network.load_network(
+        "Test Town", network_type="walk", builder=builder, cache_dir=tmp_path
+    )
+    network.load_network("Test Town", builder=builder, cache_dir=tmp_path, max_age=-1)
+    assert len(calls) == 3
+
+    parallel = second.distances(np.arange(1, 26), n_jobs=2, chunk_size=5)
+    assert np.array_equal(parallel, second.distances(np.arange(1, 26)))
+
+
+def test_from_networkx():
+    """Test conversion of an osmnx-style MultiDiGraph"""
+    nx = pytest.importorskip("networkx")
+    graph = nx.MultiDiGraph(crs="epsg:4326")
+    graph.add_node(101, x=0.0, y=0.0)
+    graph.add_node(102, x=0.001, y=0.0)
+    graph.add_edge(101, 102, length=120.0, travel_time=9.0)
+    graph.add_edge(101, 102, length=110.0)
+    net = network.Network.from_networkx(graph)
+    assert list(net.weights) == ["length"]
+    assert net.shortest_path(101, 102) == ([101, 102], 110.0)
+    assert net.shortest_path(102, 101) == ([], float("inf"))
@@ -0,0 +1,160 @@
+import io
+import json
+import re
+import shutil
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from geodistro import plan
+from tests.test_solvecache import _write_channel
+
+
+def _project(cache, name, releases):
+    """Store a project whose releases map version -> (requires_python, requires)"""
+    project = {"name": name, "releases": {}, "requires": {}}
+    for version, (requires_python, requires) in releases.items():
+        project["releases"][version] = [{
+            "filename": f"{name}-{version}-py3-none-any.whl",
+            "url": f"https://example.invalid/{name}-{version}-py3-none-any.whl",
+            "requires_python": requires_python, "size": 1000, "yanked": False,
+        }]
+        project["requires"][version] = requires
+    cache.path(name).write_text(json.dumps(project))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return plan.WheelMetadataCache(tmp_path)
+
+
+def test_python_conflict_is_explained(cache):
+    """Test that a package whose releases all need a newer Python is reported with the reason"""
+    _project(cache, "mgwr", {"3.0": (">=3.10", [])})
+    result = plan.resolve_pip(["mgwr"], "3.9", {}, cache)
+    assert result["selected"] == {}
+    [conflict] = result["conflicts"]
+    assert conflict["package"] == "mgwr"
+    assert "requires Python >=3.10" in conflict["reason"]
+
+
+def test_backtracks_to_a_compatible_release(cache):
+    """Test that a parent is moved back to an older release when its dependency cannot be met"""
+    _project(cache, "geotool", {
+        "2.0": (">=3.8", ["geocore>=2"]),
+        "1.0": (">=3.8", ["geocore>=1,<2", "extra-only; extra == 'viz'"]),
+    })
+    _project(cache, "geocore", {"2.0": (">=3.11", []), "1.5": (">=3.8", [])})
+    result = plan.resolve_pip(["geotool"], "3.9", {}, cache)
+    assert result["conflicts"] == []
+    assert {name: info["version"] for name, info in result["selected"].items()} == {
+        "geotool": "1.0", "geocore": "1.5",
+    }
+    assert result["missing"] == []
+
+
+def test_conda_provided_versions_are_checked(cache):
+    """Test requirements on packages installed by conda against the solved versions"""
+    _project(cache, "geotool", {"1.0": (">=3.8", ["shapely>=2"])})
+    result = plan.resolve_pip(["geotool"], "3.9", {"shapely": "1.8.5"}, cache)
+    [conflict] = result["conflicts"]
+    assert "conda packages provide shapely 1.8.5" in conflict["reason"]
+    assert (
+        plan.resolve_pip(["geotool"], "3.9", {"shapely": "2.0.1"}, cache)["conflicts"]
+        == []
+    )
+    # Missing metadata is reported rather than guessed
+    assert plan.resolve_pip(["unknown"], "3.9", {}, cache)["missing"] == [
+        ("unknown", None)
+    ]
+
+
+def test_extras_pull_in_their_dependencies(cache):
+    """Test that requested extras add their dependencies at the release already chosen"""
+    _project(cache, "geotool", {"1.0": (">=3.8", ["geocore[viz]>=1"])})
+    _project(cache, "geocore", {
+        "1.5": (">=3.8", ["mplgeo; extra == 'viz'", "oldpy; python_version < '3.8'"]),
+        "1.0": (">=3.8", []),
+    })
+    _project(cache, "mplgeo", {"3.0": (None, [])})
+    result = plan.resolve_pip(["geotool"], "3.9", {}, cache)
+    assert {name: info["version"] for name, info in result["selected"].items()} == {
+        "geotool": "1.0", "geocore": "1.5", "mplgeo": "3.0",
+    }
+    assert result["conflicts"] == [] and result["missing"] == []
+
+
+def test_build_plan_estimates_without_conda_metadata(cache):
+    """Test the plan totals when no repodata mirror is available"""
+    _project(cache, "geotool", {"1.0": (">=3.8", ["gdal"])})
+    report = plan.build_plan("conda", "3.9", ["gdal"], ["geotool", "gdal"], None, cache)
+    assert report["conda"]["ok"] is None
+    assert list(report["pip"]["selected"]) == ["geotool"]
+    assert report["download_bytes"] == 1000
+    assert report["estimated_seconds"] > 0
+
+
+def test_requires_read_from_wheel_over_range_requests(cache):
+    """Test reading METADATA out of a remote wheel without downloading it"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as wheel:
+        wheel.writestr("geotool/__init__.py", b"x" * 300_000)
+        wheel.writestr(
+            "geotool-1.0.dist-info/METADATA",
+            "Metadata-Version: 2.1\nName: geotool\nVersion: 1.0\n"
+            "Requires-Dist: numpy>=1.22\nRequires-Dist: pyproj\n\nDescription\n",
+        )
+    body = buffer.getvalue()
+    served = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+
+        def do_GET(self):
+            first, last = map(
+                int, re.match(r"bytes=(\d+)-(\d+)", self.headers["Range"]).groups()
+            )
+            chunk = body[first:last + 1]
+            served.append(len(chunk))
+            self.send_response(206)
+            self.send_header("Content-Length", str(len(chunk)))
+            self.end_headers()
+            self.wfile.write(chunk)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/geotool-1.0-py3-none-any.whl"
+        project = {"name": "geotool", "requires": {}, "releases": {"1.0": [{
+            "filename": "geotool-1.0-py3-none-any.whl", "url": url, "size": len(body),
+            "requires_python": None, "yanked": False, "core_metadata": False,
+        }]}}
+        cache.path("geotool").write_text(json.dumps(project))
+        fetched = cache.fetch("geotool", ["1.0"])
+    finally:
+        server.shutdown()
+    assert fetched["requires"]["1.0"] == ["numpy>=1.22", "pyproj"]
+    assert sum(served) < len(body)
+
+
+@pytest.mark.skipif(shutil.which("conda") is None, reason="conda not available")
+def test_offline_conda_solve_reports_conflicts(tmp_path):
+    """Test the offline dry-run solve against a local channel"""
+    channel = tmp_path / "channel"
+    _write_channel(channel, ["2.0"])
+    solved = plan.solve_conda_offline("conda", ["geofoo"], [channel.as_uri()])
+    assert solved["ok"] and solved["packages"] == {"geofoo": "1.0", "geobar": "2.0"}
+
+    failed = plan.solve_conda_offline(
+        "conda", ["geofoo", "geobar<2"], [channel.as_uri()]
+    )
+    assert failed["ok"] is False
+    assert "geobar" in failed["conflicts"][0]["reason"]
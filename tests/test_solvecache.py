@@ -0,0 +1,76 @@
+import json
+import shutil
+
+import pytest
+
+from geodistro import solvecache
+
+
+def _write_channel(root, bar_versions):
+    packages = {
+        "geofoo-1.0-0.tar.bz2": {
+            "name": "geofoo", "version": "1.0", "build": "0", "build_number": 0,
+            "depends": ["geobar >=2"], "subdir": "noarch",
+            "md5": "0" * 32, "size": 100,
+        }
+    }
+    for version in bar_versions:
+        packages[f"geobar-{version}-0.tar.bz2"] = {
+            "name": "geobar", "version": version, "build": "0", "build_number": 0,
+            "depends": [], "subdir": "noarch", "md5": "1" * 32, "size": 100,
+        }
+    for subdir, subdir_packages in (("noarch", packages), ("linux-64", {})):
+        (root / subdir).mkdir(parents=True, exist_ok=True)
+        (root / subdir / "repodata.json").write_text(
+            json.dumps(
+                {
+                    "info": {"subdir": subdir},
+                    "packages": subdir_packages,
+                    "packages.conda": {},
+                }
+            )
+        )
+
+
+def test_snapshot_changes_with_repodata(tmp_path):
+    """Test that mutating a channel's repodata changes the solve key"""
+    channel = tmp_path / "channel"
+    _write_channel(channel, ["2.0"])
+    channels = [channel.as_uri()]
+
+    snapshot = solvecache.channel_snapshot(channels, "linux-64")
+    key = solvecache.solve_key(["geofoo"], channels, "linux-64", snapshot)
+    assert key == solvecache.solve_key(
+        ["geofoo"],
+        channels,
+        "linux-64",
+        solvecache.channel_snapshot(channels, "linux-64"),
+    )
+    assert key != solvecache.solve_key(["geofoo"], channels, "osx-64", snapshot)
+
+    _write_channel(channel, ["2.0", "3.0"])
+    changed = solvecache.channel_snapshot(channels, "linux-64")
+    assert solvecache.solve_key(["geofoo"], channels, "linux-64", changed) != key
+
+
+def test_cache_round_trip(tmp_path):
+    """Test storing and loading an explicit package list"""
+    cache = solvecache.SolveCache(tmp_path)
+    assert cache.get("abc") is None
+    path = cache.put(
+        "abc", ["file:///c/noarch/a-1-0.tar.bz2#" + "0" * 32], {"specs": ["a"]}
+    )
+    assert cache.get("abc") == path
+    assert "@EXPLICIT" in path.read_text().splitlines()
+
+
+@pytest.mark.skipif(shutil.which("conda") is None, reason="conda not available")
+def test_solve_explicit_with_local_channel(tmp_path):
+    """Test a real dry-run solve against a local channel"""
+    channel = tmp_path / "channel"
+    _write_channel(channel, ["2.0", "3.0"])
+    urls = solvecache.solve_explicit("conda", ["geofoo"], [channel.as_uri()])
+    assert sorted(u.rsplit("/", 1)[1] for u in urls) == [
+        "geobar-3.0-0.tar.bz2#" + "1" * 32,
+        "geofoo-1.0-0.tar.bz2#" + "0" * 32,
+    ]
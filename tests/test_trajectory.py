@@ -0,0 +1,117 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from geodistro import trajectory
+
+
+def _feed():
+    """Vehicle a drives, stops for five minutes and drives on; b has a 20 minute gap"""
+    rows = []
+    for t in range(0, 11):
+        rows.append(("a", t, 10.0 * t, 0.0))
+    for t in range(20, 320, 10):
+        rows.append(("a", t, 100.0 + (t % 3), 1.0))
+    for t in range(321, 331):
+        rows.append(("a", t, 100.0 + 10.0 * (t - 320), 0.0))
+    for t in list(range(0, 20, 2)) + list(range(1220, 1240, 2)):
+        rows.append(("b", t, 0.0, 5.0 * t))
+    rows.sort(key=lambda row: row[1])
+    frame = pd.DataFrame(rows, columns=["vehicle_id", "t", "x", "y"])
+    frame["timestamp"] = pd.Timestamp("2024-05-01") + pd.to_timedelta(
+        frame.pop("t"), unit="s"
+    )
+    return frame
+
+
+def test_stops_gaps_and_segments_streamed_to_parquet(tmp_path):
+    """Test stop detection and gap splitting over a chunked CSV stream"""
+    source = tmp_path / "feed.csv"
+    _feed().to_csv(source, index=False)
+    stats = trajectory.process_file(
+        source,
+        tmp_path / "out",
+        x="x",
+        y="y",
+        chunk_size=7,
+        geographic=False,
+        stop_diameter=10.0,
+        min_stop_duration=120.0,
+        max_gap=600.0,
+    )
+    assert stats["points"] == 11 + 30 + 10 + 20
+    assert (stats["segments"], stats["stops"], stats["dropped"]) == (4, 1, 0)
+
+    stops = pq.read_table(tmp_path / "out" / "stops.parquet").to_pandas()
+    assert stops["vehicle"].tolist() == ["a"]
+    assert (stops["end"] - stops["start"]).iloc[0] == pd.Timedelta(seconds=300)
+    assert stops["x"].iloc[0] == pytest.approx(101.0)
+
+    segments = pq.read_table(tmp_path / "out" / "segments.parquet").to_pandas()
+    a = segments[segments["vehicle"] == "a"].groupby("segment")["x"]
+    assert a.min().tolist() == [0.0, 101.0]
+    assert a.max().tolist() == [100.0, 200.0]
+    assert segments[segments["vehicle"] == "b"]["segment"].value_counts().tolist() == [
+        10,
+        10,
+    ]
+
+
+def test_memory_bounded_by_active_vehicles():
+    """Test idle eviction, max_points splitting, generalization and dropped points"""
+    processor = trajectory.TrajectoryProcessor(
+        geographic=False, idle_timeout=30, max_gap=30, max_points=50, min_distance=1.5
+    )
+    closed = []
+    # 40 vehicles reporting one after another, never more than two at once
+    for vehicle in range(40):
+        t0 = vehicle * 100
+        t = (t0 + np.arange(120)) * trajectory.NS
+        closed += processor.feed(
+            np.full(120, vehicle), t, np.arange(120) * 1.0, np.zeros(120)
+        )
+    closed += processor.add("39", 0, 0.0, 0.0)
+    closed += processor.flush()
+
+    assert processor.stats["peak_active"] <= 2
+    assert processor.stats["dropped"] == 1
+    segments = [item for item in closed if isinstance(item, trajectory.Segment)]
+    # Every other point is dropped by min_distance, then tracks split at 50 points
+    assert max(len(segment) for segment in segments) == 50
+    assert sum(len(segment) for segment in segments) == 40 * (60 + 1)
+    first = [s for s in segments if s.vehicle == "0"]
+    assert [s.segment for s in first] == [0, 1]
+    assert first[1].x[0] == first[0].x[-1]
+
+
+def test_evicted_vehicle_keeps_counting_segments():
+    """Test that a vehicle evicted while silent continues with new segment ids"""
+    processor = trajectory.TrajectoryProcessor(geographic=False, max_gap=600.0)
+    closed = []
+    for t in range(0, 1300, 10):
+        closed += processor.add("a", t * trajectory.NS, float(t), 0.0)
+        if t < 20 or t >= 1220:
+            closed += processor.add("b", t * trajectory.NS + 1, 0.0, float(t))
+        closed += processor.evict_idle()
+    closed += processor.flush()
+    b = [(s.segment, len(s)) for s in closed
+         if isinstance(s, trajectory.Segment) and s.vehicle == "b"]
+    assert b == [(0, 2), (1, 8)]
+
+
+def test_segment_to_movingpandas():
+    """Test conversion of a closed segment"""
+    pytest.importorskip("geopandas")
+    segment = trajectory.Segment(
+        "a",
+        0,
+        np.array([0, 10 * trajectory.NS], dtype="datetime64[ns]"),
+        np.array([0.0, 0.001]),
+        np.array([0.0, 0.0]),
+    )
+    gdf = segment.to_geodataframe()
+    assert len(gdf) == 2 and str(gdf.crs) == "EPSG:4326"
+    pytest.importorskip("movingpandas")
+    assert segment.to_movingpandas().get_length() == pytest.approx(111.3, rel=0.01)
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from geodistro import tuning
+
+
+def test_profiles_scale_with_host():
+    """Test that profiles are sized from cores and RAM"""
+    batch = tuning.build_profile("batch", cores=16, ram_mb=64000)
+    low = tuning.build_profile("low-memory", cores=16, ram_mb=64000)
+    interactive = tuning.build_profile("interactive", cores=16, ram_mb=64000)
+    assert batch["GDAL_NUM_THREADS"] == "ALL_CPUS"
+    assert (
+        int(low["GDAL_CACHEMAX"])
+        < int(interactive["GDAL_CACHEMAX"])
+        < int(batch["GDAL_CACHEMAX"])
+    )
+    assert interactive["GDAL_NUM_THREADS"] == "8"
+    assert batch["PROJ_NETWORK"] == "ON"
+    with pytest.raises(ValueError):
+        tuning.build_profile("turbo")
+
+
+@pytest.mark.skipif(sys.platform.startswith("win"), reason="POSIX activate scripts")
+def test_activate_and_deactivate_restore_environment(tmp_path):
+    """Test that deactivate.d restores variables changed by activate.d"""
+    written = tuning.write_profile(
+        tmp_path, "batch", {"GDAL_CACHEMAX": "512", "VSI_CACHE": "TRUE"}
+    )
+    assert len(written) == 4
+    activate = tmp_path / "etc" / "conda" / "activate.d" / "geodistro-tuning.sh"
+    deactivate = tmp_path / "etc" / "conda" / "deactivate.d" / "geodistro-tuning.sh"
+    script = (
+        f". {activate}; echo $GDAL_CACHEMAX $VSI_CACHE $GEODISTRO_TUNING_PROFILE; "
+        f". {deactivate}; echo ${{GDAL_CACHEMAX}} ${{VSI_CACHE-unset}}"
+    )
+    env = dict(os.environ, GDAL_CACHEMAX="100")
+    env.pop("VSI_CACHE", None)
+    output = subprocess.run(["sh", "-c", script], capture_output=True, text=True,
+                            env=env, check=True).stdout.splitlines()
+    assert output == ["512 TRUE batch", "100 unset"]
+
+    assert len(tuning.remove_profile(tmp_path)) == 4
+
+
+def test_profiles_do_not_restrict_what_gdal_opens():
+    """Test that no profile limits remote file types, and only cloud hides sidecars"""
+    for name in tuning.PROFILES:
+        config = tuning.build_profile(name, 4, 8192)
+        assert "CPL_VSIL_CURL_ALLOWED_EXTENSIONS" not in config
+        assert ("GDAL_DISABLE_READDIR_ON_OPEN" in config) == (name == "cloud")
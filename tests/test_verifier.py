@@ -19,3 +19,83 @@ def test_verify_installation():
     # We don't expect all geospatial libraries to be installed in test environment
     result = verify_installation()
     assert isinstance(result, bool)
+
+
+def test_environment_fingerprint_tracks_installs(tmp_path):
+    """Test that the fingerprint changes with conda history and dist-info RECORD files"""
+    import os
+    from geodistro.verifier import environment_fingerprint
+
+    site = tmp_path / "site-packages"
+    (tmp_path / "conda-meta").mkdir()
+    (tmp_path / "conda-meta" / "history").write_text("==> 2024 <==\n")
+    (site / "geotool-1.0.dist-info").mkdir(parents=True)
+    (site / "geotool-1.0.dist-info" / "RECORD").write_text("geotool/__init__.py,,\n")
+    fingerprint = lambda: environment_fingerprint(str(tmp_path), [str(site)])
+
+    first = fingerprint()
+    (site / "__pycache__").mkdir()
+    assert fingerprint() == first
+
+    record = site / "geotool-1.0.dist-info" / "RECORD"
+    record.write_text("geotool/__init__.py,,\ngeotool/core.py,,\n")
+    second = fingerprint()
+    assert second != first
+
+    with open(tmp_path / "conda-meta" / "history", "a") as f:
+        f.write("+conda-forge/linux-64::gdal-3.8\n")
+    os.utime(tmp_path / "conda-meta" / "history", ns=(1, 1))
+    assert fingerprint() != second
+
+
+def test_verification_is_cached_until_the_environment_changes(tmp_path, monkeypatch):
+    """Test that libraries are imported again only after a change or with force"""
+    from geodistro import verifier
+    from geodistro.core import GeoDistroConfig
+
+    monkeypatch.setenv(GeoDistroConfig.CACHE_DIR_ENV, str(tmp_path))
+    imports = []
+    monkeypatch.setattr(verifier, "check_library",
+                        lambda name, attr=None: imports.append(name) or (True, "1.0"))
+    state = {"fingerprint": "a"}
+    monkeypatch.setattr(
+        verifier, "environment_fingerprint", lambda: state["fingerprint"]
+    )
+    checks = len(verifier.LIBRARIES_TO_CHECK)
+
+    assert verify_installation() is True
+    assert verify_installation() is True
+    assert len(imports) == checks
+
+    verify_installation(force=True)
+    assert len(imports) == 2 * checks
+
+    state["fingerprint"] = "b"
+    verify_installation()
+    verify_installation()
+    assert len(imports) == 3 * checks
+
+
+def test_functional_probes_run_in_parallel_with_timeouts(monkeypatch):
+    """Test probe outcomes, per-probe timeouts and parallel execution"""
+    import time
+    from geodistro import verifier
+
+    monkeypatch.setattr(verifier, "PROBES", {
+        "passes": "import time; time.sleep(0.5)",
+        "fails": "raise AssertionError('GTiff driver missing')",
+        "hangs": "import time; time.sleep(30)",
+        "also-passes": "import time; time.sleep(0.5)",
+    })
+    start = time.perf_counter()
+    results = verifier.run_probes(timeout=2, max_workers=4)
+    assert time.perf_counter() - start < 5
+
+    assert results["passes"]["status"] == "ok" and results["passes"]["seconds"] >= 0.5
+    assert results["fails"] == {
+        "status": "failed",
+        "seconds": results["fails"]["seconds"],
+        "detail": "AssertionError: GTiff driver missing",
+    }
+    assert results["hangs"]["status"] == "timeout"
+    assert results["also-passes"]["status"] == "ok"
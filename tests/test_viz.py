@@ -0,0 +1,86 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from geodistro import viz
+
+
+def _points(n=20_000, seed=0):
+    rng = np.random.default_rng(seed)
+    lon = rng.normal(-73.97, 0.05, n)
+    lat = rng.normal(40.75, 0.05, n)
+    return lon, lat, {"speed": rng.uniform(0, 30, n)}
+
+
+def test_square_levels_match_direct_binning():
+    """Test that coarser square levels built from finer ones equal binning the points"""
+    lon, lat, values = _points()
+    pyramid = viz.BinPyramid.build(
+        lon, lat, values, kind="square", min_zoom=8, max_zoom=13, chunk_size=3000
+    )
+    assert pyramid.zooms == list(range(8, 14))
+    for zoom in (8, 11):
+        direct = viz.BinPyramid.build(lon, lat, values, kind="square", min_zoom=zoom,
+                                      max_zoom=zoom)
+        for key in ("i", "j", "count"):
+            assert np.array_equal(pyramid.levels[zoom][key], direct.levels[zoom][key])
+        assert np.allclose(
+            pyramid.levels[zoom]["sum:speed"], direct.levels[zoom]["sum:speed"]
+        )
+    assert all(level["count"].sum() == len(lon) for level in pyramid.levels.values())
+
+
+def test_hex_cells_contain_their_points():
+    """Test that each point is binned into the hexagon whose center is nearest"""
+    lon, lat, _ = _points(5000)
+    x, y = viz.to_mercator(lon, lat)
+    size = viz.cell_size(12, 20)
+    q, r = viz._hex_index(x, y, size)
+    cx, cy = viz._hex_center(q, r, size)
+    own = np.hypot(x - cx, y - cy)
+    for dq, dr in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, -1), (-1, 1)):
+        nx, ny = viz._hex_center(q + dq, r + dr, size)
+        assert (own <= np.hypot(x - nx, y - ny) + 1e-6).all()
+
+
+def test_cells_respect_budget_and_bbox(tmp_path):
+    """Test zoom selection, coarsening under max_cells, clipping and caching"""
+    lon, lat, values = _points()
+    pyramid = viz.cached_pyramid(
+        lon, lat, values, cache_dir=tmp_path, min_zoom=4, max_zoom=14
+    )
+    assert pyramid.zoom_level(20.4) == 14 and pyramid.zoom_level(9.6) == 10
+
+    level, cells = pyramid.cells(14)
+    assert level == 14 and cells["count"].sum() == len(lon)
+    level, cells = pyramid.cells(14, max_cells=500)
+    assert level < 14 and len(cells["count"]) <= 500
+    assert np.all((cells["speed"] >= 0) & (cells["speed"] <= 30))
+
+    bbox = (-73.98, 40.74, -73.96, 40.76)
+    _, clipped = pyramid.cells(12, bbox=bbox)
+    assert 0 < clipped["count"].sum() < len(lon)
+    assert (clipped["lon"] >= bbox[0]).all() and (clipped["lat"] <= bbox[3]).all()
+
+    # Same input and options reuse the cached pyramid
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+    again = viz.cached_pyramid(
+        lon, lat, values, cache_dir=tmp_path, min_zoom=4, max_zoom=14
+    )
+    assert np.array_equal(again.levels[10]["count"], pyramid.levels[10]["count"])
+    viz.cached_pyramid(lon, lat, values, cache_dir=tmp_path, kind="square", min_zoom=4,
+                       max_zoom=14)
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+
+
+def test_geojson_payload():
+    """Test cell polygons and their properties"""
+    lon, lat, values = _points(2000)
+    pyramid = viz.BinPyramid.build(lon, lat, values, min_zoom=10, max_zoom=10)
+    level, cells = pyramid.cells(10)
+    geojson = viz.to_geojson(pyramid, level, cells)
+    feature = geojson["features"][0]
+    ring = feature["geometry"]["coordinates"][0]
+    assert len(ring) == 7 and ring[0] == ring[-1]
+    assert set(feature["properties"]) == {"count", "speed"}
+    assert sum(f["properties"]["count"] for f in geojson["features"]) == 2000
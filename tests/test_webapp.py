@@ -0,0 +1,185 @@
+import gzip
+import json
+import threading
+import time
+
+import pytest
+
+gpd = pytest.importorskip("geopandas")
+np = pytest.importorskip("numpy")
+
+from geodistro import webapp
+
+
+def _frame(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return gpd.GeoDataFrame(
+        {"kind": rng.choice(["bus", "tram"], n), "line": rng.integers(1, 4, n)},
+        geometry=gpd.points_from_xy(
+            rng.uniform(-74.05, -73.9, n), rng.uniform(40.65, 40.8, n)
+        ),
+        crs="EPSG:4326",
+    )
+
+
+def _features(body):
+    return json.loads(gzip.decompress(body))["features"]
+
+
+def test_tiles_cover_bbox():
+    """Test tile math against known slippy-map tiles"""
+    assert webapp.tiles_for_bbox((-74.0, 40.7, -74.0, 40.7), 10) == [(10, 301, 385)]
+    west, south, east, north = webapp.tile_bounds(10, 301, 385)
+    assert west <= -74.0 <= east and south <= 40.7 <= north
+    assert len(webapp.tiles_for_bbox((-180, -85, 180, 85), 2)) == 16
+    urls = webapp.layer_urls(
+        "stops", (-74.0, 40.7, -74.0, 40.7), 10.7, {"kind": ["bus", "tram"]}
+    )
+    assert urls == ["/layers/stops/10/301/385.geojson?kind=bus&kind=tram"]
+
+    # Zoomed out past min_zoom: no layers rather than every tile at min_zoom
+    world = (-180, -60, 180, 75)
+    assert webapp.layer_urls("stops", world, 3, min_zoom=10, max_zoom=16) == []
+    # Too many tiles at the view zoom fall back to coarser ones, within the cap
+    city = (-75.0, 40.0, -73.0, 42.0)
+    urls = webapp.layer_urls("stops", city, 12, min_zoom=8, max_tiles=16)
+    assert 0 < len(urls) <= 16 and all(
+        "/stops/9/" in url or "/stops/8/" in url for url in urls
+    )
+    assert webapp.layer_urls("stops", city, 12, min_zoom=11, max_tiles=16) == []
+
+
+def test_layers_cached_in_memory_and_on_disk(tmp_path):
+    """Test filtering, both cache tiers, LRU eviction and version invalidation"""
+    frame = _frame()
+    source = webapp.LayerSource(frame=frame, version="v1")
+    cache = webapp.LayerCache(disk_dir=tmp_path)
+    tile = webapp.tiles_for_bbox((-74.0, 40.7, -74.0, 40.7), 9)[0]
+
+    body, etag = cache.layer(source, "stops", tile, {"kind": "bus", "line": "2"})
+    features = _features(body)
+    expected = frame[(frame["kind"] == "bus") & (frame["line"] == 2)]
+    assert len(features) == len(expected) > 0
+    assert cache.layer(source, "stops", tile, {"kind": "bus", "line": "2"}) == (
+        body,
+        etag,
+    )
+    assert cache.stats == {"memory_hits": 1, "disk_hits": 0, "misses": 1, "evicted": 0}
+
+    # A second process shares the disk tier
+    other = webapp.LayerCache(disk_dir=tmp_path)
+    assert other.layer(source, "stops", tile, {"kind": "bus", "line": "2"})[0] == body
+    assert other.stats["disk_hits"] == 1
+
+    bus, _ = cache.layer(source, "stops", tile, {"kind": "bus"})
+    tiny = webapp.LayerCache(memory_bytes=int(len(bus) * 1.5), disk_dir=tmp_path)
+    tiny.layer(source, "stops", tile, {"kind": "tram"})
+    tiny.layer(source, "stops", tile, {"kind": "bus"})
+    tiny.layer(source, "stops", tile, {"kind": "tram"})
+    assert tiny.stats["evicted"] >= 1 and tiny.stats["disk_hits"] == 2
+
+    # A new version recomputes and drops the old version's files
+    source.set_frame(frame[frame["kind"] == "tram"], "v2")
+    body, new_etag = cache.layer(source, "stops", tile, {"kind": "bus", "line": "2"})
+    assert _features(body) == [] and new_etag != etag
+    assert [p.name for p in (tmp_path / "stops").iterdir()] == ["v2"]
+
+
+def test_filters_are_validated_before_caching(tmp_path, monkeypatch):
+    """Test that stray arguments share one layer and bad numbers are rejected"""
+    source = webapp.LayerSource(frame=_frame())
+    cache = webapp.LayerCache(disk_dir=tmp_path)
+    tile = webapp.tiles_for_bbox((-74.0, 40.7, -74.0, 40.7), 9)[0]
+
+    body, etag = cache.layer(source, "stops", tile, {"line": "2"})
+    for params in ({"line": "2.0", "_": "123"}, {"line": 2, "colour": "red"}):
+        assert cache.layer(source, "stops", tile, params) == (body, etag)
+    assert cache.stats["misses"] == 1
+    with pytest.raises(ValueError, match="line"):
+        cache.layer(source, "stops", tile, {"line": "two"})
+
+    # A disk hit whose file is trimmed by another process right after the read
+    def gone(path, *args):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(webapp.os, "utime", gone)
+    other = webapp.LayerCache(disk_dir=tmp_path)
+    assert other.layer(source, "stops", tile, {"line": "2"}) == (body, etag)
+    assert other.stats["disk_hits"] == 1
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    """Test that the disk tier trims the least recently used layers"""
+    source = webapp.LayerSource(frame=_frame(2000))
+    cache = webapp.LayerCache(memory_bytes=0, disk_dir=tmp_path, disk_bytes=20_000)
+    for tile in webapp.tiles_for_bbox((-74.05, 40.65, -73.9, 40.8), 13):
+        cache.layer(source, "stops", tile)
+    assert sum(p.stat().st_size for p in tmp_path.rglob("*.gz")) <= 20_000
+
+
+def test_concurrent_requests_compute_once(tmp_path):
+    """Test that simultaneous misses for one layer share a single computation"""
+    source = webapp.LayerSource(frame=_frame())
+    calls = []
+    render = source.render
+
+    def slow_render(*args, **kwargs):
+        calls.append(args)
+        time.sleep(0.2)
+        return render(*args, **kwargs)
+
+    source.render = slow_render
+    cache = webapp.LayerCache(disk_dir=tmp_path)
+    tile = (9, 150, 192)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.layer(source, "s", tile)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+
+
+def test_file_source_invalidates_on_change(tmp_path):
+    """Test that a rewritten source file yields a new version and new layers"""
+    path = tmp_path / "stops.geojson"
+    path.write_text(_frame(50).to_json())
+
+    def loader(p):
+        return gpd.GeoDataFrame.from_features(json.loads(p.read_text())["features"],
+                                              crs="EPSG:4326")
+
+    source = webapp.LayerSource(path, check_interval=0, loader=loader)
+    cache = webapp.LayerCache(disk_dir=tmp_path / "cache")
+    tile = (0, 0, 0)
+    assert len(_features(cache.layer(source, "stops", tile)[0])) == 50
+    path.write_text(_frame(80, seed=1).to_json())
+    assert len(_features(cache.layer(source, "stops", tile)[0])) == 80
+
+
+def test_flask_route_serves_compressed_layers(tmp_path):
+    """Test the layer route: gzip passthrough, plain fallback and ETag revalidation"""
+    flask = pytest.importorskip("flask")
+    server = flask.Flask(__name__)
+    cache = webapp.LayerCache(disk_dir=tmp_path)
+    webapp.add_layer_routes(
+        server, cache, {"stops": webapp.LayerSource(frame=_frame())}
+    )
+    client = server.test_client()
+
+    response = client.get("/layers/stops/9/150/192.geojson?kind=bus",
+                          headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    etag = response.headers["ETag"]
+    plain = client.get("/layers/stops/9/150/192.geojson?kind=bus")
+    assert json.loads(plain.data)["type"] == "FeatureCollection"
+    assert client.get("/layers/stops/9/150/192.geojson?kind=bus",
+                      headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/layers/missing/9/150/192.geojson").status_code == 404
+    assert client.get("/layers/stops/9/150/192.geojson?line=x").status_code == 400
+    assert client.get("/layers/stops/9/150/192.geojson?kind=bus&_=1",
+                      headers={"If-None-Match": etag}).status_code == 304